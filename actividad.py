@@ -0,0 +1,154 @@
+"""
+Actividad por hora materializada (tabla actividad_horaria).
+
+Cada check-in suma 1 a checkins y pago_horas a ingreso en la hora de entrada; cada
+check-out suma 1 a checkouts y pago_extra a ingreso en la hora de salida. Los contadores
+se incrementan dentro de la misma transacción que abre o cierra la renta (evento
+after_flush de la sesión), así que checkin, checkout y la conversión de reservas quedan
+cubiertos sin llamadas explícitas y un rollback también descarta el incremento.
+
+Las cargas que no pasan por el ORM (inserciones masivas, datos previos a esta tabla) se
+reconstruyen con:
+
+    flask reconstruir-actividad [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD]
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect, update
+from sqlalchemy.orm import Session
+
+from models import db, Renta, ActividadHora
+
+# Margen hacia atrás al reconstruir: rentas que entraron antes del rango pero salieron dentro
+MARGEN_ESTANCIA = timedelta(days=7)
+
+
+def _sumar(deltas, instante, checkins=0, checkouts=0, ingreso=0.0):
+    clave = (instante.date(), instante.hour)
+    actual = deltas.get(clave, (0, 0, 0.0))
+    deltas[clave] = (actual[0] + checkins, actual[1] + checkouts, actual[2] + (ingreso or 0.0))
+
+
+def _incrementar(conexion, deltas):
+    """Suma los deltas {(fecha, hora): (checkins, checkouts, ingreso)} con un upsert por renglón"""
+    tabla = ActividadHora.__table__
+    dialecto = conexion.dialect.name
+
+    for (fecha, hora), (checkins, checkouts, ingreso) in deltas.items():
+        valores = dict(fecha=fecha, hora=hora, checkins=checkins, checkouts=checkouts, ingreso=ingreso)
+
+        if dialecto == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            sentencia = insert(tabla).values(**valores)
+            sentencia = sentencia.on_duplicate_key_update(
+                checkins=tabla.c.checkins + sentencia.inserted.checkins,
+                checkouts=tabla.c.checkouts + sentencia.inserted.checkouts,
+                ingreso=tabla.c.ingreso + sentencia.inserted.ingreso
+            )
+            conexion.execute(sentencia)
+        elif dialecto in ('sqlite', 'postgresql'):
+            if dialecto == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            sentencia = insert(tabla).values(**valores)
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=['fecha', 'hora'],
+                set_={
+                    'checkins': tabla.c.checkins + sentencia.excluded.checkins,
+                    'checkouts': tabla.c.checkouts + sentencia.excluded.checkouts,
+                    'ingreso': tabla.c.ingreso + sentencia.excluded.ingreso
+                }
+            )
+            conexion.execute(sentencia)
+        else:
+            resultado = conexion.execute(
+                update(tabla).where(tabla.c.fecha == fecha, tabla.c.hora == hora).values(
+                    checkins=tabla.c.checkins + checkins,
+                    checkouts=tabla.c.checkouts + checkouts,
+                    ingreso=tabla.c.ingreso + ingreso
+                )
+            )
+            if resultado.rowcount == 0:
+                conexion.execute(tabla.insert().values(**valores))
+
+
+# --- Evento de sesión: incrementa los contadores en la misma transacción ---
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_actividad(session, flush_context):
+    deltas = {}
+
+    for obj in session.new:
+        if isinstance(obj, Renta) and obj.hora_entrada is not None:
+            _sumar(deltas, obj.hora_entrada, checkins=1, ingreso=obj.pago_horas)
+            if obj.hora_salida_real is not None:
+                _sumar(deltas, obj.hora_salida_real, checkouts=1, ingreso=obj.pago_extra)
+
+    for obj in session.dirty:
+        if isinstance(obj, Renta) and obj.hora_salida_real is not None:
+            historial = inspect(obj).attrs.hora_salida_real.history
+            # Solo la transición "sin salida -> con salida" es un check-out
+            if historial.added and not any(historial.deleted):
+                _sumar(deltas, obj.hora_salida_real, checkouts=1, ingreso=obj.pago_extra)
+
+    if deltas:
+        _incrementar(session.connection(), deltas)
+
+
+def registrar_checkouts(session, salidas):
+    """
+    Para actualizaciones masivas que no pasan por el ORM (UPDATE por conjunto):
+    suma los check-outs [(hora_salida_real, pago_extra)] en la transacción de 'session'.
+    """
+    deltas = {}
+    for hora_salida_real, pago_extra in salidas:
+        _sumar(deltas, hora_salida_real, checkouts=1, ingreso=pago_extra)
+    if deltas:
+        _incrementar(session.connection(), deltas)
+
+
+# --- Reconstrucción (backfill) ---
+
+def reconstruir_actividad(desde=None, hasta=None):
+    """
+    Recalcula actividad_horaria para las fechas [desde, hasta) a partir de las rentas
+    (tablas activa y de archivo). Sin fechas reconstruye todo. Regresa los renglones escritos.
+    """
+    from reportes import _fuentes_rentas
+
+    inicio_dt = datetime.combine(desde, datetime.min.time()) if desde else None
+    fin_dt = datetime.combine(hasta, datetime.min.time()) if hasta else None
+
+    R, _ = _fuentes_rentas(inicio_dt - MARGEN_ESTANCIA if inicio_dt else None,
+                           fin_dt or datetime.max)
+    consulta = db.session.query(R.hora_entrada, R.hora_salida_real, R.pago_horas, R.pago_extra)
+    if inicio_dt:
+        consulta = consulta.filter(R.hora_entrada >= inicio_dt - MARGEN_ESTANCIA)
+    if fin_dt:
+        consulta = consulta.filter(R.hora_entrada < fin_dt)
+
+    def _en_rango(instante):
+        return (inicio_dt is None or instante >= inicio_dt) and (fin_dt is None or instante < fin_dt)
+
+    deltas = {}
+    for entrada, salida, pago_horas, pago_extra in consulta.yield_per(5000):
+        if _en_rango(entrada):
+            _sumar(deltas, entrada, checkins=1, ingreso=pago_horas)
+        if salida is not None and _en_rango(salida):
+            _sumar(deltas, salida, checkouts=1, ingreso=pago_extra)
+
+    borrar = ActividadHora.query
+    if desde:
+        borrar = borrar.filter(ActividadHora.fecha >= desde)
+    if hasta:
+        borrar = borrar.filter(ActividadHora.fecha < hasta)
+    borrar.delete(synchronize_session=False)
+
+    if deltas:
+        db.session.execute(ActividadHora.__table__.insert(), [
+            dict(fecha=fecha, hora=hora, checkins=checkins, checkouts=checkouts, ingreso=ingreso)
+            for (fecha, hora), (checkins, checkouts, ingreso) in sorted(deltas.items())
+        ])
+    db.session.commit()
+    return len(deltas)
@@ -0,0 +1,181 @@
+"""
+Analítica de ocupación e ingresos vectorizada con NumPy.
+
+Las rentas cerradas se leen en bloques (yield_per) como columnas numéricas — las fechas
+llegan ya convertidas a segundos por la base de datos — y cada bloque se acumula en
+arreglos de tamaño fijo (168 horas de la semana, una celda por habitación), así que la
+memoria no depende del número de rentas procesadas.
+
+Métricas:
+- ocupación por hora de la semana (lunes 00h = índice 0), sobre la capacidad vendible:
+  las horas que cada habitación pasó en MANTENIMIENTO se descuentan de la capacidad
+- estancia promedio (horas)
+- RevPAR (ingreso / habitaciones / día)
+- rotación por habitación (rentas por día)
+- frecuencia de horas extra (proporción de rentas con pago_extra > 0)
+"""
+from datetime import datetime, timedelta
+from itertools import chain
+
+from sqlalchemy import select, func, cast, extract, Integer, literal, literal_column
+
+from models import db
+from reportes import _rango_fechas, _fuentes_rentas
+from cache_habitaciones import cache_habitaciones
+from mantenimiento import intervalos_mantenimiento
+from replica import solo_lectura
+
+try:
+    import numpy as np
+except ImportError:  # Dependencia opcional: sin NumPy el endpoint responde 501
+    np = None
+
+HORAS_SEMANA = 7 * 24
+# 1970-01-01 fue jueves: desplazamiento para que el lunes sea el día 0
+_DESPLAZAMIENTO_DIA = 3
+# Límite de horas por estancia al repartir la ocupación (evita expansiones enormes por datos corruptos)
+MAX_HORAS_ESTANCIA = 72
+TAMANO_BLOQUE = 50000
+
+_EPOCA = datetime(1970, 1, 1)
+
+
+def disponible():
+    return np is not None
+
+
+def _segundos(columna):
+    """Expresión SQL con los segundos desde 1970 de un DATETIME sin zona (hora local tal cual)"""
+    dialecto = db.engine.dialect.name
+    if dialecto == 'sqlite':
+        return cast(func.strftime('%s', columna), Integer)
+    if dialecto == 'mysql':
+        return func.timestampdiff(literal_column('SECOND'), literal('1970-01-01 00:00:00'), columna)
+    return extract('epoch', columna)
+
+
+def _hora_semana(horas_absolutas):
+    """Índice 0..167 (lunes 00h = 0) de un arreglo de horas desde 1970"""
+    dias = horas_absolutas // 24
+    return ((dias + _DESPLAZAMIENTO_DIA) % 7) * 24 + horas_absolutas % 24
+
+
+def _ocupacion_bloque(entradas, salidas, max_horas=MAX_HORAS_ESTANCIA):
+    """Segundos ocupados repartidos en las 168 horas de la semana para un bloque de estancias"""
+    hora_inicio = entradas // 3600
+    hora_fin = (salidas - 1) // 3600
+    horas = np.clip(hora_fin - hora_inicio + 1, 1, max_horas)
+
+    # Expandir cada estancia en las horas que abarca: (estancia, hora) por fila
+    indices = np.repeat(np.arange(len(entradas)), horas)
+    inicio_grupo = np.repeat(np.cumsum(horas) - horas, horas)
+    hora = hora_inicio[indices] + (np.arange(len(indices)) - inicio_grupo)
+
+    traslape = (np.minimum(salidas[indices], (hora + 1) * 3600)
+                - np.maximum(entradas[indices], hora * 3600))
+    return np.bincount(_hora_semana(hora), weights=np.maximum(traslape, 0), minlength=HORAS_SEMANA)
+
+
+def _ocurrencias_hora_semana(inicio_s, fin_s):
+    """Cuántas veces aparece cada hora de la semana entre dos instantes (en segundos)"""
+    horas = np.arange(inicio_s // 3600, max(fin_s // 3600, inicio_s // 3600 + 1), dtype=np.int64)
+    return np.bincount(_hora_semana(horas), minlength=HORAS_SEMANA)
+
+
+@solo_lectura
+def calcular_analitica(fecha_inicio=None, fecha_fin=None, tamano_bloque=TAMANO_BLOQUE):
+    if np is None:
+        raise RuntimeError("NumPy no está instalado")
+
+    fecha_inicio_dt, fecha_fin_dt = _rango_fechas(fecha_inicio, fecha_fin)
+    R, _ = _fuentes_rentas(fecha_inicio_dt, fecha_fin_dt)
+
+    consulta = select(
+        R.habitacion_id,
+        _segundos(R.hora_entrada),
+        _segundos(R.hora_salida_real),
+        func.coalesce(R.pago_final, 0.0),
+        func.coalesce(R.pago_extra, 0.0)
+    ).where(R.estado == 'CERRADA', R.hora_salida_real.isnot(None))
+    if fecha_inicio_dt:
+        consulta = consulta.where(R.hora_entrada.between(fecha_inicio_dt, fecha_fin_dt))
+
+    habitaciones = cache_habitaciones.listar()
+    max_id = max((h.id for h in habitaciones), default=0)
+
+    # Acumuladores de tamaño fijo
+    ocupado = np.zeros(HORAS_SEMANA)
+    rentas_por_habitacion = np.zeros(max_id + 1, dtype=np.int64)
+    total_rentas = 0
+    total_ingreso = 0.0
+    total_estancia = 0.0
+    con_extra = 0
+    primera_entrada = None
+    ultima_salida = None
+
+    resultado = db.session.execute(consulta.execution_options(yield_per=tamano_bloque))
+    for filas in resultado.partitions():
+        # fromiter sobre los valores planos: np.array(filas) busca __array__ en cada Row y es ~4x más lento
+        bloque = np.fromiter(chain.from_iterable(filas), dtype=np.float64, count=len(filas) * 5).reshape(-1, 5)
+        habitacion = bloque[:, 0].astype(np.int64)
+        entradas = bloque[:, 1].astype(np.int64)
+        salidas = np.maximum(bloque[:, 2].astype(np.int64), entradas + 1)
+
+        ocupado += _ocupacion_bloque(entradas, salidas)
+        if habitacion.max() >= len(rentas_por_habitacion):
+            rentas_por_habitacion = np.pad(rentas_por_habitacion, (0, habitacion.max() + 1 - len(rentas_por_habitacion)))
+        rentas_por_habitacion += np.bincount(habitacion, minlength=len(rentas_por_habitacion))
+
+        total_rentas += len(bloque)
+        total_ingreso += bloque[:, 3].sum()
+        total_estancia += (salidas - entradas).sum()
+        con_extra += int((bloque[:, 4] > 0).sum())
+        primera_entrada = entradas.min() if primera_entrada is None else min(primera_entrada, entradas.min())
+        ultima_salida = salidas.max() if ultima_salida is None else max(ultima_salida, salidas.max())
+
+    # Periodo analizado: el rango pedido o, sin filtros, el que cubren los datos
+    if fecha_inicio_dt:
+        inicio_s = int((fecha_inicio_dt - _EPOCA).total_seconds())
+        fin_s = int((fecha_fin_dt - _EPOCA).total_seconds())
+    elif total_rentas:
+        inicio_s, fin_s = int(primera_entrada), int(ultima_salida)
+    else:
+        inicio_s = fin_s = 0
+
+    num_habitaciones = len(habitaciones)
+    dias = max((fin_s - inicio_s) / 86400, 1 / 24)
+    capacidad = _ocurrencias_hora_semana(inicio_s, fin_s) * 3600.0 * max(num_habitaciones, 1)
+
+    # Horas fuera de servicio por mantenimiento (pocas ventanas: un solo bloque sin límite de horas)
+    mantenimiento = np.zeros(HORAS_SEMANA)
+    if fin_s > inicio_s:
+        intervalos = intervalos_mantenimiento(_EPOCA + timedelta(seconds=inicio_s), _EPOCA + timedelta(seconds=fin_s))
+        if intervalos:
+            segundos = np.array([[(desde - _EPOCA).total_seconds(), (hasta - _EPOCA).total_seconds()]
+                                 for desde, hasta in intervalos], dtype=np.int64)
+            mantenimiento = _ocupacion_bloque(segundos[:, 0], np.maximum(segundos[:, 1], segundos[:, 0] + 1),
+                                              max_horas=np.iinfo(np.int32).max)
+    capacidad = np.maximum(capacidad - mantenimiento, 0.0)
+    ocupacion = np.divide(ocupado, capacidad, out=np.zeros(HORAS_SEMANA), where=capacidad > 0)
+
+    return {
+        'periodo': {
+            'inicio': (_EPOCA + timedelta(seconds=inicio_s)).strftime('%Y-%m-%d %H:%M') if total_rentas or fecha_inicio_dt else None,
+            'fin': (_EPOCA + timedelta(seconds=fin_s)).strftime('%Y-%m-%d %H:%M') if total_rentas or fecha_inicio_dt else None,
+            'dias': round(dias, 2)
+        },
+        'total_rentas': total_rentas,
+        'total_ingreso': round(float(total_ingreso), 2),
+        'estancia_promedio_horas': round(float(total_estancia) / total_rentas / 3600, 2) if total_rentas else 0.0,
+        'revpar': round(float(total_ingreso) / max(num_habitaciones, 1) / dias, 2),
+        'ocupacion_promedio': round(float(ocupado.sum() / capacidad.sum()), 4) if capacidad.sum() else 0.0,
+        'horas_mantenimiento': round(float(mantenimiento.sum()) / 3600, 2),
+        # 7 filas (lunes..domingo) x 24 horas
+        'ocupacion_hora_semana': np.round(ocupacion, 4).reshape(7, 24).tolist(),
+        'rotacion_por_habitacion': [{
+            'numero': h.numero,
+            'rentas': int(rentas_por_habitacion[h.id]) if h.id < len(rentas_por_habitacion) else 0,
+            'rentas_por_dia': round(float(rentas_por_habitacion[h.id]) / dias, 3) if h.id < len(rentas_por_habitacion) else 0.0
+        } for h in habitaciones],
+        'frecuencia_horas_extra': round(con_extra / total_rentas, 4) if total_rentas else 0.0
+    }
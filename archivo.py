@@ -0,0 +1,53 @@
+"""
+Archivo en frío de rentas cerradas antiguas (ver también particiones.py).
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete
+
+from models import db, Renta, RegistroAcceso, RentaArchivo, RegistroAccesoArchivo
+from cache_reportes import marcar_cambio
+
+
+# --- ARCHIVO DE RENTAS CERRADAS (datos fríos) ---
+def archivar_rentas(horizonte_dias, tamano_lote=500):
+    """
+    Mueve a 'rentas_archivo' / 'registros_acceso_archivo' las rentas CERRADAS cuya salida
+    real es anterior al horizonte, en lotes cortos (una transacción por lote) para no
+    mantener bloqueos largos sobre las tablas que usan el check-in y el check-out.
+    Regresa el número de rentas archivadas.
+    """
+    limite = datetime.now() - timedelta(days=horizonte_dias)
+    columnas_renta = [c.name for c in Renta.__table__.columns]
+    columnas_acceso = [c.name for c in RegistroAcceso.__table__.columns]
+    total = 0
+
+    while True:
+        ids = [renta_id for (renta_id,) in db.session.query(Renta.id).filter(
+            Renta.estado == 'CERRADA',
+            Renta.hora_salida_real < limite
+        ).order_by(Renta.id).limit(tamano_lote).all()]
+
+        if not ids:
+            break
+
+        try:
+            db.session.execute(insert(RentaArchivo).from_select(
+                columnas_renta,
+                select(*[Renta.__table__.c[c] for c in columnas_renta]).where(Renta.id.in_(ids))
+            ))
+            db.session.execute(insert(RegistroAccesoArchivo).from_select(
+                columnas_acceso,
+                select(*[RegistroAcceso.__table__.c[c] for c in columnas_acceso]).where(RegistroAcceso.renta_id.in_(ids))
+            ))
+            db.session.execute(delete(RegistroAcceso).where(RegistroAcceso.renta_id.in_(ids)))
+            db.session.execute(delete(Renta).where(Renta.id.in_(ids)))
+            # Los reportes cacheados de esos días (en todos los workers) se recalculan
+            marcar_cambio(db.session.connection())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        total += len(ids)
+
+    return total
@@ -0,0 +1,242 @@
+"""
+Punto de entrada ASGI con endpoints asíncronos para pantallas siempre abiertas:
+
+    uvicorn asgi:app --workers 2
+
+- GET /api/stream/habitaciones          -> Server-Sent Events con las rentas activas
+- GET /api/longpoll/habitaciones?version=N -> responde en cuanto la versión cambia (o al expirar)
+
+El stream también emite eventos 'vencimiento' (POR_VENCER / VENCIDA) del monitor de vencimientos.
+
+Ambos se atienden en el event loop: una conexión inactiva es solo una corrutina y una cola,
+no un worker ni un hilo. Un único difusor por proceso consulta la base de datos cada
+ASYNC_INTERVALO_SEGUNDOS (en un hilo del executor) y reparte los cambios a todos los
+suscriptores. La versión es la de sincronizacion.version_pantallas(), guardada en la base
+de datos: es la misma en todos los workers (un long-poll puede caer en cualquiera) y solo
+cambia con escrituras, así que los clientes no despiertan mientras nada cambie; el
+tiempo restante y las horas extra se recalculan al enviar. El resto de las rutas (formularios de checkin/checkout, reportes, etc.)
+se delegan a la aplicación Flask síncrona a través de asgiref.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from models import Renta
+
+INTERVALO_SEGUNDOS = float(os.environ.get("ASYNC_INTERVALO_SEGUNDOS", 2))
+LONGPOLL_TIMEOUT_SEGUNDOS = float(os.environ.get("ASYNC_LONGPOLL_TIMEOUT", 25))
+HEARTBEAT_SEGUNDOS = 15
+
+
+class Difusor:
+    """Consulta periódica compartida de las rentas activas y reparto a suscriptores"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.version = None  # Versión de sincronizacion.version_pantallas(); None antes de la primera consulta
+        self._datos = []
+        self._salidas = {}  # renta_id -> (hora_salida_estimada, es_hora_extra) para refrescar los contadores
+        self._suscriptores = set()
+        self._tarea = None
+
+    def _consultar(self, version_conocida):
+        # Se ejecuta en un hilo del executor con su propio contexto de aplicación
+        from controllers.room_controller import datos_renta_activa
+        from sincronizacion import version_pantallas
+        from vencimientos import monitor_vencimientos
+        with self.flask_app.app_context():
+            monitor_vencimientos.actualizar()
+            version = version_pantallas()
+            if version == version_conocida:
+                return version, None  # Nada escrito desde la última consulta: no se leen las rentas
+            rentas = Renta.query.filter(Renta.estado == 'ACTIVA').all()
+            datos = [datos_renta_activa(renta) for renta in rentas]
+            salidas = {renta.id: (renta.hora_salida_estimada, monitor_vencimientos.esta_vencida(renta.id))
+                       for renta in rentas}
+            return version, (datos, salidas)
+
+    async def _ciclo(self):
+        loop = asyncio.get_running_loop()
+        while self._suscriptores:
+            try:
+                # La versión sale de contadores en la base de datos: cambia solo cuando alguien
+                # escribe (en cualquier worker), nunca por el paso del tiempo
+                version, nuevos = await loop.run_in_executor(None, self._consultar, self.version)
+                if nuevos is not None:
+                    self._datos, self._salidas = nuevos
+                    self.version = version
+                    for cola in self._suscriptores:
+                        # Cola de tamaño 1: un suscriptor lento solo necesita saber que hubo cambios
+                        if cola.empty():
+                            cola.put_nowait(self.version)
+            except Exception as e:
+                self.flask_app.logger.error(f"Error en el difusor de habitaciones: {e}")
+            await asyncio.sleep(INTERVALO_SEGUNDOS)
+        self._tarea = None
+
+    @property
+    def datos(self):
+        """Últimas rentas con tiempo restante / horas extra recalculados al momento de enviarlas"""
+        from controllers.room_controller import tiempos_renta
+        ahora = datetime.now()
+        datos = []
+        for renta in self._datos:
+            hora_salida, es_hora_extra = self._salidas[renta['renta_id']]
+            tiempo_restante, horas_extra = tiempos_renta(hora_salida, es_hora_extra, ahora)
+            datos.append(dict(renta, tiempo_restante=tiempo_restante, horas_extra=horas_extra))
+        return datos
+
+    def suscribir(self):
+        cola = asyncio.Queue(maxsize=1)
+        self._suscriptores.add(cola)
+        if self._tarea is None:
+            self._tarea = asyncio.get_running_loop().create_task(self._ciclo())
+        return cola
+
+    def cancelar(self, cola):
+        self._suscriptores.discard(cola)
+
+    async def esperar_cambio(self, version, timeout):
+        """
+        Espera hasta tener una versión posterior a 'version' o a que se agote el tiempo. Una
+        versión del cliente más nueva que la de este proceso (la recibió de otro worker que
+        consultó antes) también espera: este difusor la alcanza en el siguiente ciclo.
+        """
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + timeout
+        cola = self.suscribir()
+        try:
+            while self.version is None or self.version <= version:
+                restante = limite - loop.time()
+                if restante <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(cola.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            self.cancelar(cola)
+        return self.version or 0, self.datos
+
+
+class AplicacionAsgi:
+    """Enruta /api/stream y /api/longpoll al event loop y todo lo demás a Flask"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.difusor = None
+        self._serializador = flask_app.session_interface.get_signing_serializer(flask_app)
+
+    def _autenticado(self, scope):
+        """Valida la cookie de sesión de Flask (firmada) y que contenga un usuario de Flask-Login"""
+        if self._serializador is None:
+            return False
+        cabeceras = dict(scope.get('headers', []))
+        cookie = SimpleCookie(cabeceras.get(b'cookie', b'').decode('latin-1'))
+        nombre = self.flask_app.config.get('SESSION_COOKIE_NAME', 'session')
+        if nombre not in cookie:
+            return False
+        try:
+            sesion = self._serializador.loads(
+                cookie[nombre].value,
+                max_age=int(self.flask_app.permanent_session_lifetime.total_seconds())
+            )
+        except Exception:
+            return False
+        return bool(sesion.get('_user_id'))
+
+    async def __call__(self, scope, receive, send):
+        ruta = scope.get('path', '') if scope['type'] == 'http' else ''
+
+        if ruta in ('/api/stream/habitaciones', '/api/longpoll/habitaciones'):
+            if self.difusor is None:
+                self.difusor = Difusor(self.flask_app)
+            if not self._autenticado(scope):
+                await self._responder_json(send, 401, {'error': 'No autenticado'})
+            elif ruta == '/api/stream/habitaciones':
+                await self._stream(receive, send)
+            else:
+                await self._longpoll(scope, send)
+            return
+
+        await self.wsgi(scope, receive, send)
+
+    async def _responder_json(self, send, estado, cuerpo):
+        datos = json.dumps(cuerpo, default=str).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': estado,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'cache-control', b'no-store'),
+                                (b'content-length', str(len(datos)).encode())]})
+        await send({'type': 'http.response.body', 'body': datos})
+
+    async def _longpoll(self, scope, send):
+        parametros = parse_qs(scope.get('query_string', b'').decode())
+        try:
+            version = int(parametros.get('version', ['0'])[0])
+        except ValueError:
+            version = 0
+        version, datos = await self.difusor.esperar_cambio(version, LONGPOLL_TIMEOUT_SEGUNDOS)
+        await self._responder_json(send, 200, {'version': version, 'habitaciones': datos})
+
+    async def _stream(self, receive, send):
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/event-stream'),
+                                (b'cache-control', b'no-store'),
+                                (b'x-accel-buffering', b'no')]})
+
+        from vencimientos import monitor_vencimientos
+
+        cola = self.difusor.suscribir()
+        desconectado = asyncio.ensure_future(self._esperar_desconexion(receive))
+        # Solo se reenvían alertas de vencimiento generadas después de abrir la conexión
+        loop = asyncio.get_running_loop()
+        ultimo_seq = await loop.run_in_executor(None, self._en_contexto, monitor_vencimientos.ultimo_seq)
+        try:
+            if self.difusor.version is not None:
+                await self._evento(send, self.difusor.version, self.difusor.datos)
+            while not desconectado.done():
+                espera = asyncio.ensure_future(cola.get())
+                hecho, _ = await asyncio.wait({espera, desconectado}, timeout=HEARTBEAT_SEGUNDOS,
+                                              return_when=asyncio.FIRST_COMPLETED)
+                if espera in hecho:
+                    await self._evento(send, self.difusor.version, self.difusor.datos)
+                    alertas = await loop.run_in_executor(None, self._en_contexto,
+                                                         monitor_vencimientos.eventos_desde, ultimo_seq)
+                    for alerta in alertas:
+                        ultimo_seq = alerta['seq']
+                        await self._evento(send, alerta['seq'], alerta, tipo='vencimiento')
+                else:
+                    espera.cancel()
+                    if not desconectado.done():
+                        # Comentario SSE para mantener viva la conexión a través de proxies
+                        await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+        except OSError:
+            pass
+        finally:
+            self.difusor.cancelar(cola)
+            desconectado.cancel()
+
+    def _en_contexto(self, funcion, *args):
+        # Consultas a la base de datos desde el executor, con contexto de aplicación
+        with self.flask_app.app_context():
+            return funcion(*args)
+
+    async def _evento(self, send, version, datos, tipo='habitaciones'):
+        cuerpo = f"id: {version}\nevent: {tipo}\ndata: {json.dumps(datos, default=str)}\n\n"
+        await send({'type': 'http.response.body', 'body': cuerpo.encode('utf-8'), 'more_body': True})
+
+    async def _esperar_desconexion(self, receive):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'http.disconnect':
+                return
+
+
+app = AplicacionAsgi(create_app())
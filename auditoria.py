@@ -0,0 +1,238 @@
+"""
+Auditoría nocturna: cierre del día y revisión de integridad.
+
+1. Reglas de integridad (una consulta por regla, sin recorrer rentas en Python):
+   - habitación OCUPADA sin una renta ACTIVA            -> se pasa a LIMPIEZA
+   - habitación en LIMPIEZA sin ninguna renta CERRADA   -> se pasa a DISPONIBLE
+   - renta CERRADA con pago_final NULL (activa o archivo) -> pago_horas + pago_extra
+   - actividad_horaria que no cuadra con las rentas     -> se reconstruye el rango
+   Las reparaciones solo se aplican con --reparar. Las de habitaciones pasan por el ORM,
+   así que la bitácora, la caché de habitaciones y la cola de limpieza las registran.
+2. Cierre: los totales de cada día (entradas, salidas, horas, ingresos) se calculan con
+   consultas agrupadas por día sobre el índice de hora_entrada y se congelan en
+   cierres_diarios. Un día ya cerrado no se vuelve a calcular salvo con --recalcular.
+
+    flask night-audit [--fecha YYYY-MM-DD] [--desde YYYY-MM-DD] [--reparar] [--recalcular]
+
+Por defecto cierra el día anterior (cron después de medianoche). Con --desde cierra
+también todos los días pendientes desde esa fecha (primera ejecución sobre datos históricos).
+"""
+import json
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import exists, func, update
+
+from models import db, Habitacion, Renta, RentaArchivo, ActividadHora, CierreDiario, EstadoHabitacion
+from actividad import MARGEN_ESTANCIA
+from cache_reportes import cache_reportes, marcar_cambio
+
+MAX_IDS_REPORTE = 20  # ids de ejemplo por regla en la salida y en el detalle guardado
+TOLERANCIA_INGRESO = 0.01
+
+
+# --- Totales por día ---
+
+def _fecha(valor):
+    # func.date regresa 'YYYY-MM-DD' en SQLite y un date en MySQL
+    return datetime.strptime(str(valor)[:10], '%Y-%m-%d').date()
+
+
+def totales_por_dia(desde, hasta):
+    """{fecha: {checkins, checkouts, horas_rentadas, ingreso_inicial, ingreso_extra, ingreso_total}} en [desde, hasta)"""
+    from reportes import _fuentes_rentas
+
+    inicio_dt = datetime.combine(desde, datetime.min.time())
+    fin_dt = datetime.combine(hasta, datetime.min.time())
+    R, _ = _fuentes_rentas(inicio_dt - MARGEN_ESTANCIA, fin_dt)
+
+    totales = {}
+
+    def _dia(fecha):
+        return totales.setdefault(fecha, dict(checkins=0, checkouts=0, horas_rentadas=0,
+                                              ingreso_inicial=0.0, ingreso_extra=0.0, ingreso_total=0.0))
+
+    dia_entrada = func.date(R.hora_entrada)
+    for dia, checkins, horas, ingreso in db.session.query(
+        dia_entrada, func.count(R.id), func.sum(R.horas_reservadas), func.sum(R.pago_horas)
+    ).filter(R.hora_entrada >= inicio_dt, R.hora_entrada < fin_dt).group_by(dia_entrada):
+        datos = _dia(_fecha(dia))
+        datos.update(checkins=checkins, horas_rentadas=int(horas or 0), ingreso_inicial=float(ingreso or 0))
+
+    # Salidas del rango: la entrada está acotada por el margen de estancia para usar el índice
+    dia_salida = func.date(R.hora_salida_real)
+    for dia, checkouts, extra in db.session.query(
+        dia_salida, func.count(R.id), func.sum(func.coalesce(R.pago_extra, 0))
+    ).filter(
+        R.hora_entrada >= inicio_dt - MARGEN_ESTANCIA, R.hora_entrada < fin_dt,
+        R.hora_salida_real >= inicio_dt, R.hora_salida_real < fin_dt
+    ).group_by(dia_salida):
+        datos = _dia(_fecha(dia))
+        datos.update(checkouts=checkouts, ingreso_extra=float(extra or 0))
+
+    for datos in totales.values():
+        datos['ingreso_total'] = round(datos['ingreso_inicial'] + datos['ingreso_extra'], 2)
+    return totales
+
+
+# --- Reglas de integridad ---
+
+def _violacion(regla, descripcion, ids, total=None):
+    return {'regla': regla, 'descripcion': descripcion, 'total': len(ids) if total is None else total,
+            'ids': list(ids)[:MAX_IDS_REPORTE], 'reparadas': 0}
+
+
+def _habitaciones_ocupadas_sin_renta(reparar):
+    activa = exists().where(Renta.habitacion_id == Habitacion.id, Renta.estado == 'ACTIVA')
+    habitaciones = Habitacion.query.filter(Habitacion.estado == EstadoHabitacion.OCUPADA, ~activa).all()
+    violacion = _violacion('habitacion_ocupada_sin_renta', 'Habitación OCUPADA sin renta ACTIVA',
+                           [h.numero for h in habitaciones])
+    if reparar and habitaciones:
+        for habitacion in habitaciones:
+            habitacion.estado = EstadoHabitacion.LIMPIEZA
+        db.session.commit()
+        violacion['reparadas'] = len(habitaciones)
+    return violacion
+
+
+def _limpieza_sin_renta_cerrada(reparar):
+    cerrada = exists().where(Renta.habitacion_id == Habitacion.id, Renta.estado == 'CERRADA')
+    habitaciones = Habitacion.query.filter(Habitacion.estado == EstadoHabitacion.LIMPIEZA, ~cerrada).all()
+    violacion = _violacion('limpieza_sin_renta_cerrada', 'Habitación en LIMPIEZA sin ninguna renta CERRADA',
+                           [h.numero for h in habitaciones])
+    if reparar and habitaciones:
+        for habitacion in habitaciones:
+            habitacion.estado = EstadoHabitacion.DISPONIBLE
+        db.session.commit()
+        violacion['reparadas'] = len(habitaciones)
+    return violacion
+
+
+def _rentas_sin_pago_final(reparar):
+    ids, total, reparadas = [], 0, 0
+    for modelo in (Renta, RentaArchivo):
+        filtros = (modelo.estado == 'CERRADA', modelo.pago_final.is_(None))
+        total += db.session.query(func.count()).select_from(modelo).filter(*filtros).scalar()
+        ids += [i for (i,) in db.session.query(modelo.id).filter(*filtros).order_by(modelo.id).limit(MAX_IDS_REPORTE)]
+        if reparar:
+            reparadas += db.session.execute(
+                update(modelo).where(*filtros).values(pago_final=modelo.pago_horas + func.coalesce(modelo.pago_extra, 0)),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+    if reparadas:
+        # Los reportes cacheados en todos los workers se recalculan
+        marcar_cambio(db.session.connection())
+    db.session.commit()
+
+    violacion = _violacion('renta_cerrada_sin_pago_final', 'Renta CERRADA con pago_final NULL', ids, total)
+    violacion['reparadas'] = reparadas
+    if reparadas:
+        cache_reportes.invalidar()
+    return violacion
+
+
+def _actividad_descuadrada(totales, desde, hasta, reparar):
+    materializada = {fecha: (checkins, checkouts, float(ingreso or 0)) for fecha, checkins, checkouts, ingreso in
+                     db.session.query(ActividadHora.fecha, func.sum(ActividadHora.checkins),
+                                      func.sum(ActividadHora.checkouts), func.sum(ActividadHora.ingreso))
+                     .filter(ActividadHora.fecha >= desde, ActividadHora.fecha < hasta)
+                     .group_by(ActividadHora.fecha)}
+
+    descuadrados = []
+    for fecha in sorted(set(totales) | set(materializada)):
+        esperado = totales.get(fecha)
+        real = materializada.get(fecha, (0, 0, 0.0))
+        if esperado is None:
+            esperado = dict(checkins=0, checkouts=0, ingreso_total=0.0)
+        if (esperado['checkins'], esperado['checkouts']) != (real[0], real[1]) or \
+                abs(esperado['ingreso_total'] - real[2]) > TOLERANCIA_INGRESO:
+            descuadrados.append(fecha)
+
+    violacion = _violacion('actividad_descuadrada', 'actividad_horaria no cuadra con las rentas del día',
+                           [f.isoformat() for f in descuadrados])
+    if reparar and descuadrados:
+        from actividad import reconstruir_actividad
+        reconstruir_actividad(descuadrados[0], descuadrados[-1] + timedelta(days=1))
+        violacion['reparadas'] = len(descuadrados)
+    return violacion
+
+
+def verificar_integridad(reparar=False):
+    """Reglas sobre el estado actual (habitaciones y rentas)"""
+    return [
+        _habitaciones_ocupadas_sin_renta(reparar),
+        _limpieza_sin_renta_cerrada(reparar),
+        _rentas_sin_pago_final(reparar),
+    ]
+
+
+# --- Cierre ---
+
+def auditoria_nocturna(fecha=None, desde=None, reparar=False, recalcular=False):
+    """
+    Revisa la integridad y congela los totales de los días [desde, fecha] (por defecto solo
+    'fecha', que por defecto es ayer). ValueError si el día todavía no termina.
+    """
+    fecha = fecha or date.today() - timedelta(days=1)
+    desde = min(desde or fecha, fecha)
+    if fecha >= date.today():
+        raise ValueError(f"El día {fecha.isoformat()} aún no termina.")
+    hasta = fecha + timedelta(days=1)
+
+    violaciones = verificar_integridad(reparar)
+    totales = totales_por_dia(desde, hasta)
+    violaciones.append(_actividad_descuadrada(totales, desde, hasta, reparar))
+
+    cerrados = {f for (f,) in db.session.query(CierreDiario.fecha).filter(
+        CierreDiario.fecha >= desde, CierreDiario.fecha < hasta)}
+    if recalcular and cerrados:
+        CierreDiario.query.filter(CierreDiario.fecha >= desde, CierreDiario.fecha < hasta).delete(synchronize_session=False)
+        cerrados = set()
+
+    ahora = datetime.now()
+    nuevos = []
+    dia = desde
+    while dia < hasta:
+        if dia not in cerrados:
+            datos = totales.get(dia) or dict(checkins=0, checkouts=0, horas_rentadas=0,
+                                             ingreso_inicial=0.0, ingreso_extra=0.0, ingreso_total=0.0)
+            nuevos.append(dict(fecha=dia, cerrado_at=ahora, violaciones=0, reparadas=0, **datos))
+        dia += timedelta(days=1)
+    if nuevos:
+        db.session.execute(CierreDiario.__table__.insert(), nuevos)
+
+    # El resultado de la auditoría se registra en el día auditado
+    encontradas = [v for v in violaciones if v['total']]
+    db.session.execute(update(CierreDiario).where(CierreDiario.fecha == fecha).values(
+        violaciones=sum(v['total'] for v in encontradas),
+        reparadas=sum(v['reparadas'] for v in encontradas),
+        detalle=json.dumps(encontradas) if encontradas else None
+    ))
+    db.session.commit()
+
+    return {
+        'fecha': fecha,
+        'dias_cerrados': len(nuevos),
+        'cierre': serializar(CierreDiario.query.get(fecha)),
+        'violaciones': violaciones
+    }
+
+
+def serializar(cierre):
+    return {
+        'fecha': cierre.fecha.isoformat(),
+        'checkins': cierre.checkins,
+        'checkouts': cierre.checkouts,
+        'horas_rentadas': cierre.horas_rentadas,
+        'ingreso_inicial': round(cierre.ingreso_inicial, 2),
+        'ingreso_extra': round(cierre.ingreso_extra, 2),
+        'ingreso_total': round(cierre.ingreso_total, 2),
+        'violaciones': cierre.violaciones,
+        'reparadas': cierre.reparadas,
+        'cerrado_at': cierre.cerrado_at.strftime('%Y-%m-%d %H:%M') if cierre.cerrado_at else None
+    }
+
+
+def cierres(desde, hasta):
+    """Días cerrados en [desde, hasta]"""
+    return [serializar(c) for c in CierreDiario.query.filter(
+        CierreDiario.fecha >= desde, CierreDiario.fecha <= hasta).order_by(CierreDiario.fecha)]
@@ -0,0 +1,88 @@
+"""
+Benchmark de analitica.calcular_analitica() con un millón de rentas cerradas:
+
+    python benchmarks/bench_analitica.py [--rentas 1000000] [--habitaciones N] [--dias 365]
+
+Mide la carga, el cálculo vectorizado (mejor de N ejecuciones, filas/s y memoria máxima
+del proceso, que no debe crecer con --rentas) y, como referencia, el mismo cálculo
+renta por renta en Python puro sobre las mismas filas; ambos deben dar los mismos totales.
+Sin --habitaciones se usan las necesarias para ~4 rentas por habitación al día (ocupación < 100%).
+"""
+import argparse
+import time
+
+from comun import crear_app_bench, crear_habitaciones, insertar_rentas, cronometrar, memoria_maxima_mb
+
+import analitica
+from models import db, Renta
+from cache_habitaciones import cache_habitaciones
+
+
+def referencia_python(limite=None):
+    """Estancia, ingreso y ocupación por hora de la semana fila por fila (sin NumPy)"""
+    consulta = db.session.query(Renta.hora_entrada, Renta.hora_salida_real, Renta.pago_final) \
+        .filter(Renta.estado == 'CERRADA', Renta.hora_salida_real.isnot(None)).order_by(Renta.id)
+    if limite:
+        consulta = consulta.limit(limite)
+
+    ocupado = [0.0] * analitica.HORAS_SEMANA
+    total, ingreso, estancia = 0, 0.0, 0.0
+    for entrada, salida, pago in consulta.yield_per(analitica.TAMANO_BLOQUE):
+        inicio = int((entrada - analitica._EPOCA).total_seconds())
+        fin = max(int((salida - analitica._EPOCA).total_seconds()), inicio + 1)
+        for hora in range(inicio // 3600, min((fin - 1) // 3600 + 1, inicio // 3600 + analitica.MAX_HORAS_ESTANCIA)):
+            dia = hora // 24
+            indice = ((dia + analitica._DESPLAZAMIENTO_DIA) % 7) * 24 + hora % 24
+            ocupado[indice] += max(min(fin, (hora + 1) * 3600) - max(inicio, hora * 3600), 0)
+        total += 1
+        ingreso += pago or 0.0
+        estancia += fin - inicio
+    return {'total_rentas': total, 'total_ingreso': round(ingreso, 2),
+            'estancia_promedio_horas': round(estancia / total / 3600, 2) if total else 0.0,
+            'segundos_ocupados': round(sum(ocupado))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rentas', type=int, default=1_000_000)
+    parser.add_argument('--habitaciones', type=int)
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--sin-referencia', action='store_true', help='Omite el cálculo en Python puro')
+    args = parser.parse_args()
+
+    if not analitica.disponible():
+        raise SystemExit("NumPy no está instalado: la analítica no está disponible")
+
+    args.habitaciones = args.habitaciones or max(40, args.rentas // (args.dias * 4))
+
+    app = crear_app_bench()
+    with app.app_context():
+        habitaciones = crear_habitaciones(args.habitaciones)[None]
+        carga = insertar_rentas(args.rentas, habitaciones, dias=args.dias)
+        print(f"motor: {db.engine.dialect.name}   rentas: {args.rentas:,}   habitaciones: {args.habitaciones}")
+        print(f"carga:             {carga:8.2f} s  ({args.rentas / carga:,.0f} filas/s)")
+        memoria_inicial = memoria_maxima_mb()
+
+        tiempo, resultado = cronometrar(analitica.calcular_analitica, args.repeticiones, antes=cache_habitaciones.invalidar)
+        assert resultado['total_rentas'] == args.rentas
+        print(f"analítica NumPy:   {tiempo:8.2f} s  ({args.rentas / tiempo:,.0f} filas/s, mejor de {args.repeticiones})")
+        print(f"memoria máxima:    {memoria_maxima_mb():8.0f} MB (antes del cálculo: {memoria_inicial:.0f} MB)")
+        print(f"ocupación: {resultado['ocupacion_promedio']:.4f}   estancia: {resultado['estancia_promedio_horas']} h   "
+              f"RevPAR: {resultado['revpar']}   horas extra: {resultado['frecuencia_horas_extra']:.4f}")
+
+        if args.sin_referencia:
+            return
+        t0 = time.perf_counter()
+        referencia = referencia_python()
+        tiempo_python = time.perf_counter() - t0
+        print(f"referencia Python: {tiempo_python:8.2f} s  ({args.rentas / tiempo_python:,.0f} filas/s, "
+              f"{tiempo_python / tiempo:.1f}x más lento)")
+
+        for clave in ('total_rentas', 'total_ingreso', 'estancia_promedio_horas'):
+            assert referencia[clave] == resultado[clave], (clave, referencia[clave], resultado[clave])
+        print("totales idénticos en ambas rutas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Benchmark de conexiones abiertas por GB de memoria del servidor ASGI:
+
+    python benchmarks/bench_conexiones.py [--conexiones 1000 2500 5000] [--modo stream|longpoll]
+
+Levanta 'python -m uvicorn asgi:app' (un proceso) sobre una base SQLite nueva, abre en
+escalones las conexiones indicadas a /api/stream/habitaciones (o a /api/longpoll con un
+timeout largo) con una cookie de sesión firmada del usuario admin y mide el VmRSS del
+servidor en /proc: bytes por conexión inactiva y conexiones por GB. Cada conexión debe costar
+una corrutina y una cola, no un hilo; el límite práctico es 'ulimit -n' (cliente y servidor).
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+from comun import RAIZ, crear_app_bench, crear_habitaciones, uri_bench
+
+RUTAS = {'stream': '/api/stream/habitaciones', 'longpoll': '/api/longpoll/habitaciones?version=0'}
+APERTURAS_SIMULTANEAS = 200
+
+
+def memoria_residente(pid):
+    """VmRSS del proceso en bytes"""
+    with open(f'/proc/{pid}/status') as status:
+        for linea in status:
+            if linea.startswith('VmRSS:'):
+                return int(linea.split()[1]) * 1024
+    raise RuntimeError(f"Sin VmRSS para el proceso {pid}")
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def cookie_admin(app):
+    """Cookie de sesión firmada como la que deja el login (la valida asgi._autenticado)"""
+    with app.app_context():
+        serializador = app.session_interface.get_signing_serializer(app)
+        valor = serializador.dumps({'_user_id': '1', '_fresh': True})
+    return f"{app.config.get('SESSION_COOKIE_NAME', 'session')}={valor}"
+
+
+def iniciar_servidor(uri, puerto):
+    entorno = dict(os.environ, DATABASE_URL=uri, ASYNC_LONGPOLL_TIMEOUT='3600')
+    servidor = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(puerto),
+                                 '--log-level', 'warning', '--no-access-log', '--backlog', '4096',
+                                 '--timeout-graceful-shutdown', '5'],
+                                cwd=RAIZ, env=entorno)
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        if servidor.poll() is not None:
+            raise RuntimeError("El servidor terminó al arrancar")
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=1).close()
+            return servidor
+        except OSError:
+            time.sleep(0.2)
+    servidor.terminate()
+    raise RuntimeError("El servidor no respondió en 30 s")
+
+
+async def abrir(puerto, ruta, cookie, modo, semaforo):
+    """Abre una conexión y la deja inactiva; en stream espera las cabeceras (status 200)"""
+    async with semaforo:
+        lector, escritor = await asyncio.open_connection('127.0.0.1', puerto)
+        escritor.write(f"GET {ruta} HTTP/1.1\r\nHost: localhost\r\nCookie: {cookie}\r\n\r\n".encode())
+        await escritor.drain()
+        if modo == 'stream':
+            cabeceras = await lector.readuntil(b'\r\n\r\n')
+            if not cabeceras.startswith(b'HTTP/1.1 200'):
+                raise RuntimeError(cabeceras.split(b'\r\n', 1)[0].decode())
+        return escritor
+
+
+async def medir(pid, puerto, cookie, modo, escalones, espera):
+    ruta = RUTAS[modo]
+    semaforo = asyncio.Semaphore(APERTURAS_SIMULTANEAS)
+
+    # Una conexión previa crea el difusor y el executor: la base no incluye ese costo fijo
+    abiertas = [await abrir(puerto, ruta, cookie, modo, semaforo)]
+    await asyncio.sleep(espera)
+    base = memoria_residente(pid)
+    print(f"modo: {modo}   RSS base del servidor: {base / 2 ** 20:.1f} MB")
+    print(f"{'conexiones':>10} {'RSS (MB)':>9} {'bytes/conexión':>15} {'conexiones/GB':>14}")
+
+    for objetivo in escalones:
+        nuevas = objetivo - (len(abiertas) - 1)
+        if nuevas > 0:
+            abiertas += await asyncio.gather(*(abrir(puerto, ruta, cookie, modo, semaforo) for _ in range(nuevas)))
+        await asyncio.sleep(espera)
+        rss = memoria_residente(pid)
+        por_conexion = max(rss - base, 1) / objetivo
+        print(f"{objetivo:>10} {rss / 2 ** 20:>9.1f} {por_conexion:>15,.0f} {2 ** 30 / por_conexion:>14,.0f}")
+
+    for escritor in abiertas:
+        escritor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conexiones', type=int, nargs='+', default=[1000, 2500, 5000])
+    parser.add_argument('--modo', choices=sorted(RUTAS), default='stream')
+    parser.add_argument('--espera', type=float, default=3.0, help='Segundos antes de leer el RSS de cada escalón')
+    args = parser.parse_args()
+
+    # Cliente y servidor necesitan un descriptor por conexión
+    suave, duro = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (duro, duro))
+    if max(args.conexiones) + 100 > duro:
+        raise SystemExit(f"ulimit -n ({duro}) no alcanza para {max(args.conexiones)} conexiones")
+
+    uri = uri_bench('conexiones.db')
+    app = crear_app_bench(uri)
+    with app.app_context():
+        crear_habitaciones(20)
+    cookie = cookie_admin(app)
+
+    puerto = puerto_libre()
+    servidor = iniciar_servidor(uri, puerto)
+    try:
+        asyncio.run(medir(servidor.pid, puerto, cookie, args.modo, sorted(args.conexiones), args.espera))
+    finally:
+        # Los long-polls no se enteran de la desconexión: el apagado ordenado espera hasta 5 s
+        servidor.terminate()
+        try:
+            servidor.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            servidor.kill()
+
+
+if __name__ == '__main__':
+    main()
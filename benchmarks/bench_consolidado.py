@@ -0,0 +1,88 @@
+"""
+Benchmark de escalamiento del reporte consolidado multisucursal:
+
+    python benchmarks/bench_consolidado.py [--sucursales 1 5 20 50] [--habitaciones 20] [--rentas 2000]
+
+Para cada número de sucursales (una base nueva, con --habitaciones y --rentas por sucursal)
+compara get_reporte_consolidado() con el ciclo de get_renta_reports_mejorado(sucursal_id=s)
+que reemplazó: tiempo (mejor de N, cachés de reportes vacías) y número de consultas SQL.
+Las consultas del consolidado deben mantenerse constantes; las del ciclo crecen con las sucursales.
+"""
+import argparse
+from datetime import date, timedelta
+
+from sqlalchemy import event
+
+from comun import crear_app_bench, crear_habitaciones, insertar_rentas, cronometrar, uri_bench
+
+import reportes
+from models import db
+from cache_reportes import cache_reportes
+
+
+class ContadorConsultas:
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args):
+        self.total += 1
+
+    def medir(self, funcion):
+        inicio = self.total
+        funcion()
+        return self.total - inicio
+
+
+def medir_sucursales(sucursales, habitaciones, rentas, dias, repeticiones):
+    app = crear_app_bench(uri_bench(f'consolidado_{sucursales}.db'))
+    with app.app_context():
+        por_sucursal = crear_habitaciones(habitaciones, sucursales)
+        for semilla, lista in enumerate(por_sucursal.values(), start=1):
+            insertar_rentas(rentas, lista, dias=dias, semilla=semilla)
+
+        fin = date.today()
+        desde, hasta = (fin - timedelta(days=dias + 1)).isoformat(), fin.isoformat()
+        ids = sorted(por_sucursal)
+
+        def consolidado():
+            return reportes.get_reporte_consolidado(desde, hasta)
+
+        def ciclo():
+            return [reportes.get_renta_reports_mejorado(desde, hasta, sucursal_id=s) for s in ids]
+
+        contador = ContadorConsultas(db.engine)
+        tiempo_consolidado, resultado = cronometrar(consolidado, repeticiones, antes=cache_reportes.invalidar)
+        tiempo_ciclo, por_reporte = cronometrar(ciclo, repeticiones, antes=cache_reportes.invalidar)
+        cache_reportes.invalidar()
+        consultas_consolidado = contador.medir(consolidado)
+        cache_reportes.invalidar()
+        consultas_ciclo = contador.medir(ciclo)
+
+        # Ambas rutas deben ver las mismas rentas
+        total_ciclo = sum(i['rentas'] for reporte in por_reporte for i in reporte['ingresos_tipo'])
+        assert resultado['totales']['total_rentas'] == total_ciclo == rentas * sucursales, \
+            (resultado['totales']['total_rentas'], total_ciclo)
+        db.session.remove()
+    return tiempo_consolidado, consultas_consolidado, tiempo_ciclo, consultas_ciclo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sucursales', type=int, nargs='+', default=[1, 5, 20, 50])
+    parser.add_argument('--habitaciones', type=int, default=20, help='Habitaciones por sucursal')
+    parser.add_argument('--rentas', type=int, default=2000, help='Rentas por sucursal')
+    parser.add_argument('--dias', type=int, default=30)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'sucursales':>10} {'consolidado':>12} {'consultas':>9} {'ciclo':>10} {'consultas':>9} {'aceleración':>11}")
+    for sucursales in args.sucursales:
+        t_consolidado, q_consolidado, t_ciclo, q_ciclo = medir_sucursales(
+            sucursales, args.habitaciones, args.rentas, args.dias, args.repeticiones)
+        print(f"{sucursales:>10} {t_consolidado * 1000:>10.1f}ms {q_consolidado:>9} "
+              f"{t_ciclo * 1000:>8.1f}ms {q_ciclo:>9} {t_ciclo / t_consolidado:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
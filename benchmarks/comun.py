@@ -0,0 +1,125 @@
+"""
+Utilidades compartidas por los benchmarks (scripts, no pruebas: pytest solo recolecta tests/).
+
+Cada benchmark crea su propia base SQLite en un directorio temporal, o mide contra la base
+indicada en BENCH_DATABASE_URL (p. ej. un MySQL de pruebas: se borran sus tablas), y la
+llena con executemany de Core: sin objetos ORM ni eventos de sesión, así la carga de un
+millón de rentas toma segundos y no distorsiona lo que se mide.
+"""
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+_TEMPORAL = tempfile.mkdtemp(prefix='bench_')
+os.environ.setdefault("DB_BACKEND", "sqlite")
+os.environ.setdefault("CONTINGENCIA_DIARIO", os.path.join(_TEMPORAL, 'contingencia.jsonl'))
+
+from app import create_app, load_initial_user  # noqa: E402
+from models import (db, Habitacion, Renta, RegistroAcceso, Sucursal, TipoHabitacion, ModoIngreso,  # noqa: E402
+                    EstadoHabitacion, BASE_HOUR_PRICE, LUXURY_HOUR_PRICE)
+
+LOTE = 20000
+
+
+def uri_bench(nombre='bench.db'):
+    return os.environ.get("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(_TEMPORAL, nombre)}"
+
+
+def crear_app_bench(uri=None):
+    """App sobre una base vacía con el esquema actual y el usuario admin"""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri or uri_bench()})
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    load_initial_user(app)
+    return app
+
+
+def crear_habitaciones(por_sucursal, sucursales=0):
+    """
+    Inserta por_sucursal habitaciones en cada una de 'sucursales' sucursales nuevas (sin
+    sucursal si es 0); regresa {sucursal_id: [(habitacion_id, precio)]}
+    """
+    sucursal_ids = [None]
+    if sucursales:
+        db.session.execute(Sucursal.__table__.insert(), [{'nombre': f'Sucursal {s + 1}'} for s in range(sucursales)])
+        sucursal_ids = [s.id for s in Sucursal.query.order_by(Sucursal.id)]
+
+    filas = []
+    for s, sucursal_id in enumerate(sucursal_ids):
+        for i in range(por_sucursal):
+            jacuzzi = i % 4 == 3
+            filas.append({
+                'numero': f'{s + 1}-{i + 1:03d}', 'sucursal_id': sucursal_id, 'version': 1, 'activa': True,
+                'tipo': TipoHabitacion.JACUZZI if jacuzzi else TipoHabitacion.NORMAL,
+                'estado': EstadoHabitacion.DISPONIBLE,
+                'precio_base': LUXURY_HOUR_PRICE if jacuzzi else BASE_HOUR_PRICE,
+            })
+    db.session.execute(Habitacion.__table__.insert(), filas)
+    db.session.commit()
+
+    por_id = {}
+    for habitacion in Habitacion.query.all():
+        por_id.setdefault(habitacion.sucursal_id, []).append((habitacion.id, habitacion.precio_base))
+    return por_id
+
+
+def insertar_rentas(total, habitaciones, dias=365, fin=None, semilla=1):
+    """
+    Inserta 'total' rentas CERRADAS (con su registro de acceso) repartidas en los 'dias'
+    anteriores a 'fin' sobre [(habitacion_id, precio)]. Regresa los segundos que tomó.
+    """
+    azar = random.Random(semilla)
+    fin = fin or datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+    inicio = fin - timedelta(days=dias)
+    segundos_periodo = int((fin - inicio).total_seconds())
+    modos = list(ModoIngreso)
+    siguiente_id = (db.session.query(db.func.max(Renta.id)).scalar() or 0) + 1
+
+    t0 = time.perf_counter()
+    for desde in range(0, total, LOTE):
+        rentas, accesos = [], []
+        for renta_id in range(siguiente_id + desde, siguiente_id + min(desde + LOTE, total)):
+            habitacion_id, precio = azar.choice(habitaciones)
+            entrada = inicio + timedelta(seconds=azar.randrange(segundos_periodo))
+            horas = azar.choice((1, 2, 2, 3, 3, 4, 6, 12))
+            extra = azar.choice((0, 0, 0, 0, 1, 2))
+            salida = entrada + timedelta(hours=horas + extra, minutes=azar.randrange(50))
+            rentas.append({
+                'id': renta_id, 'habitacion_id': habitacion_id, 'recepcionista_id': 1, 'cliente_nombre': 'Bench',
+                'horas_reservadas': horas, 'hora_entrada': entrada, 'hora_salida_estimada': entrada + timedelta(hours=horas),
+                'hora_salida_real': salida, 'precio_hora': precio, 'pago_horas': precio * horas,
+                'pago_extra': precio * extra, 'pago_final': precio * (horas + extra), 'estado': 'CERRADA',
+            })
+            modo = azar.choice(modos)
+            accesos.append({'renta_id': renta_id, 'modo_ingreso': modo, 'hora_ingreso': entrada, 'hora_salida': salida,
+                            'placas': f'BEN{renta_id % 1000:03d}' if modo == ModoIngreso.VEHICULO else None})
+        db.session.execute(Renta.__table__.insert(), rentas)
+        db.session.execute(RegistroAcceso.__table__.insert(), accesos)
+        db.session.commit()
+    return time.perf_counter() - t0
+
+
+def cronometrar(funcion, repeticiones=3, antes=None):
+    """Mejor tiempo (segundos) de 'repeticiones' ejecuciones y el último resultado"""
+    mejor, resultado = None, None
+    for _ in range(repeticiones):
+        if antes:
+            antes()
+        t0 = time.perf_counter()
+        resultado = funcion()
+        transcurrido = time.perf_counter() - t0
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, resultado
+
+
+def memoria_maxima_mb():
+    """Memoria residente máxima del proceso (ru_maxrss está en KiB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,193 @@
+"""
+Bitácora de eventos de estado (tabla bitacora_eventos, solo inserciones).
+
+Cada cambio de Habitacion.estado, Renta.estado y Reserva.estado se captura en el flush
+(historial del atributo: estado anterior -> nuevo, con el endpoint y el usuario de la
+petición) y se acumula en el búfer de la sesión (session.info); justo antes del commit se
+escribe todo el lote con un solo executemany, dentro de la transacción que hace el cambio.
+El evento se confirma o se revierte junto con él (un rollback descarta el búfer), así que
+una caída del proceso no pierde eventos ni deja eventos de cambios que no ocurrieron, y una
+transacción con varios flush paga un solo INSERT por lotes. Las actualizaciones por
+conjunto (operaciones masivas) agregan sus eventos al búfer con registrar().
+
+Reconstrucción del estado de las habitaciones en cualquier instante:
+
+    flask reconstruir-estado --en "2025-10-18 23:30" [--habitacion 101]
+
+Como la bitácora empieza vacía, 'flask bitacora-instantanea' registra una vez el estado
+actual de todas las habitaciones y rentas activas como punto de partida.
+"""
+from datetime import datetime
+from enum import Enum
+
+from flask import has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import db, Habitacion, Renta, Reserva, EventoEstado
+
+HABITACION = 'HABITACION'
+RENTA = 'RENTA'
+RESERVA = 'RESERVA'
+
+_ENTIDADES = {Habitacion: HABITACION, Renta: RENTA, Reserva: RESERVA}
+
+_CLAVE_PENDIENTES = 'bitacora_pendientes'
+_CLAVE_ESCRITA = 'bitacora_escrita'
+
+
+def _texto(estado):
+    return estado.value if isinstance(estado, Enum) else estado
+
+
+def _contexto():
+    """(origen, usuario_id) de la petición actual, o ('sistema', None) fuera de una petición"""
+    if not has_request_context():
+        return 'sistema', None
+    usuario_id = None
+    try:
+        if current_user and current_user.is_authenticated:
+            usuario_id = int(current_user.get_id())
+    except Exception:
+        pass
+    return request.endpoint, usuario_id
+
+
+def evento(entidad, entidad_id, estado_anterior, estado_nuevo, habitacion_id=None, ocurrido_at=None, origen=None):
+    """Renglón de bitácora listo para insertar (el origen por defecto es el de la petición actual)"""
+    origen_actual, usuario_id = _contexto()
+    return {
+        'ocurrido_at': ocurrido_at or datetime.now(),
+        'entidad': entidad,
+        'entidad_id': entidad_id,
+        'habitacion_id': habitacion_id,
+        'estado_anterior': _texto(estado_anterior),
+        'estado_nuevo': _texto(estado_nuevo),
+        'usuario_id': usuario_id,
+        'origen': origen or origen_actual
+    }
+
+
+def registrar(session, eventos):
+    """Agrega eventos al lote de la transacción de 'session' (también para cambios que no pasan por el ORM)"""
+    if not eventos:
+        return
+    if session.info.get(_CLAVE_ESCRITA):
+        # Flush posterior a la escritura del lote (dentro del mismo commit): se insertan directo
+        _insertar(session, eventos)
+    else:
+        session.info.setdefault(_CLAVE_PENDIENTES, []).extend(eventos)
+
+
+def _insertar(session, eventos):
+    session.connection().execute(EventoEstado.__table__.insert(), eventos)
+
+
+# --- Eventos de sesión: captura en el flush, un INSERT por lotes al confirmar ---
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_transiciones(session, flush_context):
+    eventos = []
+    ahora = datetime.now()
+
+    for obj in session.new:
+        entidad = _ENTIDADES.get(type(obj))
+        if entidad and obj.estado is not None:
+            habitacion_id = obj.id if entidad == HABITACION else obj.habitacion_id
+            eventos.append(evento(entidad, obj.id, None, obj.estado, habitacion_id, ahora))
+
+    for obj in session.dirty:
+        entidad = _ENTIDADES.get(type(obj))
+        if not entidad:
+            continue
+        historial = inspect(obj).attrs.estado.history
+        if not historial.added:
+            continue
+        anterior = historial.deleted[0] if historial.deleted else None
+        if anterior == historial.added[0]:
+            continue
+        habitacion_id = obj.id if entidad == HABITACION else obj.habitacion_id
+        eventos.append(evento(entidad, obj.id, anterior, historial.added[0], habitacion_id, ahora))
+
+    registrar(session, eventos)
+
+
+@event.listens_for(Session, 'before_commit')
+def _escribir_lote(session):
+    # El flush final del commit ocurre después de este evento: se adelanta para que sus
+    # transiciones entren en el mismo lote
+    session.flush()
+    pendientes = session.info.pop(_CLAVE_PENDIENTES, None)
+    if pendientes:
+        _insertar(session, pendientes)
+    session.info[_CLAVE_ESCRITA] = True
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _descartar_lote(session, transaccion):
+    # Fin de la transacción externa (commit, rollback o close): lo que quede en el búfer no se confirmó
+    if transaccion.parent is None:
+        session.info.pop(_CLAVE_PENDIENTES, None)
+        session.info.pop(_CLAVE_ESCRITA, None)
+
+
+# --- Consultas y reconstrucción ---
+
+def historial_habitacion(habitacion_id, desde=None, hasta=None, limite=200):
+    """Línea de tiempo de una habitación (usa el índice habitacion_id, ocurrido_at)"""
+    consulta = EventoEstado.query.filter(EventoEstado.habitacion_id == habitacion_id)
+    if desde:
+        consulta = consulta.filter(EventoEstado.ocurrido_at >= desde)
+    if hasta:
+        consulta = consulta.filter(EventoEstado.ocurrido_at <= hasta)
+    eventos = consulta.order_by(EventoEstado.ocurrido_at.desc(), EventoEstado.id.desc()).limit(limite).all()
+
+    return [{
+        'ocurrido_at': e.ocurrido_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'entidad': e.entidad,
+        'entidad_id': e.entidad_id,
+        'estado_anterior': e.estado_anterior,
+        'estado_nuevo': e.estado_nuevo,
+        'usuario_id': e.usuario_id,
+        'origen': e.origen
+    } for e in eventos]
+
+
+def estado_en(instante, habitacion_id=None):
+    """
+    Reconstruye {habitacion_id: {...}} aplicando en orden los eventos hasta 'instante':
+    estado de la habitación, desde cuándo, quién lo cambió y la renta activa en ese momento.
+    """
+    consulta = EventoEstado.query.filter(
+        EventoEstado.ocurrido_at <= instante,
+        EventoEstado.entidad.in_((HABITACION, RENTA))
+    )
+    if habitacion_id is not None:
+        consulta = consulta.filter(EventoEstado.habitacion_id == habitacion_id)
+
+    habitaciones = {}
+    for e in consulta.order_by(EventoEstado.ocurrido_at, EventoEstado.id).yield_per(5000):
+        datos = habitaciones.setdefault(e.habitacion_id, {
+            'estado': None, 'desde': None, 'usuario_id': None, 'origen': None, 'renta_id': None
+        })
+        if e.entidad == HABITACION:
+            datos.update(estado=e.estado_nuevo, desde=e.ocurrido_at, usuario_id=e.usuario_id, origen=e.origen)
+        elif e.estado_nuevo == 'ACTIVA':
+            datos['renta_id'] = e.entidad_id
+        elif datos['renta_id'] == e.entidad_id:
+            datos['renta_id'] = None
+
+    return habitaciones
+
+
+def registrar_instantanea():
+    """Punto de partida de la bitácora: estado actual de habitaciones y rentas activas"""
+    ahora = datetime.now()
+    eventos = [evento(HABITACION, h.id, None, h.estado, h.id, ahora, origen='instantanea')
+               for h in Habitacion.query.all()]
+    eventos += [evento(RENTA, r.id, None, r.estado, r.habitacion_id, ahora, origen='instantanea')
+                for r in Renta.query.filter(Renta.estado == 'ACTIVA').all()]
+    registrar(db.session, eventos)
+    db.session.commit()
+    return len(eventos)
@@ -0,0 +1,211 @@
+"""
+Caché en proceso del estado de las habitaciones (estado, tipo, número y renta activa).
+
+Es la vía rápida para selectores de habitación, tableros y conteos: se actualiza
+write-through al confirmar cada transacción (eventos de sesión de SQLAlchemy, así
+checkin, checkout, limpieza, reservas y el barrido de auto-limpieza quedan cubiertos
+sin llamadas explícitas) y se valida contra la base de datos comparando la columna
+Habitacion.version como máximo cada CACHE_HABITACIONES_TTL segundos, lo que detecta
+cambios hechos por otros workers o por actualizaciones masivas.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, Habitacion, Renta
+from replica import en_primaria
+
+TTL_VERIFICACION = float(os.environ.get("CACHE_HABITACIONES_TTL", 5))
+
+_CLAVE_PENDIENTES = 'cache_habitaciones_pendientes'
+_CLAVE_RENTAS = 'cache_habitaciones_rentas'
+
+
+class HabitacionCacheada:
+    """Copia desacoplada de la sesión con los campos de Habitacion que usan las plantillas"""
+    __slots__ = ('id', 'numero', 'tipo', 'estado', 'precio_base', 'activa', 'sucursal_id', 'version', 'renta_id')
+
+    def __init__(self, habitacion, renta_id=None):
+        self.id = habitacion.id
+        self.numero = habitacion.numero
+        self.tipo = habitacion.tipo
+        self.estado = habitacion.estado
+        self.precio_base = habitacion.precio_base
+        self.activa = habitacion.activa
+        self.sucursal_id = habitacion.sucursal_id
+        self.version = habitacion.version
+        self.renta_id = renta_id
+
+    def get_precio_hora(self):
+        return self.precio_base
+
+    def __repr__(self):
+        return f'<HabitacionCacheada {self.numero} ({self.estado.value}) v{self.version}>'
+
+
+class CacheHabitaciones:
+
+    def __init__(self, ttl_verificacion=TTL_VERIFICACION):
+        self.ttl_verificacion = ttl_verificacion
+        self._entradas = {}
+        self._cargada = False
+        self._ultima_verificacion = 0.0
+        self._lock = threading.Lock()
+        self.recargas = 0
+
+    # --- Lectura ---
+
+    def obtener(self, habitacion_id):
+        self._asegurar_vigente()
+        return self._entradas.get(habitacion_id)
+
+    def listar(self, estado=None, activa=None):
+        """Habitaciones ordenadas por número, filtradas opcionalmente por estado / activa"""
+        self._asegurar_vigente()
+        habitaciones = sorted(self._entradas.values(), key=lambda h: h.numero)
+        if estado is not None:
+            habitaciones = [h for h in habitaciones if h.estado == estado]
+        if activa is not None:
+            habitaciones = [h for h in habitaciones if bool(h.activa) == activa]
+        return habitaciones
+
+    def contar_por_estado(self):
+        self._asegurar_vigente()
+        conteo = {}
+        for habitacion in self._entradas.values():
+            conteo[habitacion.estado] = conteo.get(habitacion.estado, 0) + 1
+        return conteo
+
+    # --- Sincronización con la base de datos ---
+
+    def _asegurar_vigente(self):
+        # La caché es compartida: aunque la pida un reporte, se valida contra la primaria
+        with en_primaria():
+            self._validar()
+
+    def _validar(self):
+        if not self._cargada:
+            self.recargar()
+        elif time.monotonic() - self._ultima_verificacion > self.ttl_verificacion:
+            try:
+                self.verificar()
+            except Exception as e:
+                from contingencia import es_falla_conexion
+                if not es_falla_conexion(e):
+                    raise
+                # Sin conexión: se sirve la última copia (modo de contingencia) y se reintenta después del TTL
+                try:
+                    db.session.rollback()
+                except Exception:
+                    pass
+                self._ultima_verificacion = time.monotonic()
+
+    def _rentas_activas(self, ids=None):
+        consulta = db.session.query(Renta.habitacion_id, Renta.id).filter(Renta.estado == 'ACTIVA')
+        if ids is not None:
+            consulta = consulta.filter(Renta.habitacion_id.in_(ids))
+        return dict(consulta.all())
+
+    def recargar(self):
+        """Carga completa (primer uso o invalidación total)"""
+        habitaciones = Habitacion.query.all()
+        rentas = self._rentas_activas()
+        with self._lock:
+            self._entradas = {h.id: HabitacionCacheada(h, rentas.get(h.id)) for h in habitaciones}
+            self._cargada = True
+            self._ultima_verificacion = time.monotonic()
+            self.recargas += 1
+
+    def verificar(self):
+        """
+        Compara (id, version) contra la base de datos y recarga solo las habitaciones
+        que cambiaron fuera de este proceso. Regresa los ids que tenían deriva.
+        """
+        if not self._cargada:
+            return []
+        versiones = dict(db.session.query(Habitacion.id, Habitacion.version).all())
+        desfasadas = [hid for hid, version in versiones.items()
+                      if hid not in self._entradas or self._entradas[hid].version != version]
+        eliminadas = [hid for hid in self._entradas if hid not in versiones]
+
+        if desfasadas:
+            habitaciones = Habitacion.query.filter(Habitacion.id.in_(desfasadas)).all()
+            rentas = self._rentas_activas(desfasadas)
+        else:
+            habitaciones, rentas = [], {}
+
+        with self._lock:
+            for habitacion in habitaciones:
+                self._entradas[habitacion.id] = HabitacionCacheada(habitacion, rentas.get(habitacion.id))
+            for hid in eliminadas:
+                self._entradas.pop(hid, None)
+            self._ultima_verificacion = time.monotonic()
+
+        return desfasadas + eliminadas
+
+    def aplicar(self, habitaciones, rentas):
+        """Write-through: aplica copias ya confirmadas en la base de datos"""
+        if not self._cargada:
+            return
+        with self._lock:
+            for hid, copia in habitaciones.items():
+                if copia is None:
+                    self._entradas.pop(hid, None)
+                    continue
+                anterior = self._entradas.get(hid)
+                if anterior is not None and copia.renta_id is None and hid not in rentas:
+                    copia.renta_id = anterior.renta_id
+                self._entradas[hid] = copia
+            # Rentas que cambiaron sin modificar la habitación en la misma transacción
+            for hid, renta_id in rentas.items():
+                actual = self._entradas.get(hid)
+                if actual is not None and hid not in habitaciones:
+                    actual.renta_id = renta_id
+
+    def invalidar(self):
+        with self._lock:
+            self._entradas = {}
+            self._cargada = False
+
+
+cache_habitaciones = CacheHabitaciones()
+
+
+# --- Eventos de sesión: captura en flush, aplica en commit, descarta en rollback ---
+
+@event.listens_for(Session, 'after_flush')
+def _capturar_cambios(session, flush_context):
+    pendientes = session.info.setdefault(_CLAVE_PENDIENTES, {})
+    rentas = session.info.setdefault(_CLAVE_RENTAS, {})
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Renta) and obj.habitacion_id is not None:
+            if obj.estado == 'ACTIVA':
+                rentas[obj.habitacion_id] = obj.id
+            elif rentas.get(obj.habitacion_id) in (None, obj.id):
+                rentas[obj.habitacion_id] = None
+
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Habitacion):
+            pendientes[obj.id] = HabitacionCacheada(obj, rentas.get(obj.id))
+
+    for obj in session.deleted:
+        if isinstance(obj, Habitacion):
+            pendientes[obj.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_cambios(session):
+    pendientes = session.info.pop(_CLAVE_PENDIENTES, None)
+    rentas = session.info.pop(_CLAVE_RENTAS, None)
+    if pendientes or rentas:
+        cache_habitaciones.aplicar(pendientes or {}, rentas or {})
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_cambios(session):
+    session.info.pop(_CLAVE_PENDIENTES, None)
+    session.info.pop(_CLAVE_RENTAS, None)
@@ -0,0 +1,194 @@
+"""
+Caché en proceso de secciones de reportes, por (sección, rango de fechas, sucursal).
+
+- Rangos que tocan el día de hoy (o sin rango): se invalidan al confirmar el check-out de
+  una renta cuya hora_entrada cae en el rango (eventos de sesión, igual que la caché de
+  habitaciones) y, para los cambios de otros workers, expiran a los REPORTES_CACHE_TTL segundos.
+- Rangos cerrados (terminan antes de hoy): casi no cambian, así que duran
+  REPORTES_CACHE_TTL_CERRADOS segundos. Cualquier escritura que toque un día cerrado (un
+  check-out de una renta que entró ayer, flask import, el archivado, las reparaciones de la
+  auditoría) incrementa en su misma transacción la generación compartida 'reportes' de
+  contador_cambios; cada worker la revisa cada REPORTES_CACHE_VERIFICAR segundos y, si cambió,
+  vacía su caché.
+
+Un resultado calculado mientras llegó una invalidación no se guarda, y durante
+RETRASO_MAX segundos después de una invalidación se recalcula en la primaria (la réplica
+todavía puede no tener el cambio).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Renta
+from replica import en_primaria, RETRASO_MAX
+
+MAX_ENTRADAS = int(os.environ.get("REPORTES_CACHE_MAX", 256))
+TTL_ABIERTOS = float(os.environ.get("REPORTES_CACHE_TTL", 60))
+TTL_CERRADOS = float(os.environ.get("REPORTES_CACHE_TTL_CERRADOS", 3600))
+INTERVALO_VERIFICACION = float(os.environ.get("REPORTES_CACHE_VERIFICAR", 5))
+
+CONTADOR_REPORTES = 'reportes'
+
+_CLAVE_PENDIENTES = 'cache_reportes_pendientes'
+_CLAVE_MARCADA = 'cache_reportes_generacion_marcada'
+
+
+def _inicio_de_hoy():
+    return datetime.combine(date.today(), datetime.min.time())
+
+
+def marcar_cambio(conexion, instantes=None):
+    """
+    Incrementa la generación compartida dentro de la transacción de 'conexion': llamar en
+    toda escritura que cambie rentas de días ya cerrados (los demás workers descartan sus
+    reportes cacheados al verla). Con 'instantes' (horas de entrada de las rentas cambiadas)
+    solo se marca si alguno cae antes de hoy. Regresa True si marcó.
+    """
+    if instantes is not None and not any(instante < _inicio_de_hoy() for instante in instantes):
+        return False
+    from sincronizacion import incrementar_contador
+    incrementar_contador(conexion, CONTADOR_REPORTES)
+    return True
+
+
+class CacheReportes:
+
+    def __init__(self, max_entradas=MAX_ENTRADAS, ttl_abiertos=TTL_ABIERTOS, ttl_cerrados=TTL_CERRADOS,
+                 intervalo_verificacion=INTERVALO_VERIFICACION):
+        self.max_entradas = max_entradas
+        self.ttl_abiertos = ttl_abiertos
+        self.ttl_cerrados = ttl_cerrados
+        self.intervalo_verificacion = intervalo_verificacion
+        self._entradas = OrderedDict()  # (seccion, inicio, fin, sucursal_id) -> (valor, expira)
+        self._lock = threading.Lock()
+        self._generacion = 0             # Invalidaciones locales (incluidas las vistas en la base de datos)
+        self._generacion_compartida = None
+        self._verificado_en = None
+        self._invalidado_en = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.invalidaciones = 0
+
+    @staticmethod
+    def _abierto(inicio, fin):
+        """El rango incluye hoy (o no tiene límites) y aún puede cambiar"""
+        return inicio is None or fin > _inicio_de_hoy()
+
+    def _verificar_generacion(self):
+        """Vacía la caché si otro proceso marcó un cambio en días cerrados"""
+        if self._verificado_en is not None and time.monotonic() - self._verificado_en < self.intervalo_verificacion:
+            return
+        from sincronizacion import version_actual
+        try:
+            with en_primaria():
+                generacion = version_actual(CONTADOR_REPORTES)
+        except Exception as e:
+            print(f"Error al verificar la generación de la caché de reportes: {e}")
+            return
+        anterior, self._generacion_compartida = self._generacion_compartida, generacion
+        self._verificado_en = time.monotonic()
+        if anterior is not None and generacion != anterior:
+            self.invalidar()
+
+    def obtener(self, seccion, inicio, fin, sucursal_id, calcular):
+        """Regresa el resultado cacheado o lo calcula con calcular() y lo guarda"""
+        self._verificar_generacion()
+        clave = (seccion, inicio, fin, sucursal_id)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[1] > time.monotonic():
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[0]
+            self.fallos += 1
+            generacion = self._generacion
+            reciente = self._invalidado_en is not None and time.monotonic() - self._invalidado_en < RETRASO_MAX
+
+        if reciente:
+            with en_primaria():
+                valor = calcular()
+        else:
+            valor = calcular()
+        expira = time.monotonic() + (self.ttl_abiertos if self._abierto(inicio, fin) else self.ttl_cerrados)
+
+        with self._lock:
+            if self._generacion != generacion:
+                return valor  # Llegó una invalidación mientras se calculaba: puede estar obsoleto
+            self._entradas[clave] = (valor, expira)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+    def _invalidada(self, cuantas):
+        # Se llama con el lock tomado
+        self._generacion += 1
+        self._invalidado_en = time.monotonic()
+        self.invalidaciones += cuantas
+
+    def invalidar_fecha(self, instante):
+        """Descarta los resultados cuyo rango contiene 'instante' (y los que no tienen rango)"""
+        with self._lock:
+            obsoletas = [clave for clave in self._entradas
+                         if clave[1] is None or clave[1] <= instante <= clave[2]]
+            for clave in obsoletas:
+                del self._entradas[clave]
+            self._invalidada(len(obsoletas))
+
+    def invalidar_rango(self, desde, hasta):
+        """Descarta los resultados cuyo rango se traslapa con [desde, hasta] (importaciones)"""
+        with self._lock:
+            obsoletas = [clave for clave in self._entradas
+                         if clave[1] is None or (clave[1] <= hasta and desde <= clave[2])]
+            for clave in obsoletas:
+                del self._entradas[clave]
+            self._invalidada(len(obsoletas))
+
+    def invalidar(self):
+        with self._lock:
+            self._invalidada(len(self._entradas))
+            self._entradas.clear()
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': len(self._entradas),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+            'invalidaciones': self.invalidaciones
+        }
+
+
+cache_reportes = CacheReportes()
+
+
+# --- Eventos de sesión: rentas cerradas (check-out o ediciones) invalidan al confirmar ---
+
+@event.listens_for(Session, 'after_flush')
+def _capturar_rentas_cerradas(session, flush_context):
+    pendientes = session.info.setdefault(_CLAVE_PENDIENTES, set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Renta) and obj.estado == 'CERRADA' and obj.hora_entrada is not None:
+            pendientes.add(obj.hora_entrada)
+    # Cambio en un día cerrado: la generación compartida avisa a los demás workers
+    if pendientes and not session.info.get(_CLAVE_MARCADA):
+        session.info[_CLAVE_MARCADA] = marcar_cambio(session.connection(), pendientes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_reportes(session):
+    session.info.pop(_CLAVE_MARCADA, None)
+    for hora_entrada in session.info.pop(_CLAVE_PENDIENTES, ()):
+        cache_reportes.invalidar_fecha(hora_entrada)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_rentas_cerradas(session):
+    session.info.pop(_CLAVE_PENDIENTES, None)
+    session.info.pop(_CLAVE_MARCADA, None)
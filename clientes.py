@@ -0,0 +1,429 @@
+"""
+Clientes deduplicados (tabla clientes) en lugar del nombre capturado como texto libre.
+
+- Deduplicación: cada cliente tiene una clave única a partir del teléfono normalizado
+  (últimos 10 dígitos, 'tel:5512345678') o, sin teléfono, del nombre normalizado
+  (minúsculas, sin acentos ni signos, 'nom:juan perez'). Al insertar una renta o una
+  reserva (evento before_flush) se resuelve su cliente_id con un get-or-create sobre esa
+  clave; una renta que viene de una reserva hereda el cliente de la reserva.
+- Agregados: visitas, gasto_total, primera_visita y ultima_visita se actualizan en la misma
+  transacción que abre o cierra la renta (evento after_flush, como actividad.py), así la
+  búsqueda no tiene que agrupar rentas. Los UPDATE por conjunto (operaciones_masivas) usan
+  registrar_cobros().
+- Búsqueda (typeahead): índice de prefijos en memoria, una lista ordenada de
+  (palabra del nombre o teléfono, cliente_id) consultada con bisect. Se recarga cada
+  CLIENTES_TTL segundos (clientes creados por otros workers) y los clientes creados en
+  este proceso se agregan al confirmar la transacción. Los agregados de los resultados
+  se leen por llave primaria.
+
+Las rentas y reservas previas a esta tabla se asignan con:
+
+    flask backfill-clientes [--lote 2000]
+"""
+import bisect
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from sqlalchemy import bindparam, case, event, func, inspect, select, union_all, update
+from sqlalchemy.orm import Session
+
+from models import db, Cliente, Renta, RentaArchivo, Reserva
+
+TTL_INDICE = float(os.environ.get("CLIENTES_TTL", 300))
+MAX_CANDIDATOS = 500  # Clientes que coinciden con el prefijo y se ordenan por visitas en la base de datos
+MIN_DIGITOS_TELEFONO = 7
+
+_CLAVE_NUEVOS = 'clientes_nuevos'
+
+
+# --- Normalización y clave de deduplicación ---
+
+def normalizar_nombre(nombre):
+    """'  José  Pérez-López ' -> 'jose perez lopez'"""
+    if not nombre:
+        return ''
+    texto = unicodedata.normalize('NFKD', nombre)
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9ñ]+', ' ', texto).split())[:100]
+
+
+def normalizar_telefono(telefono):
+    """Solo dígitos, últimos 10 (sin lada internacional); None si no parece un teléfono"""
+    digitos = re.sub(r'\D', '', telefono or '')
+    return digitos[-10:] if len(digitos) >= MIN_DIGITOS_TELEFONO else None
+
+
+def clave_cliente(nombre, telefono=None):
+    telefono_normalizado = normalizar_telefono(telefono)
+    if telefono_normalizado:
+        return f"tel:{telefono_normalizado}"
+    nombre_normalizado = normalizar_nombre(nombre)
+    return f"nom:{nombre_normalizado}" if nombre_normalizado else None
+
+
+def _valores_cliente(nombre, telefono, clave):
+    return dict(nombre=(nombre or '').strip()[:100] or clave[4:], telefono=(telefono or None),
+                nombre_normalizado=normalizar_nombre(nombre), telefono_normalizado=normalizar_telefono(telefono),
+                clave=clave, visitas=0, gasto_total=0.0)
+
+
+def _obtener_o_crear(conexion, nombre, telefono, clave):
+    """cliente_id de la clave; lo inserta si no existe (seguro ante inserciones simultáneas)"""
+    tabla = Cliente.__table__
+    dialecto = conexion.dialect.name
+    valores = _valores_cliente(nombre, telefono, clave)
+
+    existente = conexion.execute(select(tabla.c.id).where(tabla.c.clave == clave)).scalar()
+    if existente is not None:
+        return existente, False
+
+    if dialecto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        conexion.execute(insert(tabla).values(**valores).prefix_with('IGNORE'))
+    elif dialecto in ('sqlite', 'postgresql'):
+        if dialecto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        conexion.execute(insert(tabla).values(**valores).on_conflict_do_nothing(index_elements=['clave']))
+    else:
+        conexion.execute(tabla.insert().values(**valores))
+
+    return conexion.execute(select(tabla.c.id).where(tabla.c.clave == clave)).scalar(), True
+
+
+# --- Eventos de sesión: cliente_id y agregados en la misma transacción ---
+
+@event.listens_for(Session, 'before_flush')
+def _asignar_clientes(session, flush_context, instances):
+    pendientes = [obj for obj in session.new if isinstance(obj, (Renta, Reserva)) and obj.cliente_id is None]
+    if not pendientes:
+        return
+
+    resueltos = {}
+    with session.no_autoflush:
+        for obj in pendientes:
+            if isinstance(obj, Renta) and obj.reserva_id is not None:
+                reserva = obj.reserva or session.get(Reserva, obj.reserva_id)
+                if reserva is not None and reserva.cliente_id is not None:
+                    obj.cliente_id = reserva.cliente_id
+                    continue
+
+            telefono = obj.cliente_telefono if isinstance(obj, Reserva) else None
+            clave = clave_cliente(obj.cliente_nombre, telefono)
+            if clave is None:
+                continue
+            if clave not in resueltos:
+                cliente_id, creado = _obtener_o_crear(session.connection(), obj.cliente_nombre, telefono, clave)
+                resueltos[clave] = cliente_id
+                if creado:
+                    session.info.setdefault(_CLAVE_NUEVOS, []).append(
+                        (cliente_id, normalizar_nombre(obj.cliente_nombre), normalizar_telefono(telefono))
+                    )
+            obj.cliente_id = resueltos[clave]
+
+
+def _sumar(deltas, cliente_id, visitas=0, gasto=0.0, visita=None):
+    actual = deltas.setdefault(cliente_id, [0, 0.0, None, None])
+    actual[0] += visitas
+    actual[1] += gasto or 0.0
+    if visita is not None:
+        actual[2] = visita if actual[2] is None else min(actual[2], visita)
+        actual[3] = visita if actual[3] is None else max(actual[3], visita)
+
+
+def _acumular(conexion, deltas):
+    """Suma {cliente_id: [visitas, gasto, primera, ultima]} a los agregados de cada cliente"""
+    tabla = Cliente.__table__
+    for cliente_id, (visitas, gasto, primera, ultima) in deltas.items():
+        valores = {'visitas': tabla.c.visitas + visitas, 'gasto_total': tabla.c.gasto_total + gasto}
+        if primera is not None:
+            valores['primera_visita'] = case(
+                (tabla.c.primera_visita.is_(None) | (tabla.c.primera_visita > primera), primera),
+                else_=tabla.c.primera_visita
+            )
+            valores['ultima_visita'] = case(
+                (tabla.c.ultima_visita.is_(None) | (tabla.c.ultima_visita < ultima), ultima),
+                else_=tabla.c.ultima_visita
+            )
+        conexion.execute(update(tabla).where(tabla.c.id == cliente_id).values(**valores))
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_visitas(session, flush_context):
+    deltas = {}
+
+    for obj in session.new:
+        if isinstance(obj, Renta) and obj.cliente_id is not None:
+            gasto = (obj.pago_horas or 0.0) + ((obj.pago_extra or 0.0) if obj.hora_salida_real is not None else 0.0)
+            _sumar(deltas, obj.cliente_id, visitas=1, gasto=gasto, visita=obj.hora_entrada)
+
+    for obj in session.dirty:
+        if isinstance(obj, Renta) and obj.cliente_id is not None and obj.hora_salida_real is not None:
+            historial = inspect(obj).attrs.hora_salida_real.history
+            # Solo la transición "sin salida -> con salida" suma el cobro extra
+            if historial.added and not any(historial.deleted):
+                _sumar(deltas, obj.cliente_id, gasto=obj.pago_extra)
+
+    if deltas:
+        _acumular(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publicar_nuevos(session):
+    nuevos = session.info.pop(_CLAVE_NUEVOS, None)
+    if nuevos:
+        indice_clientes.agregar(nuevos)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_nuevos(session):
+    session.info.pop(_CLAVE_NUEVOS, None)
+
+
+def registrar_cobros(session, cobros):
+    """
+    Para actualizaciones masivas que no pasan por el ORM (UPDATE por conjunto):
+    suma los cobros extra [(cliente_id, pago_extra)] en la transacción de 'session'.
+    """
+    deltas = {}
+    for cliente_id, pago_extra in cobros:
+        if cliente_id is not None:
+            _sumar(deltas, cliente_id, gasto=pago_extra)
+    if deltas:
+        _acumular(session.connection(), deltas)
+
+
+# --- Índice de prefijos en memoria (typeahead) ---
+
+class IndiceClientes:
+    """Listas paralelas ordenadas (palabra, cliente_id); búsqueda de prefijos con bisect"""
+
+    def __init__(self, ttl=TTL_INDICE):
+        self.ttl = ttl
+        self._palabras = []
+        self._ids = []
+        self._cargado_en = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _tokens(nombre_normalizado, telefono_normalizado):
+        tokens = set((nombre_normalizado or '').split())
+        if telefono_normalizado:
+            tokens.add(telefono_normalizado)
+        return tokens
+
+    def invalidar(self):
+        with self._lock:
+            self._cargado_en = None
+
+    def _asegurar_vigente(self):
+        if self._cargado_en is not None and time.monotonic() - self._cargado_en <= self.ttl:
+            return
+        entradas = []
+        consulta = db.session.query(Cliente.id, Cliente.nombre_normalizado, Cliente.telefono_normalizado)
+        for cliente_id, nombre_normalizado, telefono_normalizado in consulta.yield_per(5000):
+            entradas.extend((token, cliente_id) for token in self._tokens(nombre_normalizado, telefono_normalizado))
+        entradas.sort()
+        with self._lock:
+            self._palabras = [token for token, _ in entradas]
+            self._ids = [cliente_id for _, cliente_id in entradas]
+            self._cargado_en = time.monotonic()
+
+    def agregar(self, clientes):
+        """Write-through de clientes [(id, nombre_normalizado, telefono_normalizado)] recién confirmados"""
+        with self._lock:
+            if self._cargado_en is None:
+                return  # Se incluirán en la primera carga
+            for cliente_id, nombre_normalizado, telefono_normalizado in clientes:
+                for token in self._tokens(nombre_normalizado, telefono_normalizado):
+                    posicion = bisect.bisect_left(self._palabras, token)
+                    self._palabras.insert(posicion, token)
+                    self._ids.insert(posicion, cliente_id)
+
+    def _prefijo(self, palabras, ids, prefijo):
+        encontrados = set()
+        posicion = bisect.bisect_left(palabras, prefijo)
+        while posicion < len(palabras) and palabras[posicion].startswith(prefijo):
+            encontrados.add(ids[posicion])
+            posicion += 1
+        return encontrados
+
+    def candidatos(self, texto):
+        """ids de los clientes cuyas palabras empiezan con cada palabra del texto"""
+        consulta = normalizar_nombre(texto).split()
+        if not consulta:
+            return set()
+        self._asegurar_vigente()
+        with self._lock:
+            palabras, ids = self._palabras, self._ids
+            resultado = None
+            for prefijo in sorted(consulta, key=len, reverse=True):
+                encontrados = self._prefijo(palabras, ids, prefijo)
+                resultado = encontrados if resultado is None else resultado & encontrados
+                if not resultado:
+                    break
+        return resultado
+
+
+indice_clientes = IndiceClientes()
+
+
+def serializar(cliente):
+    return {
+        'id': cliente.id,
+        'nombre': cliente.nombre,
+        'telefono': cliente.telefono,
+        'visitas': cliente.visitas,
+        'gasto_total': round(cliente.gasto_total or 0.0, 2),
+        'ultima_visita': cliente.ultima_visita.strftime('%Y-%m-%d %H:%M') if cliente.ultima_visita else None
+    }
+
+
+def buscar(texto, limite=10):
+    """Clientes que coinciden con el texto, los más frecuentes primero"""
+    candidatos = indice_clientes.candidatos(texto)
+    if not candidatos:
+        return []
+    ids = sorted(candidatos, reverse=True)[:MAX_CANDIDATOS]  # Con demasiadas coincidencias, los más recientes
+    clientes = Cliente.query.filter(Cliente.id.in_(ids)).order_by(
+        Cliente.visitas.desc(), Cliente.ultima_visita.desc(), Cliente.id.desc()
+    ).limit(limite).all()
+    return [serializar(c) for c in clientes]
+
+
+def historial(cliente_id, limite=50):
+    """
+    Rentas del cliente (activas y archivadas). El filtro por cliente_id y el límite se aplican
+    dentro de cada tabla (índice de cliente_id en ambas) y solo se mezclan esas filas.
+    """
+    ramas = []
+    for modelo in (Renta, RentaArchivo):
+        tabla = modelo.__table__
+        rama = select(tabla.c.id, tabla.c.habitacion_id, tabla.c.hora_entrada, tabla.c.hora_salida_real,
+                      tabla.c.pago_horas, tabla.c.pago_extra, tabla.c.estado) \
+            .where(tabla.c.cliente_id == cliente_id).order_by(tabla.c.hora_entrada.desc()).limit(limite).subquery()
+        ramas.append(select(rama))
+    union = union_all(*ramas).subquery('historial_cliente')
+    rentas = db.session.execute(select(union).order_by(union.c.hora_entrada.desc()).limit(limite)).all()
+    return [{
+        'renta_id': r.id,
+        'habitacion_id': r.habitacion_id,
+        'hora_entrada': r.hora_entrada.strftime('%Y-%m-%d %H:%M'),
+        'hora_salida': r.hora_salida_real.strftime('%Y-%m-%d %H:%M') if r.hora_salida_real else None,
+        'pago': round((r.pago_horas or 0.0) + (r.pago_extra or 0.0), 2),
+        'estado': r.estado
+    } for r in rentas]
+
+
+# --- Backfill de rentas y reservas previas ---
+
+def _asignar_lote(tabla, asignaciones):
+    if asignaciones:
+        db.session.execute(
+            update(tabla).where(tabla.c.id == bindparam('b_id')).values(cliente_id=bindparam('b_cliente')),
+            [{'b_id': renta_id, 'b_cliente': cliente_id} for renta_id, cliente_id in asignaciones]
+        )
+        db.session.commit()
+
+
+def _crear_faltantes(datos, lote):
+    """Inserta en bloque los clientes {clave: (nombre, telefono)} que no existen; regresa {clave: id}"""
+    tabla = Cliente.__table__
+    ids = {}
+    claves = list(datos)
+    for i in range(0, len(claves), lote):
+        bloque = claves[i:i + lote]
+        ids.update(db.session.execute(select(tabla.c.clave, tabla.c.id).where(tabla.c.clave.in_(bloque))).all())
+        faltantes = [_valores_cliente(*datos[clave], clave) for clave in bloque if clave not in ids]
+        if faltantes:
+            db.session.execute(tabla.insert(), faltantes)
+            ids.update(db.session.execute(select(tabla.c.clave, tabla.c.id).where(tabla.c.clave.in_(bloque))).all())
+        db.session.commit()
+    return ids
+
+
+def _asignar(consultas, tabla_por_origen, lote):
+    """
+    consultas: [(origen, filas (id, nombre, telefono, cliente_heredado))]. Deduplica por clave,
+    crea los clientes faltantes y escribe cliente_id por lotes. Regresa renglones asignados.
+    """
+    datos = {}
+    claves = []  # (origen, id, clave o None, cliente_heredado)
+    for origen, filas in consultas:
+        for fila_id, nombre, telefono, heredado in filas:
+            if heredado is not None:
+                claves.append((origen, fila_id, None, heredado))
+                continue
+            clave = clave_cliente(nombre, telefono)
+            if clave is None:
+                continue
+            datos.setdefault(clave, (nombre, telefono))
+            claves.append((origen, fila_id, clave, None))
+
+    ids = _crear_faltantes(datos, lote)
+
+    total = 0
+    for origen, tabla in tabla_por_origen.items():
+        asignaciones = [(fila_id, heredado if clave is None else ids[clave])
+                        for o, fila_id, clave, heredado in claves if o == origen]
+        for i in range(0, len(asignaciones), lote):
+            _asignar_lote(tabla, asignaciones[i:i + lote])
+        total += len(asignaciones)
+    return total
+
+
+def recalcular_agregados(lote=2000):
+    """Recalcula visitas, gasto y fechas de todos los clientes a partir de las rentas"""
+    from reportes import _fuentes_rentas
+
+    R, _ = _fuentes_rentas()
+    agregados = db.session.query(
+        R.cliente_id, func.count(R.id),
+        func.sum(R.pago_horas + case((R.hora_salida_real.isnot(None), func.coalesce(R.pago_extra, 0.0)), else_=0.0)),
+        func.min(R.hora_entrada), func.max(R.hora_entrada)
+    ).filter(R.cliente_id.isnot(None)).group_by(R.cliente_id).all()
+
+    tabla = Cliente.__table__
+    db.session.execute(update(tabla).values(visitas=0, gasto_total=0.0, primera_visita=None, ultima_visita=None))
+    valores = [{'b_id': cliente_id, 'b_visitas': visitas, 'b_gasto': gasto or 0.0, 'b_primera': primera, 'b_ultima': ultima}
+               for cliente_id, visitas, gasto, primera, ultima in agregados]
+    sentencia = update(tabla).where(tabla.c.id == bindparam('b_id')).values(
+        visitas=bindparam('b_visitas'), gasto_total=bindparam('b_gasto'),
+        primera_visita=bindparam('b_primera'), ultima_visita=bindparam('b_ultima')
+    )
+    for i in range(0, len(valores), lote):
+        db.session.execute(sentencia, valores[i:i + lote])
+    db.session.commit()
+    return len(valores)
+
+
+def backfill_clientes(lote=2000):
+    """
+    Asigna cliente_id a las reservas y rentas (activas y archivadas) que no lo tienen y
+    recalcula los agregados. Regresa (reservas, rentas, clientes).
+    """
+    sin_cliente = db.session.query(Reserva.id, Reserva.cliente_nombre, Reserva.cliente_telefono).filter(
+        Reserva.cliente_id.is_(None)).yield_per(lote)
+    reservas = _asignar([('reservas', ((rid, nombre, telefono, None) for rid, nombre, telefono in sin_cliente))],
+                        {'reservas': Reserva.__table__}, lote)
+
+    # Las rentas que vienen de una reserva heredan su cliente
+    cliente_de_reserva = {rid: cid for rid, cid in db.session.query(Reserva.id, Reserva.cliente_id).filter(
+        Reserva.cliente_id.isnot(None)).yield_per(lote)}
+
+    def _rentas(modelo):
+        for renta_id, nombre, reserva_id in db.session.query(
+            modelo.id, modelo.cliente_nombre, modelo.reserva_id
+        ).filter(modelo.cliente_id.is_(None)).yield_per(lote):
+            yield renta_id, nombre, None, cliente_de_reserva.get(reserva_id)
+
+    rentas = _asignar([('rentas', list(_rentas(Renta))), ('rentas_archivo', list(_rentas(RentaArchivo)))],
+                      {'rentas': Renta.__table__, 'rentas_archivo': RentaArchivo.__table__}, lote)
+
+    clientes = recalcular_agregados(lote)
+    indice_clientes.invalidar()
+    return reservas, rentas, clientes
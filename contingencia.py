@@ -0,0 +1,387 @@
+"""
+Modo de contingencia de recepción: diario local (write-ahead) cuando la base de datos no responde.
+
+Si checkin o checkout fallan porque no hay conexión con la base de datos, la operación se
+valida contra la copia en memoria de las habitaciones (cache_habitaciones) y se agrega a un
+archivo JSONL de solo anexado (CONTINGENCIA_DIARIO, por defecto instance/contingencia.jsonl).
+Cada renglón se escribe con flush + fsync antes de responder, así que una operación
+confirmada al recepcionista sobrevive a un reinicio del proceso o del equipo.
+
+Al regresar la conexión las operaciones se reproducen en el orden del diario, cada una en su
+propia transacción y por el ORM (cachés, actividad, bitácora y vencimientos se actualizan
+igual que en línea), con la hora real de entrada/salida registrada en el diario:
+- check-in: si la habitación ya no está DISPONIBLE se marca CONFLICTO
+- check-out: si la renta ya no está ACTIVA se marca CONFLICTO; el cobro se calcula con la
+  hora de salida registrada
+El resultado de cada operación se anexa al mismo diario ({"tipo": "resultado", ...}); los
+conflictos quedan ahí para revisión manual y no se reintentan. Si el proceso se cae entre el
+commit y el renglón de resultado, la operación se reconoce como ya aplicada (misma habitación
+y hora de entrada, o renta cerrada a esa hora) y no se duplica.
+
+La reproducción se intenta en la primera petición tras CONTINGENCIA_REINTENTO segundos
+mientras haya pendientes, o manualmente:
+
+    flask reproducir-contingencia
+
+Con varios workers (gunicorn) cada proceso relee los renglones nuevos del archivo; la
+validación y el anexado de cada operación ocurren con el candado exclusivo del diario y la
+reproducción toma otro candado de archivo (fcntl; sin él, en Windows, se asume un solo proceso).
+
+Solo las desconexiones cuentan como caída (ver es_falla_conexion): un deadlock o un candado
+ocupado se reportan al usuario como cualquier otro error, no se mandan al diario.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask_login import UserMixin
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from models import db, Habitacion, Renta, RegistroAcceso, EstadoHabitacion, TipoHabitacion, ModoIngreso
+from models import BASE_HOUR_PRICE, LUXURY_HOUR_PRICE
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candados entre procesos
+    fcntl = None
+
+REINTENTO_SEGUNDOS = float(os.environ.get("CONTINGENCIA_REINTENTO", 15))
+
+CHECKIN = 'checkin'
+CHECKOUT = 'checkout'
+RESULTADO = 'resultado'
+APLICADA = 'APLICADA'
+CONFLICTO = 'CONFLICTO'
+
+
+# MySQL: no se puede conectar (2002, 2003) o se perdió la conexión (2006, 2013)
+CODIGOS_DESCONEXION_MYSQL = {2002, 2003, 2006, 2013}
+SQLITE_CANTOPEN = 14  # El archivo de la base de datos no se puede abrir
+
+
+def es_falla_conexion(error):
+    """
+    True si la excepción indica que la base de datos no está disponible. Deadlocks (1213),
+    esperas de candado (1205) o 'database is locked' de SQLite también son OperationalError,
+    pero son conflictos normales que se le muestran al usuario, no una caída.
+    """
+    if not isinstance(error, DBAPIError):
+        return False
+    if error.connection_invalidated:
+        return True
+    if not isinstance(error, (OperationalError, InterfaceError)) or error.orig is None:
+        return False
+    original = error.orig
+    if getattr(original, 'sqlite_errorcode', None) == SQLITE_CANTOPEN:
+        return True
+    codigo = original.args[0] if original.args else None
+    return codigo in CODIGOS_DESCONEXION_MYSQL
+
+
+def rollback_seguro():
+    try:
+        db.session.rollback()
+    except Exception:
+        pass
+
+
+# --- Usuarios sin conexión ---
+
+class UsuarioSinConexion(UserMixin):
+    """Copia mínima del usuario para que Flask-Login funcione mientras la base de datos no responde"""
+
+    def __init__(self, usuario):
+        self.id = usuario.id
+        self.username = usuario.username
+        self.is_admin = usuario.is_admin
+
+
+_usuarios = {}
+
+
+def recordar_usuario(usuario):
+    if usuario is not None:
+        _usuarios[str(usuario.id)] = UsuarioSinConexion(usuario)
+    return usuario
+
+
+def usuario_sin_conexion(user_id):
+    return _usuarios.get(str(user_id))
+
+
+# --- Diario ---
+
+class DiarioContingencia:
+
+    def __init__(self, ruta=None, reintento=REINTENTO_SEGUNDOS):
+        self.ruta = ruta
+        self.reintento = reintento
+        self._lock = threading.RLock()
+        self._offset = 0
+        self._operaciones = {}   # id -> renglón, en orden del diario
+        self._resultados = {}    # id -> renglón de resultado
+        self._ultimo_intento = 0.0
+        self._bloqueado = None   # Archivo del diario con el candado tomado (ver _exclusivo)
+
+    def abrir(self, ruta):
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        with self._lock:
+            self.ruta = ruta
+            self._offset = 0
+            self._operaciones = {}
+            self._resultados = {}
+            self._leer_nuevos()
+
+    # --- Archivo ---
+
+    def _candado(self, archivo, exclusivo=True):
+        if fcntl is not None:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX if exclusivo else fcntl.LOCK_SH)
+
+    def _leer_nuevos(self):
+        """Incorpora los renglones que otros procesos agregaron desde la última lectura"""
+        if not self.ruta or not os.path.exists(self.ruta) or os.path.getsize(self.ruta) == self._offset:
+            return
+        with open(self.ruta, 'rb') as archivo:
+            archivo.seek(self._offset)
+            for linea in archivo:
+                if not linea.endswith(b'\n'):
+                    break  # Renglón incompleto (escritura interrumpida): se ignora
+                self._offset += len(linea)
+                try:
+                    renglon = json.loads(linea)
+                except ValueError:
+                    print(f"Renglón inválido en el diario de contingencia: {linea[:80]!r}")
+                    continue
+                if renglon.get('tipo') == RESULTADO:
+                    self._resultados[renglon['id']] = renglon
+                else:
+                    self._operaciones[renglon['id']] = renglon
+
+    @contextmanager
+    def _exclusivo(self):
+        """
+        Candado del diario (hilos de este proceso y otros workers) mientras se valida contra los
+        pendientes y se anexa la operación: dos check-ins simultáneos de la misma habitación
+        en workers distintos no pueden pasar ambos la validación.
+        """
+        with self._lock:
+            if self._bloqueado is not None:
+                yield self._bloqueado
+                return
+            with open(self.ruta, 'ab') as archivo:
+                self._candado(archivo)
+                self._bloqueado = archivo
+                try:
+                    self._leer_nuevos()
+                    yield archivo
+                finally:
+                    self._bloqueado = None
+
+    def _anexar(self, renglon):
+        linea = (json.dumps(renglon, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._exclusivo() as archivo:
+            archivo.write(linea)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+            # Incorpora también lo que otros procesos hayan escrito antes que este renglón
+            self._leer_nuevos()
+
+    # --- Consultas ---
+
+    def pendientes(self):
+        with self._lock:
+            self._leer_nuevos()
+            return [op for op_id, op in self._operaciones.items() if op_id not in self._resultados]
+
+    def conflictos(self):
+        with self._lock:
+            self._leer_nuevos()
+            return [dict(self._operaciones[op_id], detalle=r.get('detalle'))
+                    for op_id, r in self._resultados.items() if r['estado'] == CONFLICTO and op_id in self._operaciones]
+
+    # --- Registro sin conexión ---
+
+    def _duplicada(self, clave):
+        """Operación pendiente con la misma clave de idempotencia (doble envío del formulario)"""
+        if not clave:
+            return None
+        return next((op for op in self.pendientes() if op.get('clave') == clave), None)
+
+    def _nueva(self, tipo, datos, usuario_id, clave):
+        renglon = {
+            'tipo': tipo,
+            'id': uuid.uuid4().hex,
+            # Segundos enteros: DATETIME de MySQL no guarda fracciones y la reproducción
+            # reconoce una operación ya aplicada comparando esta hora exacta
+            'registrado_at': datetime.now().replace(microsecond=0).isoformat(),
+            'usuario_id': usuario_id,
+            'clave': clave,
+            'datos': datos
+        }
+        with self._lock:
+            self._anexar(renglon)
+        return renglon
+
+    def registrar_checkin(self, habitacion_id, horas, nombre_cliente, modo_ingreso, placas, usuario_id, clave=None):
+        """
+        Valida contra la copia en memoria y anexa el check-in. Regresa (renglón, habitación).
+        ValueError si la habitación no está disponible.
+        """
+        from cache_habitaciones import cache_habitaciones
+
+        habitacion = cache_habitaciones.obtener(habitacion_id)
+        with self._exclusivo():
+            previa = self._duplicada(clave)
+            if previa:
+                return previa, habitacion
+            if habitacion is None or habitacion.estado != EstadoHabitacion.DISPONIBLE or not habitacion.activa:
+                raise ValueError('La habitación no está disponible o no existe.')
+            ocupadas = {op['datos']['habitacion_id'] for op in self.pendientes() if op['tipo'] == CHECKIN}
+            if habitacion_id in ocupadas:
+                raise ValueError(f'La habitación {habitacion.numero} ya tiene un check-in registrado sin conexión.')
+            if modo_ingreso not in ModoIngreso.__members__:
+                raise ValueError('Modo de ingreso inválido.')
+
+            renglon = self._nueva(CHECKIN, {
+                'habitacion_id': habitacion_id,
+                'horas': horas,
+                'nombre_cliente': nombre_cliente,
+                'modo_ingreso': modo_ingreso,
+                'placas': placas
+            }, usuario_id, clave)
+        return renglon, habitacion
+
+    def registrar_checkout(self, renta_id, usuario_id, clave=None):
+        """Anexa el check-out de una renta activa según la copia en memoria. Regresa (renglón, habitación)."""
+        from cache_habitaciones import cache_habitaciones
+
+        habitacion = next((h for h in cache_habitaciones.listar() if h.renta_id == renta_id), None)
+        with self._exclusivo():
+            previa = self._duplicada(clave)
+            if previa:
+                return previa, habitacion
+            if habitacion is None:
+                raise ValueError('La renta no existe o ya ha sido cerrada. Las rentas abiertas sin conexión '
+                                 'se cierran cuando regrese la conexión.')
+            if any(op['tipo'] == CHECKOUT and op['datos']['renta_id'] == renta_id for op in self.pendientes()):
+                raise ValueError('El check-out de esta renta ya fue registrado sin conexión.')
+
+            renglon = self._nueva(CHECKOUT, {'renta_id': renta_id}, usuario_id, clave)
+        return renglon, habitacion
+
+    # --- Reproducción ---
+
+    def intentar_reproduccion(self):
+        """Llamada barata en cada petición: reproduce si hay pendientes y pasó el intervalo de reintento"""
+        if not self._operaciones or time.monotonic() - self._ultimo_intento < self.reintento:
+            return None
+        self._ultimo_intento = time.monotonic()
+        if not self.pendientes():
+            return None
+        return self.reproducir()
+
+    def reproducir(self):
+        """
+        Aplica las operaciones pendientes en orden. Se detiene en la primera falla de conexión.
+        Regresa {'aplicadas', 'conflictos', 'pendientes'}.
+        """
+        resumen = {'aplicadas': 0, 'conflictos': 0, 'pendientes': 0}
+        candado = open(self.ruta + '.lock', 'a') if self.ruta else None
+        try:
+            if candado is not None and fcntl is not None:
+                try:
+                    fcntl.flock(candado.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Otro proceso está reproduciendo
+                    resumen['pendientes'] = len(self.pendientes())
+                    return resumen
+
+            pendientes = self.pendientes()
+            for indice, operacion in enumerate(pendientes):
+                try:
+                    estado, detalle, renta_id = self._aplicar(operacion)
+                except Exception as e:
+                    rollback_seguro()
+                    if es_falla_conexion(e):
+                        resumen['pendientes'] = len(pendientes) - indice
+                        return resumen
+                    estado, detalle, renta_id = CONFLICTO, f'Error al aplicar: {e}', None
+
+                with self._lock:
+                    self._anexar({'tipo': RESULTADO, 'id': operacion['id'], 'estado': estado, 'detalle': detalle,
+                                  'renta_id': renta_id, 'aplicada_at': datetime.now().isoformat()})
+                resumen['aplicadas' if estado == APLICADA else 'conflictos'] += 1
+            return resumen
+        finally:
+            if candado is not None:
+                candado.close()
+
+    def _aplicar(self, operacion):
+        """(estado, detalle, renta_id) de una operación; confirma su transacción si se aplica"""
+        # Diarios escritos antes de guardar segundos enteros: se aplica la misma hora truncada
+        instante = datetime.fromisoformat(operacion['registrado_at']).replace(microsecond=0)
+        datos = operacion['datos']
+
+        if operacion['tipo'] == CHECKIN:
+            habitacion = Habitacion.query.get(datos['habitacion_id'])
+            previa = Renta.query.filter_by(habitacion_id=datos['habitacion_id'], hora_entrada=instante).first()
+            if previa is not None:
+                return APLICADA, 'Ya estaba aplicada', previa.id
+            if habitacion is None or habitacion.estado != EstadoHabitacion.DISPONIBLE:
+                estado = habitacion.estado.value if habitacion else 'inexistente'
+                return CONFLICTO, f'La habitación estaba {estado} al reproducir el check-in', None
+
+            precio_hora = LUXURY_HOUR_PRICE if habitacion.tipo == TipoHabitacion.JACUZZI else BASE_HOUR_PRICE
+            modo_ingreso = ModoIngreso[datos['modo_ingreso']]
+            renta = Renta(
+                habitacion_id=habitacion.id,
+                recepcionista_id=operacion['usuario_id'],
+                cliente_nombre=datos['nombre_cliente'],
+                horas_reservadas=datos['horas'],
+                hora_entrada=instante,
+                hora_salida_estimada=instante + timedelta(hours=datos['horas']),
+                pago_horas=precio_hora * datos['horas'],
+                precio_hora=precio_hora,
+                estado='ACTIVA'
+            )
+            db.session.add(renta)
+            db.session.flush()
+            db.session.add(RegistroAcceso(
+                renta_id=renta.id,
+                modo_ingreso=modo_ingreso,
+                placas=datos['placas'] if datos['placas'] and modo_ingreso == ModoIngreso.VEHICULO else None,
+                hora_ingreso=instante
+            ))
+            habitacion.estado = EstadoHabitacion.OCUPADA
+            db.session.commit()
+            return APLICADA, None, renta.id
+
+        from controllers.room_controller import calcular_checkout
+
+        renta = Renta.query.get(datos['renta_id'])
+        if renta is not None and renta.estado == 'CERRADA' and renta.hora_salida_real == instante:
+            return APLICADA, 'Ya estaba aplicada', renta.id
+        if renta is None or renta.estado != 'ACTIVA':
+            return CONFLICTO, 'La renta ya no estaba activa al reproducir el check-out', None
+
+        _, pago_extra, pago_final = calcular_checkout(renta, instante)
+        renta.hora_salida_real = instante
+        renta.pago_extra = pago_extra
+        renta.pago_final = pago_final
+        renta.estado = 'CERRADA'
+        habitacion = Habitacion.query.get(renta.habitacion_id)
+        if habitacion and habitacion.estado == EstadoHabitacion.OCUPADA:
+            habitacion.estado = EstadoHabitacion.LIMPIEZA
+        registro_acceso = RegistroAcceso.query.filter_by(renta_id=renta.id).first()
+        if registro_acceso:
+            registro_acceso.hora_salida = instante
+        db.session.commit()
+        return APLICADA, None, renta.id
+
+
+diario_contingencia = DiarioContingencia()
@@ -0,0 +1,287 @@
+from flask import Blueprint, jsonify, request, make_response
+from flask_login import login_required, current_user
+from datetime import date, datetime, timedelta
+from models import Renta
+from controllers.room_controller import check_auto_clean_complete, datos_renta_activa
+from vencimientos import monitor_vencimientos
+from operaciones_masivas import aplicar_acciones, MAX_ACCIONES
+from sincronizacion import version_pantallas, cambios_desde
+import limpieza
+import mantenimiento
+import clientes
+
+api_bp = Blueprint('api_bp', __name__, url_prefix='/api')
+
+
+def _sin_cache(respuesta, version=None):
+    """ETag con la versión de las pantallas; el cliente revalida cada vez"""
+    respuesta.set_etag(str(version if version is not None else version_pantallas()))
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+
+# --- RUTA API para AJAX del Dashboard ---
+@api_bp.route('/habitaciones_activas')
+@login_required
+def habitaciones_activas_api():
+    # Sincronización incremental: ?since=<version> (0 = todo) con ETag = versión de las pantallas.
+    # El ETag se compara antes de cualquier escritura: un sondeo sin cambios responde 304 sin
+    # ejecutar el barrido de limpieza ni la revisión de mantenimiento (ni invalidar su propio ETag)
+    since = request.args.get('since', type=int)
+    if since is not None:
+        version = version_pantallas()
+        if request.if_none_match.contains(str(version)):
+            return _sin_cache(make_response('', 304), version)
+
+    # 🔔 Ejecuta la Autolimpieza antes de devolver los datos actualizados
+    check_auto_clean_complete()
+    mantenimiento.programador_mantenimiento.revisar()
+
+    if since is not None:
+        return _sin_cache(jsonify(cambios_desde(since)))
+
+    monitor_vencimientos.actualizar()
+
+    rentas_activas = Renta.query.filter(Renta.estado == 'ACTIVA').all()
+
+    return jsonify([datos_renta_activa(renta) for renta in rentas_activas])
+
+
+@api_bp.route('/vencimientos')
+@login_required
+def vencimientos_api():
+    """Eventos POR_VENCER / VENCIDA publicados después de ?desde=<seq>"""
+    monitor_vencimientos.actualizar()
+    desde = request.args.get('desde', 0, type=int)
+    eventos = monitor_vencimientos.eventos_desde(desde)
+
+    return jsonify({
+        'eventos': eventos,
+        'ultimo': eventos[-1]['seq'] if eventos else desde
+    })
+
+
+@api_bp.route('/bulk', methods=['POST'])
+@login_required
+def bulk_api():
+    """
+    Lote de acciones de recepción en una sola transacción:
+    {"acciones": [{"accion": "checkout", "renta_id": 5},
+                  {"accion": "clean_complete", "habitacion_id": 3},
+                  {"accion": "confirmar_reserva", "reserva_id": 7}]}
+    Responde un resultado por elemento, en el mismo orden.
+    """
+    datos = request.get_json(silent=True)
+    acciones = datos.get('acciones') if isinstance(datos, dict) else datos
+
+    if not isinstance(acciones, list) or not acciones:
+        return jsonify({'error': "Se espera un JSON con la lista 'acciones'."}), 400
+    if len(acciones) > MAX_ACCIONES:
+        return jsonify({'error': f'Máximo {MAX_ACCIONES} acciones por lote.'}), 400
+
+    resultados = aplicar_acciones(acciones)
+    exitosas = sum(1 for r in resultados if r['ok'])
+
+    return jsonify({
+        'exitosas': exitosas,
+        'fallidas': len(resultados) - exitosas,
+        'resultados': resultados
+    })
+
+
+@api_bp.route('/habitaciones/<int:habitacion_id>/historial')
+@login_required
+def historial_habitacion_api(habitacion_id):
+    """Línea de tiempo de cambios de estado de una habitación (?desde=&hasta= 'YYYY-MM-DD HH:MM')"""
+    from bitacora import historial_habitacion
+
+    try:
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d %H:%M') if request.args.get('desde') else None
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d %H:%M') if request.args.get('hasta') else None
+    except ValueError:
+        return jsonify({'error': "Formato de fecha inválido; usa 'YYYY-MM-DD HH:MM'."}), 400
+    limite = min(max(request.args.get('limite', 200, type=int), 1), 1000)
+
+    return jsonify(historial_habitacion(habitacion_id, desde, hasta, limite))
+
+
+# --- Cola de limpieza (teléfonos del personal) ---
+@api_bp.route('/limpieza/cola')
+@login_required
+def cola_limpieza_api():
+    """Tareas abiertas ordenadas por prioridad"""
+    return jsonify(limpieza.cola_limpieza())
+
+
+def _personal():
+    datos = request.get_json(silent=True) or {}
+    return (datos.get('personal') or request.form.get('personal') or current_user.username).strip()
+
+
+@api_bp.route('/limpieza/siguiente', methods=['POST'])
+@login_required
+def siguiente_limpieza_api():
+    """Asigna e inicia la tarea pendiente de mayor prioridad: {"personal": "Ana"}"""
+    tarea_id = limpieza.tomar_siguiente(_personal())
+    if tarea_id is None:
+        return jsonify({'tarea_id': None, 'mensaje': 'No hay habitaciones pendientes de limpieza.'})
+    return jsonify({'tarea_id': tarea_id})
+
+
+@api_bp.route('/limpieza/<int:tarea_id>/asignar', methods=['POST'])
+@login_required
+def asignar_limpieza_api(tarea_id):
+    tarea = limpieza.asignar(tarea_id, _personal())
+    if tarea is None:
+        return jsonify({'error': 'La tarea no existe o ya fue terminada.'}), 409
+    return jsonify({'tarea_id': tarea.id, 'asignada_a': tarea.asignada_a})
+
+
+@api_bp.route('/limpieza/<int:tarea_id>/iniciar', methods=['POST'])
+@login_required
+def iniciar_limpieza_api(tarea_id):
+    tarea = limpieza.iniciar(tarea_id, _personal())
+    if tarea is None:
+        return jsonify({'error': 'La tarea no existe o ya fue iniciada.'}), 409
+    return jsonify({'tarea_id': tarea.id, 'asignada_a': tarea.asignada_a,
+                    'iniciada_at': tarea.iniciada_at.strftime('%Y-%m-%d %H:%M:%S')})
+
+
+@api_bp.route('/limpieza/<int:tarea_id>/terminar', methods=['POST'])
+@login_required
+def terminar_limpieza_api(tarea_id):
+    """Marca la habitación como DISPONIBLE y cierra la tarea"""
+    habitacion = limpieza.terminar(tarea_id)
+    if habitacion is None:
+        return jsonify({'error': 'La tarea no existe o la habitación ya no está en LIMPIEZA.'}), 409
+    return jsonify({'tarea_id': tarea_id, 'habitacion_id': habitacion.id, 'numero': habitacion.numero})
+
+
+@api_bp.route('/limpieza/estadisticas')
+@login_required
+def estadisticas_limpieza_api():
+    """Tiempos de espera, limpieza y rotación en minutos (?prefijo=tipo: o personal:)"""
+    return jsonify(limpieza.estadisticas(request.args.get('prefijo')))
+
+
+# --- Ventanas de mantenimiento ---
+@api_bp.route('/mantenimiento')
+@login_required
+def ventanas_mantenimiento_api():
+    """Ventanas vigentes (?habitacion_id=, ?todas=1 incluye terminadas y canceladas)"""
+    return jsonify(mantenimiento.listar(request.args.get('habitacion_id', type=int),
+                                        incluir_pasadas=request.args.get('todas') == '1'))
+
+
+@api_bp.route('/mantenimiento', methods=['POST'])
+@login_required
+def programar_mantenimiento_api():
+    """{"habitacion_id": 3, "inicio": "2025-10-20 08:00", "fin": "2025-10-20 14:00", "motivo": "Plomería"}"""
+    datos = request.get_json(silent=True) or {}
+    try:
+        inicio = datetime.strptime(datos.get('inicio', ''), '%Y-%m-%d %H:%M')
+        fin = datetime.strptime(datos.get('fin', ''), '%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return jsonify({'error': "Formato de fecha inválido; usa 'YYYY-MM-DD HH:MM'."}), 400
+    if not isinstance(datos.get('habitacion_id'), int):
+        return jsonify({'error': "Falta 'habitacion_id' (entero)."}), 400
+
+    try:
+        ventana = mantenimiento.programar(datos['habitacion_id'], inicio, fin, datos.get('motivo'), current_user.id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(mantenimiento.serializar(ventana)), 201
+
+
+@api_bp.route('/mantenimiento/<int:ventana_id>/cancelar', methods=['POST'])
+@login_required
+def cancelar_mantenimiento_api(ventana_id):
+    ventana = mantenimiento.cancelar(ventana_id)
+    if ventana is None:
+        return jsonify({'error': 'La ventana no existe o ya terminó.'}), 409
+    return jsonify(mantenimiento.serializar(ventana))
+
+
+# --- Clientes (typeahead) ---
+@api_bp.route('/clientes/buscar')
+@login_required
+def buscar_clientes_api():
+    """?q=<prefijo de nombre o teléfono>&limite=10 -> clientes con visitas y gasto acumulado"""
+    texto = (request.args.get('q') or '').strip()
+    if len(texto) < 2:
+        return jsonify([])
+    limite = min(max(request.args.get('limite', 10, type=int), 1), 50)
+    return jsonify(clientes.buscar(texto, limite))
+
+
+@api_bp.route('/clientes/<int:cliente_id>/historial')
+@login_required
+def historial_cliente_api(cliente_id):
+    return jsonify(clientes.historial(cliente_id, min(request.args.get('limite', 50, type=int), 500)))
+
+
+# --- Cierres diarios (auditoría nocturna) ---
+@api_bp.route('/cierres')
+@login_required
+def cierres_api():
+    """Totales congelados por día (?desde=YYYY-MM-DD&hasta=YYYY-MM-DD, por defecto los últimos 30 días)"""
+    from auditoria import cierres
+    try:
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else date.today()
+        desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date() if request.args.get('desde') else hasta - timedelta(days=30)
+    except ValueError:
+        return jsonify({'error': "Formato de fecha inválido; usa 'YYYY-MM-DD'."}), 400
+    return jsonify(cierres(desde, hasta))
+
+
+# --- Perfiles de peticiones (solo administradores) ---
+def _solo_admin():
+    if not getattr(current_user, 'is_admin', False):
+        return jsonify({'error': 'Solo para administradores.'}), 403
+    return None
+
+
+@api_bp.route('/perfiles')
+@login_required
+def perfiles_api():
+    """Configuración del perfilador y perfiles en el buffer (más recientes primero)"""
+    from perfilador import buffer_perfiles, estado
+    return _solo_admin() or jsonify({'configuracion': estado(), 'perfiles': buffer_perfiles.listar()})
+
+
+@api_bp.route('/perfiles/<int:perfil_id>')
+@login_required
+def perfil_api(perfil_id):
+    """Detalle: SQL ejecutado y resumen del perfil (pstats por tiempo acumulado o pilas colapsadas)"""
+    from perfilador import buffer_perfiles
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    perfil = buffer_perfiles.obtener(perfil_id)
+    if perfil is None:
+        return jsonify({'error': 'El perfil no existe o ya salió del buffer.'}), 404
+    return jsonify({clave: valor for clave, valor in perfil.items() if clave != 'datos'})
+
+
+@api_bp.route('/perfiles/<int:perfil_id>/descargar')
+@login_required
+def descargar_perfil_api(perfil_id):
+    """.prof (pstats / snakeviz) para cProfile, .txt de pilas colapsadas (flamegraph) para el muestreo"""
+    from perfilador import buffer_perfiles, CPROFILE
+    denegado = _solo_admin()
+    if denegado:
+        return denegado
+    perfil = buffer_perfiles.obtener(perfil_id)
+    if perfil is None:
+        return jsonify({'error': 'El perfil no existe o ya salió del buffer.'}), 404
+
+    if perfil['modo'] == CPROFILE:
+        respuesta = make_response(perfil['datos'])
+        respuesta.headers['Content-Type'] = 'application/octet-stream'
+        nombre = f"perfil-{perfil_id}.prof"
+    else:
+        respuesta = make_response(perfil['resumen'])
+        respuesta.headers['Content-Type'] = 'text/plain; charset=utf-8'
+        nombre = f"perfil-{perfil_id}.txt"
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return respuesta
@@ -0,0 +1,38 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash, get_flashed_messages
+from flask_login import login_user, logout_user, login_required, current_user
+from models import User
+
+auth_bp = Blueprint('auth_bp', __name__)
+
+
+# --- RUTAS DE AUTENTICACIÓN ---
+@auth_bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('rooms_bp.dashboard'))
+
+    if request.method == 'POST':
+        username = request.form.get('username')
+        password = request.form.get('password')
+
+        user = User.query.filter_by(username=username).first()
+
+        if user and user.check_password(password):
+            login_user(user)
+            get_flashed_messages()
+            flash(f'¡Bienvenido, {user.username}! Inicio de sesión exitoso.', 'success')
+
+            return redirect(request.args.get('next') or url_for('rooms_bp.dashboard'))
+        else:
+            flash('Usuario o contraseña incorrectos.', 'error')
+            return render_template('login.html')
+
+    return render_template('login.html')
+
+
+@auth_bp.route('/logout')
+@login_required
+def logout():
+    logout_user()
+    flash('Has cerrado sesión exitosamente.', 'info')
+    return redirect(url_for('auth_bp.login'))
@@ -0,0 +1,140 @@
+from flask import Blueprint, render_template, request, jsonify
+from flask_login import login_required
+from reportes import get_renta_reports_mejorado, get_metricas_comparativas, get_reporte_consolidado, get_actividad_por_hora
+from reportes import get_comparacion_periodos, get_reporte_seccion, get_totales_horas_extras
+
+reportes_bp = Blueprint('reportes_bp', __name__)
+
+
+# --- RUTA DE REPORTES Y GRÁFICAS MEJORADA ---
+@reportes_bp.route('/reportes_rentas')
+@login_required
+def reportes_rentas():
+    # Obtener parámetros de filtro
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+    tipo_reporte = request.args.get('tipo_reporte', 'general')
+    sucursal_id = request.args.get('sucursal_id', type=int)
+
+    # Llama a la función mejorada para obtener los datos
+    reportes = get_renta_reports_mejorado(fecha_inicio, fecha_fin, sucursal_id)
+
+    # Datos adicionales para métricas comparativas
+    metricas = get_metricas_comparativas(fecha_inicio, fecha_fin)
+
+    return render_template('reportes.html',
+                          reportes=reportes,
+                          metricas=metricas,
+                          fecha_inicio=fecha_inicio,
+                          fecha_fin=fecha_fin,
+                          tipo_reporte=tipo_reporte)
+
+
+# --- RUTA API PARA REPORTES ESPECÍFICOS ---
+@reportes_bp.route('/api/reportes/horas-extras')
+@login_required
+def api_horas_extras():
+    """API para obtener solo datos de horas extras"""
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+    sucursal_id = request.args.get('sucursal_id', type=int)
+
+    horas_extras = get_reporte_seccion('horas_extras', fecha_inicio, fecha_fin, sucursal_id)
+    _, total_monto_extra = get_totales_horas_extras(horas_extras)
+    return jsonify({
+        'horas_extras': horas_extras,
+        'total_monto_extra': total_monto_extra
+    })
+
+
+@reportes_bp.route('/api/reportes/vehicular')
+@login_required
+def api_vehicular():
+    """API para obtener solo datos vehiculares"""
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+    sucursal_id = request.args.get('sucursal_id', type=int)
+
+    return jsonify({
+        'ingreso_vehiculos': get_reporte_seccion('ingreso_vehiculos', fecha_inicio, fecha_fin, sucursal_id)
+    })
+
+
+@reportes_bp.route('/api/reportes/consolidado')
+@login_required
+def api_consolidado():
+    """API con ingresos y ocupación de todas las sucursales"""
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+
+    return jsonify(get_reporte_consolidado(fecha_inicio, fecha_fin))
+
+
+@reportes_bp.route('/api/reportes/analitica')
+@login_required
+def api_analitica():
+    """API de analítica de ocupación e ingresos (vectorizada, requiere NumPy)"""
+    # Import diferido: NumPy solo se carga cuando alguien pide la analítica
+    import analitica
+
+    if not analitica.disponible():
+        return jsonify({'error': 'La analítica requiere NumPy instalado en el servidor.'}), 501
+
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+
+    return jsonify(analitica.calcular_analitica(fecha_inicio, fecha_fin))
+
+
+@reportes_bp.route('/api/reportes/pronostico')
+@login_required
+def api_pronostico():
+    """API de llegadas esperadas por hora y tipo de habitación (modelo entrenado con 'flask entrenar-pronostico')"""
+    from pronostico import pronosticar
+
+    horas = min(max(request.args.get('horas', 24, type=int), 1), 168)
+    return jsonify(pronosticar(horas))
+
+
+@reportes_bp.route('/api/reportes/actividad-horaria')
+@login_required
+def api_actividad_horaria():
+    """API de check-ins, check-outs e ingreso por hora del día (tabla materializada)"""
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+
+    return jsonify(get_actividad_por_hora(fecha_inicio, fecha_fin))
+
+
+@reportes_bp.route('/api/reportes/comparacion')
+@login_required
+def api_comparacion():
+    """API de comparación entre períodos (anterior / año anterior, con ventana móvil opcional)"""
+    fecha_inicio = request.args.get('fecha_inicio')
+    fecha_fin = request.args.get('fecha_fin')
+    modo = request.args.get('modo', 'anterior')
+    ventana = request.args.get('ventana', 1, type=int)
+    sucursal_id = request.args.get('sucursal_id', type=int)
+
+    try:
+        return jsonify(get_comparacion_periodos(fecha_inicio, fecha_fin, modo, ventana, sucursal_id))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@reportes_bp.route('/api/reportes/cache')
+@login_required
+def api_cache_reportes():
+    """Métricas de la caché de reportes (aciertos / fallos / invalidaciones)"""
+    from cache_reportes import cache_reportes
+
+    return jsonify(cache_reportes.estadisticas())
+
+
+@reportes_bp.route('/api/reportes/replica')
+@login_required
+def api_replica():
+    """Estado del enrutamiento de lecturas: réplica configurada, retraso y lecturas servidas"""
+    from replica import enrutador_lectura
+    enrutador_lectura.disponible()
+    return jsonify(enrutador_lectura.estado())
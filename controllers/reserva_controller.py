@@ -0,0 +1,231 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user
+from datetime import datetime, timedelta
+from sqlalchemy.orm.exc import StaleDataError
+from models import db, Habitacion, Renta, RegistroAcceso, EstadoHabitacion, ModoIngreso, Reserva
+from cache_habitaciones import cache_habitaciones
+from idempotencia import idempotente
+from mantenimiento import conflicto as conflicto_mantenimiento, mensaje_conflicto
+from controllers.room_controller import MENSAJE_HABITACION_CAMBIADA
+
+reservas_bp = Blueprint('reservas_bp', __name__)
+
+
+# --- SISTEMA DE RESERVAS ---
+@reservas_bp.route('/reservas')
+@login_required
+def reservas():
+    """Lista todas las reservas"""
+    try:
+        reservas_lista = Reserva.query.order_by(Reserva.fecha_reserva.desc()).all()
+        habitaciones = cache_habitaciones.listar()
+
+        return render_template('reservas.html', 
+                             reservas=reservas_lista, 
+                             habitaciones=habitaciones)
+    except Exception as e:
+        flash(f'Error al cargar reservas: {str(e)}', 'error')
+        return redirect(url_for('rooms_bp.dashboard'))
+
+@reservas_bp.route('/nueva_reserva', methods=['GET', 'POST'])
+@login_required
+@idempotente
+def nueva_reserva():
+    """Crear nueva reserva"""
+    if request.method == 'POST':
+        try:
+            habitacion_id = request.form.get('habitacion_id', type=int)
+            cliente_nombre = request.form.get('cliente_nombre')
+            cliente_telefono = request.form.get('cliente_telefono', '')
+            fecha_reserva_str = request.form.get('fecha_reserva')
+            hora_reserva_str = request.form.get('hora_reserva')
+            horas_reservadas = request.form.get('horas_reservadas', type=int)
+
+            # Validaciones básicas
+            if not all([habitacion_id, cliente_nombre, fecha_reserva_str, hora_reserva_str, horas_reservadas]):
+                flash('Todos los campos son obligatorios', 'error')
+                return redirect(url_for('reservas_bp.nueva_reserva'))
+
+            # Convertir fechas
+            fecha_reserva = datetime.strptime(fecha_reserva_str, '%Y-%m-%d').date()
+            hora_reserva = datetime.strptime(hora_reserva_str, '%H:%M').time()
+
+            # Verificar disponibilidad de habitación
+            habitacion = Habitacion.query.get(habitacion_id)
+            if not habitacion or not habitacion.activa:
+                flash('Habitación no disponible', 'error')
+                return redirect(url_for('reservas_bp.nueva_reserva'))
+
+            llegada = datetime.combine(fecha_reserva, hora_reserva)
+            ventana = conflicto_mantenimiento(habitacion_id, llegada, llegada + timedelta(hours=horas_reservadas))
+            if ventana:
+                flash(mensaje_conflicto(ventana), 'error')
+                return redirect(url_for('reservas_bp.nueva_reserva'))
+
+            # Calcular precio estimado
+            precio_estimado = habitacion.precio_base * horas_reservadas
+
+            # Crear reserva
+            nueva_reserva = Reserva(
+                habitacion_id=habitacion_id,
+                recepcionista_id=current_user.id,
+                cliente_nombre=cliente_nombre,
+                cliente_telefono=cliente_telefono,
+                fecha_reserva=fecha_reserva,
+                hora_reserva=hora_reserva,
+                horas_reservadas=horas_reservadas,
+                precio_estimado=precio_estimado,
+                estado='PENDIENTE'
+            )
+
+            db.session.add(nueva_reserva)
+            db.session.commit()
+
+            flash(f'Reserva creada exitosamente para {cliente_nombre}. Precio estimado: ${precio_estimado:.2f}', 'success')
+            return redirect(url_for('reservas_bp.reservas'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error al crear reserva: {str(e)}', 'error')
+            return redirect(url_for('reservas_bp.nueva_reserva'))
+
+    else:
+        # GET - Mostrar formulario
+        habitaciones_disponibles = cache_habitaciones.listar(activa=True)
+
+        # Fecha mínima (hoy)
+        fecha_minima = datetime.now().strftime('%Y-%m-%d')
+
+        return render_template('nueva_reserva.html',
+                             habitaciones=habitaciones_disponibles,
+                             fecha_minima=fecha_minima)
+
+@reservas_bp.route('/confirmar_reserva/<int:reserva_id>', methods=['POST'])
+@login_required
+def confirmar_reserva(reserva_id):
+    """Confirmar una reserva pendiente"""
+    try:
+        reserva = Reserva.query.get_or_404(reserva_id)
+
+        if reserva.estado != 'PENDIENTE':
+            flash('Solo se pueden confirmar reservas pendientes', 'error')
+            return redirect(url_for('reservas_bp.reservas'))
+
+        reserva.estado = 'CONFIRMADA'
+        reserva.confirmada_at = datetime.now()
+
+        db.session.commit()
+
+        flash(f'Reserva de {reserva.cliente_nombre} confirmada exitosamente', 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al confirmar reserva: {str(e)}', 'error')
+
+    return redirect(url_for('reservas_bp.reservas'))
+
+@reservas_bp.route('/convertir_a_checkin/<int:reserva_id>', methods=['POST'])
+@login_required
+@idempotente
+def convertir_a_checkin(reserva_id):
+    """Convertir reserva confirmada a check-in - VERSIÓN CORREGIDA"""
+    try:
+        reserva = Reserva.query.get_or_404(reserva_id)
+
+        if reserva.estado != 'CONFIRMADA':
+            flash('Solo se pueden convertir reservas confirmadas', 'error')
+            return redirect(url_for('reservas_bp.reservas'))
+
+        # Verificar que la habitación esté disponible
+        habitacion = reserva.habitacion
+        if habitacion.estado != EstadoHabitacion.DISPONIBLE:
+            flash(f'La habitación {habitacion.numero} no está disponible', 'error')
+            return redirect(url_for('reservas_bp.reservas'))
+
+        ahora = datetime.now()
+        ventana = conflicto_mantenimiento(habitacion.id, ahora, ahora + timedelta(hours=reserva.horas_reservadas))
+        if ventana:
+            flash(mensaje_conflicto(ventana), 'error')
+            return redirect(url_for('reservas_bp.reservas'))
+
+        # ✅ CAPTURAR DATOS DEL FORMULARIO
+        tipo_ingreso = request.form.get('tipo_ingreso', 'a_pie')
+        placa_vehiculo = request.form.get('placa_vehiculo', '')
+
+        # ✅ ACTUALIZAR LOS CAMPOS NUEVOS EN LA RESERVA
+        hora_entrada_real = datetime.now()
+        reserva.fecha_hora_entrada_real = hora_entrada_real
+        reserva.tipo_ingreso = tipo_ingreso
+        reserva.placa_vehiculo = placa_vehiculo
+
+        # Crear renta a partir de la reserva
+        hora_salida_estimada = hora_entrada_real + timedelta(hours=reserva.horas_reservadas)
+
+        nueva_renta = Renta(
+            habitacion_id=reserva.habitacion_id,
+            recepcionista_id=current_user.id,
+            cliente_nombre=reserva.cliente_nombre,
+            cliente_id=reserva.cliente_id,
+            horas_reservadas=reserva.horas_reservadas,
+            hora_entrada=hora_entrada_real,
+            hora_salida_estimada=hora_salida_estimada,
+            pago_horas=reserva.precio_estimado,
+            precio_hora=habitacion.precio_base,
+            estado='ACTIVA',
+            reserva_id=reserva.id  # Relacionar con la reserva
+        )
+
+        db.session.add(nueva_renta)
+        db.session.flush()
+
+        # Determinar modo_ingreso para RegistroAcceso
+        modo_ingreso_enum = ModoIngreso.VEHICULO if tipo_ingreso == 'vehiculo' else ModoIngreso.A_PIE
+
+        # Crear registro de acceso
+        registro_acceso = RegistroAcceso(
+            renta_id=nueva_renta.id,
+            modo_ingreso=modo_ingreso_enum,
+            placas=placa_vehiculo if tipo_ingreso == 'vehiculo' and placa_vehiculo else None,
+            hora_ingreso=hora_entrada_real
+        )
+        db.session.add(registro_acceso)
+
+        # Actualizar estado de habitación y reserva
+        habitacion.estado = EstadoHabitacion.OCUPADA
+        reserva.estado = 'COMPLETADA'
+
+        db.session.commit()
+
+        flash(f'Check-in exitoso desde reserva! Habitación {habitacion.numero} ocupada.', 'success')
+        return redirect(url_for('rooms_bp.dashboard'))
+
+    except StaleDataError:
+        db.session.rollback()
+        flash(MENSAJE_HABITACION_CAMBIADA, 'error')
+        return redirect(url_for('reservas_bp.reservas'))
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al convertir reserva a check-in: {str(e)}', 'error')
+        return redirect(url_for('reservas_bp.reservas'))
+
+@reservas_bp.route('/cancelar_reserva/<int:reserva_id>', methods=['POST'])
+@login_required
+def cancelar_reserva(reserva_id):
+    """Cancelar una reserva"""
+    try:
+        reserva = Reserva.query.get_or_404(reserva_id)
+
+        if reserva.estado == 'COMPLETADA':
+            flash('No se puede cancelar una reserva ya completada', 'error')
+            return redirect(url_for('reservas_bp.reservas'))
+
+        reserva.estado = 'CANCELADA'
+        db.session.commit()
+
+        flash(f'Reserva de {reserva.cliente_nombre} cancelada', 'info')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error al cancelar reserva: {str(e)}', 'error')
+
+    return redirect(url_for('reservas_bp.reservas'))
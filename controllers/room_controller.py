@@ -2,22 +2,210 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 import math
-from ..models import db, Habitacion, Renta, RegistroAcceso, EstadoHabitacion, TipoHabitacion, ModoIngreso
-from ..models import BASE_HOUR_PRICE, LUXURY_HOUR_PRICE
+from sqlalchemy.orm.exc import StaleDataError
+from models import db, Habitacion, Renta, RegistroAcceso, EstadoHabitacion, TipoHabitacion, ModoIngreso
+from models import BASE_HOUR_PRICE, LUXURY_HOUR_PRICE
+from reportes import get_daily_summary, get_daily_activity_data, get_room_distribution
+from cache_habitaciones import cache_habitaciones
+from vencimientos import monitor_vencimientos
+from idempotencia import idempotente
+from limpieza import cola_limpieza, marcar_cierre_automatico, tareas_tomadas, BARRIDO_MINUTOS
+from mantenimiento import programador_mantenimiento, conflicto as conflicto_mantenimiento, mensaje_conflicto
+from contingencia import diario_contingencia, es_falla_conexion, rollback_seguro
 
 rooms_bp = Blueprint('rooms_bp', __name__)
 
+# La columna 'version' de Habitacion detectó que otra operación la cambió entre la lectura y el commit
+MENSAJE_HABITACION_CAMBIADA = ('La habitación fue modificada por otro usuario mientras se procesaba la operación. '
+                               'Recarga la página e intenta de nuevo.')
+
+
+def check_auto_clean_complete():
+    """
+    Revisa y actualiza el estado de las habitaciones de LIMPIEZA a DISPONIBLE
+    si ha pasado un tiempo prudente (LIMPIEZA_AUTOMATICA_MINUTOS, 0.1 para prueba) desde el
+    check-out. Las habitaciones que el personal ya tomó de la cola de limpieza se quedan
+    en LIMPIEZA hasta que la terminen.
+    """
+    if BARRIDO_MINUTOS <= 0:
+        return
+    try:
+        limite_tiempo = datetime.now() - timedelta(minutes=BARRIDO_MINUTOS)
+
+        habitaciones_a_liberar = db.session.query(Habitacion).join(Renta).filter(
+            Habitacion.estado == EstadoHabitacion.LIMPIEZA,
+            Renta.estado == 'CERRADA',
+            Renta.hora_salida_real <= limite_tiempo,
+            Habitacion.id.notin_(tareas_tomadas())
+        ).all()
+
+        if habitaciones_a_liberar:
+            for habitacion in habitaciones_a_liberar:
+                habitacion.estado = EstadoHabitacion.DISPONIBLE
+
+            # Sin limpieza real de por medio: las tareas se cierran sin entrar en las estadísticas
+            marcar_cierre_automatico(db.session)
+            db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+
+
+def tiempos_renta(hora_salida_estimada, es_hora_extra, ahora=None):
+    """(tiempo_restante, horas_extra) de una renta activa al instante 'ahora'"""
+    ahora = ahora or datetime.now()
+    if es_hora_extra:
+        return "", (ahora - hora_salida_estimada).total_seconds() / 3600
+
+    total_seconds = max(0, int((hora_salida_estimada - ahora).total_seconds()))
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    return f"{hours}h {minutes}m", 0
+
+
+def datos_renta_activa(renta):
+    """
+    Serializa una renta ACTIVA para el dashboard y la API (tiempo restante / horas extra).
+    El estado vencida / por vencer lo decide el monitor de vencimientos (llamar antes a
+    monitor_vencimientos.actualizar()).
+    """
+    es_hora_extra = monitor_vencimientos.esta_vencida(renta.id)
+    tiempo_restante_str, horas_extra = tiempos_renta(renta.hora_salida_estimada, es_hora_extra)
+
+    acceso = RegistroAcceso.query.filter_by(renta_id=renta.id).first()
+
+    return {
+        'renta_id': renta.id,
+        'numero': renta.habitacion.numero,
+        # Usar .value para obtener el string del Enum antes de pasarlo a Jinja/JSON
+        'tipo': renta.habitacion.tipo.value,
+        'cliente': renta.cliente_nombre,
+        'placas': acceso.placas if acceso and acceso.placas else 'N/A',
+        'entrada': renta.hora_entrada.strftime('%H:%M:%S'),
+        'salida_estimada': renta.hora_salida_estimada.strftime('%H:%M:%S'),
+        'pago_inicial': renta.pago_horas,
+        'tiempo_restante': tiempo_restante_str,
+        'es_hora_extra': es_hora_extra,
+        'por_vencer': monitor_vencimientos.esta_por_vencer(renta.id),
+        'horas_extra': horas_extra,
+        'precio_hora': renta.precio_hora
+    }
+
+
+def calcular_checkout(renta, hora_salida_real):
+    """
+    Cobro al salir: (horas extra a pagar, pago extra, pago final).
+    Cada hora extra iniciada se cobra completa al precio por hora de la renta.
+    Lo comparten el check-out individual y las operaciones masivas.
+    """
+    tiempo_extra_delta = hora_salida_real - renta.hora_salida_estimada
+    horas_extra_a_pagar = 0.0
+    pago_extra = 0.0
+    pago_final = renta.pago_horas if renta.pago_horas is not None else 0.0
+
+    if tiempo_extra_delta.total_seconds() > 0:
+        horas_extra_flotante = tiempo_extra_delta.total_seconds() / 3600
+        horas_extra_a_pagar = math.ceil(horas_extra_flotante)
+        pago_extra = horas_extra_a_pagar * renta.precio_hora
+        pago_final += pago_extra
+
+    return horas_extra_a_pagar, pago_extra, pago_final
+
+
+# --- RUTA PRINCIPAL (DASHBOARD) ---
+@rooms_bp.route('/')
+@rooms_bp.route('/dashboard')
+@login_required
+def dashboard():
+    # 🔔 Se ejecuta la revisión y limpieza automática al cargar el dashboard
+    check_auto_clean_complete()
+    programador_mantenimiento.revisar()
+
+    try:
+        monitor_vencimientos.actualizar()
+        resumen = get_daily_summary()
+        actividad = get_daily_activity_data()
+
+        # Obtenemos las rentas activas para la carga inicial
+        rentas_activas = Renta.query.filter(Renta.estado == 'ACTIVA').all()
+        distribucion = get_room_distribution()
+    except Exception as e:
+        if not es_falla_conexion(e):
+            raise
+        rollback_seguro()
+        return _dashboard_sin_conexion()
+
+    # Procesamos los datos para la plantilla
+    data = [datos_renta_activa(renta) for renta in rentas_activas]
+
+    return render_template('dashboard.html', ocupadas=data, resumen=resumen, actividad=actividad, distribucion=distribucion,
+                            EstadoHabitacion=EstadoHabitacion, TipoHabitacion=TipoHabitacion)
+
+
+def _dashboard_sin_conexion():
+    """Vista mínima con la última copia de las habitaciones y las operaciones guardadas localmente"""
+    try:
+        habitaciones = cache_habitaciones.listar()
+    except Exception:
+        rollback_seguro()
+        habitaciones = []
+    return render_template('contingencia.html', habitaciones=habitaciones,
+                           pendientes=diario_contingencia.pendientes(),
+                           EstadoHabitacion=EstadoHabitacion), 503
+
+
+def _checkin_sin_conexion():
+    """Check-in al diario local cuando la base de datos no responde (ver contingencia.py)"""
+    try:
+        renglon, habitacion = diario_contingencia.registrar_checkin(
+            request.form.get('habitacion_id', type=int),
+            request.form.get('horas_reservadas', type=int),
+            request.form.get('nombre_cliente'),
+            request.form.get('modo_ingreso'),
+            request.form.get('placas', '').upper(),
+            current_user.id,
+            request.form.get('idempotency_key')
+        )
+    except ValueError as e:
+        flash(str(e), 'error')
+    except Exception as e:
+        rollback_seguro()
+        flash(f'Sin conexión con la base de datos y sin copia local de las habitaciones: {str(e)}', 'error')
+    else:
+        flash(f'Sin conexión: check-in de la Habitación {habitacion.numero} guardado localmente (folio {renglon["id"][:8]}). '
+              'Se registrará automáticamente al regresar la conexión.', 'warning')
+    return redirect(url_for('rooms_bp.checkin'))
+
+
+def _checkout_sin_conexion(renta_id):
+    """Check-out al diario local; el cobro se calcula con la hora registrada al reproducirlo"""
+    try:
+        renglon, habitacion = diario_contingencia.registrar_checkout(
+            renta_id, current_user.id, request.form.get('idempotency_key'))
+    except ValueError as e:
+        flash(f'Error: {str(e)}', 'error')
+    except Exception as e:
+        rollback_seguro()
+        flash(f'Sin conexión con la base de datos y sin copia local de las habitaciones: {str(e)}', 'error')
+    else:
+        flash(f'Sin conexión: check-out de la Habitación {habitacion.numero} guardado localmente (folio {renglon["id"][:8]}). '
+              'El cobro de horas extra se calculará al regresar la conexión.', 'warning')
+    return redirect(url_for('rooms_bp.dashboard'))
+
+
+# --- RUTA DE CHECK-IN ---
 @rooms_bp.route('/checkin', methods=['GET', 'POST'])
 @login_required
+@idempotente
 def checkin():
-    recepcionista_id = current_user.id 
+    recepcionista_id = current_user.id
 
     if request.method == 'POST':
         try:
             room_id = request.form.get('habitacion_id', type=int)
             hours = request.form.get('horas_reservadas', type=int)
             nombre_cliente = request.form.get('nombre_cliente')
-            modo_ingreso_str = request.form.get('modo_ingreso') 
+            modo_ingreso_str = request.form.get('modo_ingreso')
             placas = request.form.get('placas', '').upper()
 
             if not room_id or not hours or not nombre_cliente or not modo_ingreso_str:
@@ -30,12 +218,20 @@ def checkin():
                 flash('La habitación no está disponible o no existe.', 'error')
                 return redirect(url_for('rooms_bp.checkin'))
 
+            # Lógica de precio basada en el nuevo TipoHabitacion
             precio_hora = LUXURY_HOUR_PRICE if habitacion.tipo == TipoHabitacion.JACUZZI else BASE_HOUR_PRICE
             pago_total = precio_hora * hours
 
             hora_entrada = datetime.now()
             hora_salida_estimada = hora_entrada + timedelta(hours=hours)
-            modo_ingreso = ModoIngreso[modo_ingreso_str] 
+
+            ventana = conflicto_mantenimiento(room_id, hora_entrada, hora_salida_estimada)
+            if ventana:
+                flash(mensaje_conflicto(ventana), 'error')
+                return redirect(url_for('rooms_bp.checkin'))
+
+            # Obtener el Enum a partir del string del formulario
+            modo_ingreso = ModoIngreso[modo_ingreso_str]
 
             nueva_renta = Renta(
                 habitacion_id=room_id,
@@ -49,60 +245,64 @@ def checkin():
                 estado='ACTIVA'
             )
             db.session.add(nueva_renta)
-            db.session.flush() 
+            db.session.flush()
 
             registro_acceso = RegistroAcceso(
                 renta_id=nueva_renta.id,
                 modo_ingreso=modo_ingreso,
-                placas=placas if placas and modo_ingreso == ModoIngreso.VEHICULO else None, 
+                placas=placas if placas and modo_ingreso == ModoIngreso.VEHICULO else None,
                 hora_ingreso=hora_entrada
             )
             db.session.add(registro_acceso)
 
             habitacion.estado = EstadoHabitacion.OCUPADA
-            
+
             db.session.commit()
 
             flash(f'Check-in exitoso! Habitación {habitacion.numero} rentada por {hours} horas. Pago inicial: ${pago_total:.2f}.', 'success')
-            return redirect(url_for('dashboard')) 
+            return redirect(url_for('rooms_bp.dashboard'))
 
+        except StaleDataError:
+            rollback_seguro()
+            flash(MENSAJE_HABITACION_CAMBIADA, 'error')
+            return redirect(url_for('rooms_bp.checkin'))
         except Exception as e:
-            db.session.rollback()
-            flash('Error interno al registrar el Check-in. Intente de nuevo.', 'error')
+            rollback_seguro()
+            if es_falla_conexion(e):
+                return _checkin_sin_conexion()
+            flash(f'Error interno al registrar el Check-in: {str(e)}', 'error')
             return redirect(url_for('rooms_bp.checkin'))
 
     else:
-        habitaciones_disponibles = Habitacion.query.filter_by(estado=EstadoHabitacion.DISPONIBLE).order_by(Habitacion.numero).all()
-        
+        habitaciones_disponibles = cache_habitaciones.listar(estado=EstadoHabitacion.DISPONIBLE)
+
         return render_template('checkin.html',
                                 habitaciones=habitaciones_disponibles,
                                 ModoIngreso=ModoIngreso)
 
 
+# --- RUTA DE CHECK-OUT ---
 @rooms_bp.route('/checkout/<int:renta_id>', methods=['POST'])
 @login_required
-def checkout_renta(renta_id):
-    renta = Renta.query.get(renta_id)
+@idempotente
+def checkout(renta_id):
+    try:
+        renta = Renta.query.get(renta_id)
+    except Exception as e:
+        if not es_falla_conexion(e):
+            raise
+        rollback_seguro()
+        return _checkout_sin_conexion(renta_id)
 
     if not renta or renta.estado != 'ACTIVA':
         flash('Error: La renta no existe o ya ha sido cerrada.', 'error')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('rooms_bp.dashboard'))
 
     try:
         hora_salida_real = datetime.now()
-        tiempo_extra_delta = hora_salida_real - renta.hora_salida_estimada
-        horas_extra_a_pagar = 0.0
-        pago_extra = 0.0
-        pago_final = renta.pago_horas
-
-        if tiempo_extra_delta.total_seconds() > 0:
-            horas_extra_flotante = tiempo_extra_delta.total_seconds() / 3600
-            horas_extra_a_pagar = math.ceil(horas_extra_flotante)
-            pago_extra = horas_extra_a_pagar * renta.precio_hora
-            pago_final += pago_extra
+        horas_extra_a_pagar, pago_extra, pago_final = calcular_checkout(renta, hora_salida_real)
 
         renta.hora_salida_real = hora_salida_real
-        renta.horas_extra = horas_extra_a_pagar
         renta.pago_extra = pago_extra
         renta.pago_final = pago_final
         renta.estado = 'CERRADA'
@@ -121,42 +321,50 @@ def checkout_renta(renta_id):
             flash_msg = (f'Check-out de Habitación {habitacion.numero} finalizado. '
                          f'Tiempo extra: {horas_extra_a_pagar} horas. '
                          f'Pago extra requerido: ${pago_extra:.2f}. Pago Total: ${pago_final:.2f}. '
-                         'Habitación marcada como LIMPIEZA.')
+                         'Habitación marcada como LIMPIEZA. Se liberará en 1 minuto.')
             flash(flash_msg, 'warning')
         else:
-            flash(f'Check-out de Habitación {habitacion.numero} completado sin cargos extra. Habitación marcada como LIMPIEZA.', 'success')
+            flash(f'Check-out de Habitación {habitacion.numero} completado sin cargos extra. Habitación marcada como LIMPIEZA. Se liberará en 1 minuto.', 'success')
 
+    except StaleDataError:
+        rollback_seguro()
+        flash(MENSAJE_HABITACION_CAMBIADA, 'error')
     except Exception as e:
-        db.session.rollback()
-        flash('Error interno al procesar el Check-out. Intente de nuevo.', 'error')
-        
-    return redirect(url_for('dashboard'))
+        rollback_seguro()
+        if es_falla_conexion(e):
+            return _checkout_sin_conexion(renta_id)
+        flash(f'Error interno al procesar el Check-out: {str(e)}', 'error')
 
+    return redirect(url_for('rooms_bp.dashboard'))
 
+
+# --- RUTA DE LIMPIEZA ---
 @rooms_bp.route('/limpieza')
 @login_required
 def limpieza():
-    habitaciones_limpieza = Habitacion.query.filter_by(estado=EstadoHabitacion.LIMPIEZA).order_by(Habitacion.numero).all()
-    
-    return render_template('limpieza.html', 
-                            habitaciones=habitaciones_limpieza)
+    return render_template('limpieza.html',
+                            tareas=cola_limpieza())
 
 
+# --- RUTA DE FIN DE LIMPIEZA MANUAL ---
 @rooms_bp.route('/clean_complete/<int:room_id>', methods=['POST'])
 @login_required
 def clean_complete(room_id):
     habitacion = Habitacion.query.get(room_id)
-    
+
     if not habitacion or habitacion.estado != EstadoHabitacion.LIMPIEZA:
-        flash(f'Error: La Habitación {habitacion.numero} no está en estado de LIMPIEZA.', 'error')
+        flash(f'Error: La Habitación {habitacion.numero if habitacion else room_id} no está en estado de LIMPIEZA.', 'error')
         return redirect(url_for('rooms_bp.limpieza'))
-        
+
     try:
         habitacion.estado = EstadoHabitacion.DISPONIBLE
         db.session.commit()
         flash(f'Habitación {habitacion.numero} marcada como DISPONIBLE y lista para la renta.', 'success')
+    except StaleDataError:
+        db.session.rollback()
+        flash(MENSAJE_HABITACION_CAMBIADA, 'error')
     except Exception as e:
         db.session.rollback()
-        flash('Error interno al marcar como disponible. Intente de nuevo.', 'error')
-        
+        flash(f'Error interno al marcar como disponible: {str(e)}', 'error')
+
     return redirect(url_for('rooms_bp.limpieza'))
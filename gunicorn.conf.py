@@ -0,0 +1,21 @@
+"""
+Configuración de gunicorn. Con preload_app la aplicación (imports, blueprints, plantillas
+compiladas) se construye una sola vez en el proceso maestro y los workers la heredan por fork.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+preload_app = True
+timeout = 30
+
+
+def post_fork(server, worker):
+    # Las conexiones del pool no deben compartirse entre procesos: cada worker abre las suyas
+    from wsgi import app
+    from models import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,233 @@
+"""
+Envíos idempotentes de formularios (doble clic, reintentos en conexiones lentas).
+
+Cada formulario protegido lleva un campo oculto 'idempotency_key' (o la cabecera
+Idempotency-Key) generado al renderizar la página. El decorador @idempotente:
+
+1. Busca el resultado en la caché en memoria (front cache) y luego en la tabla
+   claves_idempotencia; si la clave ya se completó, repite la respuesta original
+   (mensajes flash + redirección) sin volver a ejecutar la transacción.
+2. Si no existe, la reclama con un INSERT en su propia transacción: la llave primaria
+   garantiza que entre envíos simultáneos solo uno ejecute la vista. Los demás no esperan
+   (no ocupan un worker síncrono): si la clave ya se completó repiten su resultado y si
+   sigue en proceso responden 409 con Retry-After para que el cliente reintente.
+3. Al terminar guarda la respuesta solo si tuvo éxito: una redirección sin mensajes flash de
+   categoría 'error' y sin rollback de la sesión durante la vista. Si la vista falla (excepción,
+   validación, habitación momentáneamente no disponible, conflicto de mantenimiento) libera
+   la clave: el reintento con la misma clave vuelve a ejecutarla en lugar de repetir el error.
+
+La clave se combina con la ruta y el usuario, así una misma clave reutilizada en otro
+formulario no repite un resultado ajeno. Los renglones expiran a las
+IDEMPOTENCIA_TTL_HORAS horas y se depuran de forma oportunista.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import request, session, flash, redirect, make_response
+from flask_login import current_user
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import db, ClaveIdempotencia
+
+TTL_HORAS = float(os.environ.get("IDEMPOTENCIA_TTL_HORAS", 24))
+REINTENTAR_SEGUNDOS = 1
+MAX_CACHE = 2000
+PROBABILIDAD_DEPURAR = 0.01
+
+EN_PROCESO = 'EN_PROCESO'
+COMPLETADA = 'COMPLETADA'
+
+_CLAVE_DESHECHA = 'idempotencia_rollback'
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _marcar_rollback(session, transaccion_previa):
+    # La vista deshizo su transacción (rollback_seguro en sus rutas de error): no es un resultado a repetir
+    session.info[_CLAVE_DESHECHA] = True
+
+
+def clave_nueva():
+    """Valor para el campo oculto idempotency_key (global de Jinja)"""
+    return uuid.uuid4().hex
+
+
+class CacheRespuestas:
+    """Front cache LRU de respuestas completadas: evita la consulta a la tabla en los reintentos"""
+
+    def __init__(self, max_entradas=MAX_CACHE):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # clave -> (respuesta, expira)
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if entrada[1] < datetime.now():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[0]
+
+    def guardar(self, clave, respuesta, expira):
+        with self._lock:
+            self._entradas[clave] = (respuesta, expira)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+
+cache_respuestas = CacheRespuestas()
+
+
+def _clave_compuesta(clave):
+    usuario = current_user.get_id() if current_user and current_user.is_authenticated else ''
+    return hashlib.sha1(f"{clave}|{request.path}|{usuario}".encode('utf-8')).hexdigest()
+
+
+def _tabla():
+    return ClaveIdempotencia.__table__
+
+
+def _reclamar(clave, expira):
+    """INSERT de la clave en EN_PROCESO. True si este proceso la obtuvo."""
+    tabla = _tabla()
+    try:
+        with db.engine.begin() as conexion:
+            conexion.execute(insert(tabla).values(clave=clave, estado=EN_PROCESO, expira_at=expira))
+        return True
+    except IntegrityError:
+        # Si la clave existente ya expiró se descarta y se vuelve a reclamar
+        with db.engine.begin() as conexion:
+            eliminadas = conexion.execute(delete(tabla).where(
+                tabla.c.clave == clave, tabla.c.expira_at < datetime.now()
+            )).rowcount
+        return _reclamar(clave, expira) if eliminadas else False
+
+
+def _leer(clave):
+    tabla = _tabla()
+    with db.engine.connect() as conexion:
+        return conexion.execute(select(tabla.c.estado, tabla.c.respuesta).where(tabla.c.clave == clave)).first()
+
+
+def _resultado(clave):
+    """Respuesta guardada si el envío que reclamó la clave ya terminó; None si sigue en proceso"""
+    fila = _leer(clave)
+    if fila is None or fila.estado != COMPLETADA:
+        return None
+    return json.loads(fila.respuesta)
+
+
+def _en_proceso():
+    respuesta = make_response('Esta solicitud ya se está procesando; reintenta en un momento.', 409)
+    respuesta.headers['Retry-After'] = str(REINTENTAR_SEGUNDOS)
+    return respuesta
+
+
+def _completar(clave, respuesta, expira):
+    tabla = _tabla()
+    with db.engine.begin() as conexion:
+        conexion.execute(update(tabla).where(tabla.c.clave == clave).values(
+            estado=COMPLETADA, respuesta=json.dumps(respuesta)
+        ))
+    cache_respuestas.guardar(clave, respuesta, expira)
+
+
+def _liberar(clave):
+    tabla = _tabla()
+    with db.engine.begin() as conexion:
+        conexion.execute(delete(tabla).where(tabla.c.clave == clave))
+
+
+def _depurar():
+    tabla = _tabla()
+    with db.engine.begin() as conexion:
+        conexion.execute(delete(tabla).where(tabla.c.expira_at < datetime.now()))
+
+
+def _exitosa(resultado, flashes):
+    return (getattr(resultado, 'status_code', None) in (301, 302, 303, 307, 308)
+            and not db.session.info.get(_CLAVE_DESHECHA)
+            and all(categoria != 'error' for categoria, _ in flashes))
+
+
+def _repetir(respuesta):
+    for categoria, mensaje in respuesta['flashes']:
+        flash(mensaje, categoria)
+    return redirect(respuesta['location'], code=respuesta['status'])
+
+
+def idempotente(vista):
+    """Decorador para rutas POST que terminan en redirección (checkin, checkout, reservas)"""
+
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        clave_formulario = request.form.get('idempotency_key') or request.headers.get('Idempotency-Key')
+        if request.method != 'POST' or not clave_formulario:
+            return vista(*args, **kwargs)
+
+        clave = _clave_compuesta(clave_formulario)
+        respuesta = cache_respuestas.obtener(clave)
+        if respuesta is not None:
+            return _repetir(respuesta)
+
+        expira = datetime.now() + timedelta(hours=TTL_HORAS)
+        try:
+            reclamada = _reclamar(clave, expira)
+        except Exception as e:
+            from contingencia import es_falla_conexion
+            if not es_falla_conexion(e):
+                raise
+            # Sin base de datos: el diario de contingencia descarta el doble envío con la misma clave
+            return vista(*args, **kwargs)
+        if not reclamada:
+            respuesta = _resultado(clave)
+            return _repetir(respuesta) if respuesta is not None else _en_proceso()
+
+        if random.random() < PROBABILIDAD_DEPURAR:
+            try:
+                _depurar()
+            except Exception as e:
+                print(f"Error al depurar claves de idempotencia: {e}")
+
+        previos = len(session.get('_flashes', []))
+        db.session.info.pop(_CLAVE_DESHECHA, None)
+        try:
+            resultado = vista(*args, **kwargs)
+        except Exception:
+            _liberar(clave)
+            raise
+
+        try:
+            flashes = [list(f) for f in session.get('_flashes', [])[previos:]]
+            if _exitosa(resultado, flashes):
+                _completar(clave, {
+                    'location': resultado.location,
+                    'status': resultado.status_code,
+                    'flashes': flashes
+                }, expira)
+            else:
+                # Error, validación o respuesta que no es redirección: el reintento vuelve a ejecutar la vista
+                _liberar(clave)
+        except Exception as e:
+            # La conexión se perdió después de ejecutar la vista: la clave expira sola
+            print(f"Error al guardar la clave de idempotencia: {e}")
+        return resultado
+
+    return envoltura
@@ -0,0 +1,490 @@
+"""
+Importación masiva de históricos (CSV o Excel del sistema anterior).
+
+    flask import rentas.csv [--tipo rentas|reservas] [--lote 5000] [--usuario admin] [--desde-cero]
+
+- Lectura en streaming: csv.reader renglón por renglón (UTF-8, con o sin BOM) u
+  openpyxl en modo read_only para .xlsx (dependencia opcional), así la memoria no depende
+  del tamaño del archivo.
+- Validación y mapeo: la habitación se busca por 'numero' (un solo diccionario cargado al
+  inicio); fechas, horas e importes se validan y los faltantes se derivan (precio por tipo
+  de habitación, pago_horas = precio_hora * horas, pago_final = pago_horas + pago_extra).
+- Inserción: INSERT por lotes con executemany de Core (sin objetos ORM ni eventos de
+  sesión), una transacción por lote. Las rentas llevan su registro de acceso.
+- Rechazos: cada renglón inválido se escribe en <archivo>.rechazos.csv con el motivo.
+- Reanudación: después de cada lote confirmado se guarda el avance en
+  <archivo>.importacion.json; al volver a ejecutar se saltan los renglones ya procesados.
+  Las llaves naturales (habitación + entrada en rentas, activas o ya archivadas; habitación +
+  fecha + hora + cliente en reservas) evitan duplicados si el proceso se interrumpió entre el
+  commit y el avance o si se vuelve a importar un periodo que ya se archivó.
+- Reportes: cada lote de rentas marca la generación compartida de reportes en su misma
+  transacción (los workers descartan sus resultados cacheados) y descarta aquí los del rango.
+- Derivados: como no pasan eventos de sesión, al terminar se reconstruye la actividad por
+  hora del rango importado y se asignan los clientes (desactivar con --sin-derivados).
+"""
+import csv
+import json
+import math
+import os
+import unicodedata
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import insert, select, tuple_
+
+from models import db, Habitacion, Renta, RentaArchivo, RegistroAcceso, Reserva, User, TipoHabitacion, ModoIngreso
+from models import BASE_HOUR_PRICE, LUXURY_HOUR_PRICE
+from cache_reportes import cache_reportes, marcar_cambio
+
+try:
+    import openpyxl
+except ImportError:  # Dependencia opcional: sin openpyxl solo se importan archivos CSV
+    openpyxl = None
+
+RENTAS = 'rentas'
+RESERVAS = 'reservas'
+TIPOS = (RENTAS, RESERVAS)
+
+ESTADOS_RESERVA = ('PENDIENTE', 'CONFIRMADA', 'CANCELADA', 'COMPLETADA')
+
+FORMATOS_FECHA_HORA = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M',
+                       '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M')
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+FORMATOS_HORA = ('%H:%M:%S', '%H:%M')
+
+# Encabezado normalizado -> campo; los encabezados se comparan sin acentos ni mayúsculas
+ALIAS = {
+    'habitacion': ('habitacion', 'numero', 'num_habitacion', 'cuarto'),
+    'cliente': ('cliente', 'cliente_nombre', 'nombre', 'nombre_cliente'),
+    'telefono': ('telefono', 'cliente_telefono', 'tel'),
+    'entrada': ('entrada', 'hora_entrada', 'fecha_entrada', 'ingreso'),
+    'salida': ('salida', 'hora_salida', 'hora_salida_real', 'fecha_salida'),
+    'horas': ('horas', 'horas_reservadas', 'horas_rentadas'),
+    'precio_hora': ('precio_hora', 'precio'),
+    'pago_horas': ('pago_horas', 'pago', 'importe'),
+    'pago_extra': ('pago_extra', 'extra', 'cargo_extra'),
+    'pago_final': ('pago_final', 'total'),
+    'modo_ingreso': ('modo_ingreso', 'modo', 'tipo_ingreso'),
+    'placas': ('placas', 'placa', 'placa_vehiculo'),
+    'fecha': ('fecha', 'fecha_reserva'),
+    'hora': ('hora', 'hora_reserva'),
+    'precio_estimado': ('precio_estimado',),
+    'estado': ('estado',),
+}
+
+OBLIGATORIOS = {
+    RENTAS: ('habitacion', 'entrada', 'salida'),
+    RESERVAS: ('habitacion', 'cliente', 'fecha', 'hora', 'horas'),
+}
+
+
+class RenglonInvalido(ValueError):
+    pass
+
+
+# --- Lectura en streaming ---
+
+def _normalizar_encabezado(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    return '_'.join(texto.strip().lower().replace('-', ' ').split())
+
+
+def _mapa_columnas(encabezados, tipo):
+    """{campo: índice de columna}; RenglonInvalido si faltan columnas obligatorias"""
+    normalizados = [_normalizar_encabezado(e) for e in encabezados]
+    mapa = {}
+    for campo, alias in ALIAS.items():
+        for nombre in alias:
+            if nombre in normalizados:
+                mapa[campo] = normalizados.index(nombre)
+                break
+    faltantes = [c for c in OBLIGATORIOS[tipo] if c not in mapa]
+    if faltantes:
+        raise RenglonInvalido(f"Faltan columnas obligatorias: {', '.join(faltantes)} (encabezados: {encabezados})")
+    return mapa
+
+
+def _renglones(ruta, hoja=None):
+    """Genera (encabezados) y luego cada renglón como lista de valores"""
+    if ruta.lower().endswith(('.xlsx', '.xlsm')):
+        if openpyxl is None:
+            raise RuntimeError("Para importar Excel instala openpyxl (pip install openpyxl) o exporta a CSV.")
+        libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            filas = (libro[hoja] if hoja else libro.active).iter_rows(values_only=True)
+            for fila in filas:
+                yield list(fila)
+        finally:
+            libro.close()
+    else:
+        with open(ruta, newline='', encoding='utf-8-sig') as archivo:
+            muestra = archivo.read(4096)
+            archivo.seek(0)
+            try:
+                dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t|')
+            except csv.Error:
+                dialecto = csv.excel
+            for fila in csv.reader(archivo, dialecto):
+                yield fila
+
+
+# --- Conversión de valores ---
+
+def _texto(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)  # Excel guarda el número de habitación 101 como 101.0
+    texto = str(valor).strip()
+    return texto or None
+
+
+def _fecha_hora(valor, campo):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    if isinstance(valor, date):
+        return datetime.combine(valor, time())
+    texto = _texto(valor)
+    if texto is None:
+        return None
+    try:
+        resultado = datetime.fromisoformat(texto)  # Caso común y mucho más rápido que strptime
+    except ValueError:
+        pass
+    else:
+        if resultado.tzinfo is None:
+            return resultado
+    for formato in FORMATOS_FECHA_HORA:
+        try:
+            return datetime.strptime(texto, formato)
+        except ValueError:
+            pass
+    raise RenglonInvalido(f"{campo}: fecha y hora inválida '{texto}'")
+
+
+def _fecha(valor, campo):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = _texto(valor)
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto or '', formato).date()
+        except ValueError:
+            pass
+    raise RenglonInvalido(f"{campo}: fecha inválida '{texto}'")
+
+
+def _hora(valor, campo):
+    if isinstance(valor, datetime):
+        return valor.time()
+    if isinstance(valor, time):
+        return valor
+    texto = _texto(valor)
+    for formato in FORMATOS_HORA:
+        try:
+            return datetime.strptime(texto or '', formato).time()
+        except ValueError:
+            pass
+    raise RenglonInvalido(f"{campo}: hora inválida '{texto}'")
+
+
+def _importe(valor, campo):
+    if valor is None or isinstance(valor, (int, float)):
+        resultado = valor
+    else:
+        texto = _texto(valor)
+        if texto is None:
+            return None
+        texto = texto.replace('$', '').replace(' ', '')
+        # '1,250.50' -> miles con coma; '150,50' -> coma decimal
+        texto = texto.replace(',', '') if '.' in texto else texto.replace(',', '.')
+        try:
+            resultado = float(texto)
+        except ValueError:
+            raise RenglonInvalido(f"{campo}: importe inválido '{valor}'")
+    if resultado is not None and (resultado < 0 or math.isnan(resultado)):
+        raise RenglonInvalido(f"{campo}: importe negativo o inválido '{valor}'")
+    return resultado
+
+
+def _horas(valor, campo):
+    importe = _importe(valor, campo)
+    if importe is None:
+        return None
+    if importe <= 0 or not float(importe).is_integer():
+        raise RenglonInvalido(f"{campo}: debe ser un entero positivo ('{valor}')")
+    return int(importe)
+
+
+# --- Validación y mapeo por tipo ---
+
+def _valor(fila, mapa, campo):
+    indice = mapa.get(campo)
+    return fila[indice] if indice is not None and indice < len(fila) else None
+
+
+def _habitacion(fila, mapa, habitaciones):
+    numero = _texto(_valor(fila, mapa, 'habitacion'))
+    if numero is None:
+        raise RenglonInvalido("habitacion: vacío")
+    habitacion = habitaciones.get(numero.upper())
+    if habitacion is None:
+        raise RenglonInvalido(f"habitacion: no existe el número '{numero}'")
+    return habitacion
+
+
+def _convertir_renta(fila, mapa, habitaciones, usuario_id):
+    habitacion_id, tipo = _habitacion(fila, mapa, habitaciones)
+    entrada = _fecha_hora(_valor(fila, mapa, 'entrada'), 'entrada')
+    salida = _fecha_hora(_valor(fila, mapa, 'salida'), 'salida')
+    if entrada is None or salida is None:
+        raise RenglonInvalido("entrada y salida son obligatorias (solo se importan rentas cerradas)")
+    if salida < entrada:
+        raise RenglonInvalido("salida anterior a la entrada")
+    if entrada > datetime.now():
+        raise RenglonInvalido("entrada en el futuro")
+
+    horas = _horas(_valor(fila, mapa, 'horas'), 'horas') or max(1, math.ceil((salida - entrada).total_seconds() / 3600))
+    precio_hora = _importe(_valor(fila, mapa, 'precio_hora'), 'precio_hora')
+    if precio_hora is None:
+        precio_hora = LUXURY_HOUR_PRICE if tipo == TipoHabitacion.JACUZZI else BASE_HOUR_PRICE
+    pago_horas = _importe(_valor(fila, mapa, 'pago_horas'), 'pago_horas')
+    pago_horas = precio_hora * horas if pago_horas is None else pago_horas
+    pago_extra = _importe(_valor(fila, mapa, 'pago_extra'), 'pago_extra') or 0.0
+    pago_final = _importe(_valor(fila, mapa, 'pago_final'), 'pago_final')
+
+    modo = (_texto(_valor(fila, mapa, 'modo_ingreso')) or 'A_PIE').upper().replace(' ', '_')
+    if modo in ('AUTO', 'CARRO', 'COCHE'):
+        modo = 'VEHICULO'
+    if modo not in ModoIngreso.__members__:
+        raise RenglonInvalido(f"modo_ingreso: '{modo}' no es {', '.join(ModoIngreso.__members__)}")
+    placas = _texto(_valor(fila, mapa, 'placas'))
+
+    renta = dict(
+        habitacion_id=habitacion_id, recepcionista_id=usuario_id,
+        cliente_nombre=(_texto(_valor(fila, mapa, 'cliente')) or '')[:100] or None,
+        horas_reservadas=horas, hora_entrada=entrada, hora_salida_estimada=entrada + timedelta(hours=horas),
+        hora_salida_real=salida, precio_hora=precio_hora, pago_horas=pago_horas, pago_extra=pago_extra,
+        pago_final=pago_horas + pago_extra if pago_final is None else pago_final,
+        estado='CERRADA', created_at=entrada, updated_at=salida
+    )
+    acceso = dict(modo_ingreso=ModoIngreso[modo], placas=placas[:10] if placas else None,
+                  hora_ingreso=entrada, hora_salida=salida)
+    return (habitacion_id, entrada), (renta, acceso)
+
+
+def _convertir_reserva(fila, mapa, habitaciones, usuario_id):
+    habitacion_id, tipo = _habitacion(fila, mapa, habitaciones)
+    cliente = _texto(_valor(fila, mapa, 'cliente'))
+    if cliente is None:
+        raise RenglonInvalido("cliente: vacío")
+    fecha = _fecha(_valor(fila, mapa, 'fecha'), 'fecha')
+    hora = _hora(_valor(fila, mapa, 'hora'), 'hora')
+    horas = _horas(_valor(fila, mapa, 'horas'), 'horas')
+    if horas is None:
+        raise RenglonInvalido("horas: vacío")
+
+    precio = _importe(_valor(fila, mapa, 'precio_estimado'), 'precio_estimado')
+    if precio is None:
+        precio = (LUXURY_HOUR_PRICE if tipo == TipoHabitacion.JACUZZI else BASE_HOUR_PRICE) * horas
+    estado = (_texto(_valor(fila, mapa, 'estado')) or 'COMPLETADA').upper()
+    if estado not in ESTADOS_RESERVA:
+        raise RenglonInvalido(f"estado: '{estado}' no es {', '.join(ESTADOS_RESERVA)}")
+
+    reserva = dict(
+        habitacion_id=habitacion_id, recepcionista_id=usuario_id, cliente_nombre=cliente[:100],
+        cliente_telefono=(_texto(_valor(fila, mapa, 'telefono')) or '')[:20] or None,
+        fecha_reserva=fecha, hora_reserva=hora, horas_reservadas=horas, estado=estado,
+        precio_estimado=precio, created_at=datetime.combine(fecha, hora)
+    )
+    return (habitacion_id, fecha, hora, cliente[:100]), (reserva, None)
+
+
+# --- Inserción por lotes ---
+
+def _filtro_rentas(llaves, modelo=Renta):
+    # El rango usa el índice de hora_entrada (SQLite no usa índices con IN de tuplas)
+    instantes = [llave[1] for llave in llaves]
+    return (modelo.hora_entrada.between(min(instantes), max(instantes)),
+            tuple_(modelo.habitacion_id, modelo.hora_entrada).in_(llaves))
+
+
+def _existentes(tipo, llaves):
+    """Llaves naturales del lote que ya están en la base de datos (reanudación sin duplicados)"""
+    if tipo == RENTAS:
+        # También las archivadas: un histórico viejo suele caer en el rango de rentas_archivo
+        filas = [fila for modelo in (Renta, RentaArchivo) for fila in db.session.execute(
+            select(modelo.habitacion_id, modelo.hora_entrada).where(*_filtro_rentas(llaves, modelo))
+        )]
+    else:
+        habitaciones = {llave[0] for llave in llaves}
+        fechas = [llave[1] for llave in llaves]
+        filas = db.session.execute(select(
+            Reserva.habitacion_id, Reserva.fecha_reserva, Reserva.hora_reserva, Reserva.cliente_nombre
+        ).where(Reserva.habitacion_id.in_(habitaciones), Reserva.fecha_reserva.between(min(fechas), max(fechas))))
+    return {tuple(fila) for fila in filas}
+
+
+def _insertar_lote(tipo, lote):
+    """Inserta [(llave, (renglon, acceso))] en una transacción; regresa (insertados, duplicados)"""
+    existentes = _existentes(tipo, [llave for llave, _ in lote])
+    nuevos = [(llave, datos) for llave, datos in lote if llave not in existentes]
+    if not nuevos:
+        return 0, len(lote)
+
+    try:
+        if tipo == RENTAS:
+            db.session.execute(insert(Renta.__table__), [renta for _, (renta, _) in nuevos])
+            # Ids asignados por la base de datos, por llave natural (portátil: MySQL no tiene RETURNING)
+            ids = {(h, e): i for i, h, e in db.session.execute(select(Renta.id, Renta.habitacion_id, Renta.hora_entrada).where(
+                *_filtro_rentas([llave for llave, _ in nuevos])
+            ))}
+            db.session.execute(insert(RegistroAcceso.__table__), [
+                dict(acceso, renta_id=ids[llave]) for llave, (_, acceso) in nuevos
+            ])
+            marcar_cambio(db.session.connection(), [llave[1] for llave, _ in nuevos])
+        else:
+            db.session.execute(insert(Reserva.__table__), [reserva for _, (reserva, _) in nuevos])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    if tipo == RENTAS:
+        instantes = [llave[1] for llave, _ in nuevos]
+        cache_reportes.invalidar_rango(min(instantes), max(instantes))
+    return len(nuevos), len(lote) - len(nuevos)
+
+
+# --- Avance (reanudación) y rechazos ---
+
+def _ruta_avance(ruta):
+    return f"{ruta}.importacion.json"
+
+
+def _leer_avance(ruta, tipo):
+    try:
+        with open(_ruta_avance(ruta), encoding='utf-8') as archivo:
+            avance = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+    if avance.get('tipo') != tipo or avance.get('tamano') != os.path.getsize(ruta):
+        return None  # Otro archivo u otro tipo: se empieza de cero
+    return avance
+
+
+def _guardar_avance(ruta, avance):
+    temporal = _ruta_avance(ruta) + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(avance, archivo)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, _ruta_avance(ruta))
+
+
+def _ampliar_rango(avance, instante):
+    # Cadenas ISO: se comparan en orden cronológico y el avance se guarda tal cual en JSON
+    iso = instante.isoformat(sep=' ')
+    if avance['desde'] is None or iso < avance['desde']:
+        avance['desde'] = iso
+    if avance['hasta'] is None or iso > avance['hasta']:
+        avance['hasta'] = iso
+
+
+def _usuario_importacion(username):
+    consulta = User.query.filter_by(username=username) if username else User.query.filter_by(is_admin=True)
+    usuario = consulta.order_by(User.id).first()
+    if usuario is None:
+        raise ValueError(f"No existe el usuario '{username}'." if username else "No hay un usuario administrador.")
+    return usuario.id
+
+
+def importar(ruta, tipo=RENTAS, lote=5000, usuario=None, reanudar=True, hoja=None, derivados=True, progreso=None):
+    """
+    Importa el archivo por lotes. Regresa el resumen
+    {procesadas, insertadas, duplicadas, rechazadas, rechazos, desde, hasta}.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo inválido '{tipo}': usa {' o '.join(TIPOS)}.")
+    if not os.path.exists(ruta):
+        raise ValueError(f"No existe el archivo {ruta}.")
+
+    usuario_id = _usuario_importacion(usuario)
+    habitaciones = {h.numero.strip().upper(): (h.id, h.tipo) for h in Habitacion.query.all()}
+    convertir = _convertir_renta if tipo == RENTAS else _convertir_reserva
+
+    avance = (_leer_avance(ruta, tipo) if reanudar else None) or dict(
+        tipo=tipo, tamano=os.path.getsize(ruta), procesadas=0, insertadas=0, duplicadas=0, rechazadas=0,
+        desde=None, hasta=None
+    )
+    ruta_rechazos = f"{ruta}.rechazos.csv"
+    if avance['procesadas'] == 0 and os.path.exists(ruta_rechazos):
+        os.remove(ruta_rechazos)
+
+    renglones = _renglones(ruta, hoja)
+    encabezados = next(renglones, None)
+    if encabezados is None:
+        raise ValueError("El archivo está vacío.")
+    mapa = _mapa_columnas(encabezados, tipo)
+
+    with open(ruta_rechazos, 'a', newline='', encoding='utf-8') as archivo_rechazos:
+        rechazos = csv.writer(archivo_rechazos)
+        if avance['procesadas'] == 0:
+            rechazos.writerow(['renglon', 'motivo'] + [str(e) for e in encabezados])
+
+        pendientes, rechazados_lote, pendientes_duplicados, numero = [], [], [], 0
+        llaves_lote = set()
+
+        def _confirmar():
+            insertadas, duplicadas = _insertar_lote(tipo, pendientes) if pendientes else (0, 0)
+            for fila in rechazados_lote:
+                rechazos.writerow(fila)
+            archivo_rechazos.flush()
+            avance['procesadas'] = numero
+            avance['insertadas'] += insertadas
+            avance['duplicadas'] += duplicadas + len(pendientes_duplicados)
+            avance['rechazadas'] += len(rechazados_lote)
+            _guardar_avance(ruta, avance)
+            pendientes.clear()
+            rechazados_lote.clear()
+            llaves_lote.clear()
+            pendientes_duplicados.clear()
+            if progreso:
+                progreso(avance)
+
+        for numero, fila in enumerate(renglones, start=1):
+            if numero <= avance['procesadas']:
+                continue  # Ya procesado en una ejecución anterior
+            if not any(v not in (None, '') for v in fila):
+                continue  # Renglón en blanco
+            try:
+                llave, datos = convertir(fila, mapa, habitaciones, usuario_id)
+            except RenglonInvalido as e:
+                rechazados_lote.append([numero + 1, str(e)] + ['' if v is None else v for v in fila])
+            else:
+                if llave in llaves_lote:
+                    pendientes_duplicados.append(numero)  # Repetido dentro del mismo lote
+                else:
+                    llaves_lote.add(llave)
+                    pendientes.append((llave, datos))
+                    _ampliar_rango(avance, llave[1] if tipo == RENTAS else datetime.combine(llave[1], llave[2]))
+
+            if len(pendientes) + len(rechazados_lote) >= lote:
+                _confirmar()
+        _confirmar()
+
+    if derivados and avance['insertadas']:
+        _reconstruir_derivados(tipo, avance)
+    return dict(avance, rechazos=ruta_rechazos if avance['rechazadas'] else None)
+
+
+def _reconstruir_derivados(tipo, avance):
+    """Los INSERT de Core no pasan por los eventos de sesión: actividad por hora y clientes"""
+    from clientes import backfill_clientes
+    if tipo == RENTAS and avance['desde']:
+        from actividad import reconstruir_actividad, MARGEN_ESTANCIA
+        # Las salidas caen hasta MARGEN_ESTANCIA después de la última entrada importada
+        reconstruir_actividad(datetime.fromisoformat(avance['desde']).date(),
+                              datetime.fromisoformat(avance['hasta']).date() + MARGEN_ESTANCIA + timedelta(days=1))
+    backfill_clientes()
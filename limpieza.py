@@ -0,0 +1,410 @@
+"""
+Cola de limpieza con prioridad, asignación y tiempos de atención.
+
+Cada vez que una habitación pasa a LIMPIEZA (check-out individual o masivo) se crea una
+TareaLimpieza PENDIENTE; al quedar DISPONIBLE (manual, automática o masiva) la tarea abierta
+se cierra. La creación y el cierre ocurren en la misma transacción que cambia el estado
+(evento after_flush), así que cualquier ruta queda cubierta; las actualizaciones por conjunto
+llaman a crear_tareas() / cerrar_tareas(). Una restricción única (habitacion_abierta) deja una
+sola tarea abierta por habitación y crear_tareas() ignora las que ya existen, así que dos
+rutas concurrentes no duplican tareas.
+
+Prioridad de cada tarea abierta (mayor = limpiar primero):
+- reserva próxima en esa habitación (dentro de HORIZONTE_RESERVA minutos): 100 a 200,
+  más alta mientras más cerca esté la llegada
+- demanda: llegadas pronosticadas para la próxima hora de ese tipo entre las habitaciones
+  disponibles del mismo tipo (0 a 50)
+- antigüedad: 0.1 por minuto en espera (máximo 30), para que nada se quede atrás
+
+Tiempos (en minutos) acumulados al cerrar cada tarea, sin recorrer el historial:
+- espera: de creada a iniciada; limpieza: de iniciada a terminada; rotacion: de creada a terminada
+Por cada clave ('GLOBAL', 'tipo:<tipo>', 'personal:<nombre>') y métrica se guardan n, media y
+m2 (algoritmo de Welford), de donde salen la media y la desviación estándar. Las tareas que
+cierra el barrido automático (check_auto_clean_complete, LIMPIEZA_AUTOMATICA_MINUTOS después
+del check-out) no miden una limpieza real y no se acumulan; el barrido no toca las habitaciones
+cuya tarea ya tiene responsable o está en curso (ver tareas_tomadas()).
+
+Consultar la cola no escribe: las habitaciones que quedaron en LIMPIEZA sin tarea (anteriores
+a la cola o cambiadas fuera de la app) se agregan con 'flask limpieza-pendientes' o al migrar.
+"""
+import math
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect, select, update, insert
+from sqlalchemy.orm import Session
+
+from models import db, Habitacion, Renta, Reserva, EstadoHabitacion, TareaLimpieza, EstadisticaLimpieza
+
+PENDIENTE = 'PENDIENTE'
+EN_CURSO = 'EN_CURSO'
+TERMINADA = 'TERMINADA'
+ABIERTAS = (PENDIENTE, EN_CURSO)
+
+HORIZONTE_RESERVA = 180  # minutos
+PESO_RESERVA = 100.0
+PESO_DEMANDA = 50.0
+PESO_ESPERA = 0.1
+MAX_ESPERA = 30.0
+
+GLOBAL = 'GLOBAL'
+
+# Minutos después del check-out en que el barrido libera una habitación sin limpieza registrada
+# (0 lo desactiva: solo el personal, desde la cola, la pasa a DISPONIBLE)
+BARRIDO_MINUTOS = float(os.environ.get("LIMPIEZA_AUTOMATICA_MINUTOS", 0.1))
+
+_CLAVE_AUTOMATICA = 'limpieza_cierre_automatico'
+
+
+def _minutos(inicio, fin):
+    return (fin - inicio).total_seconds() / 60.0
+
+
+def _insertar_ignorando(conexion, tabla, filas):
+    """INSERT de varias filas que omite las que chocan con una llave única (como clientes.py)"""
+    dialecto = conexion.dialect.name
+    if dialecto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as insert_dialecto
+        sentencia = insert_dialecto(tabla).prefix_with('IGNORE')
+    elif dialecto in ('sqlite', 'postgresql'):
+        if dialecto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as insert_dialecto
+        else:
+            from sqlalchemy.dialects.postgresql import insert as insert_dialecto
+        sentencia = insert_dialecto(tabla).on_conflict_do_nothing()
+    else:
+        sentencia = insert(tabla)
+    conexion.execute(sentencia, filas)
+
+
+def marcar_cierre_automatico(session):
+    """Las tareas que se cierren en esta transacción las cerró el barrido: no cuentan en estadísticas"""
+    session.info[_CLAVE_AUTOMATICA] = True
+
+
+def tareas_tomadas():
+    """SELECT de las habitaciones cuya tarea abierta ya tiene responsable o está en curso"""
+    return select(TareaLimpieza.habitacion_id).where(
+        TareaLimpieza.estado.in_(ABIERTAS),
+        (TareaLimpieza.asignada_a.isnot(None)) | (TareaLimpieza.estado == EN_CURSO)
+    )
+
+
+# --- Creación y cierre (misma transacción que el cambio de estado) ---
+
+def crear_tareas(session, habitaciones, ahora=None):
+    """
+    Inserta una tarea PENDIENTE por cada (habitacion_id, renta_id) en la transacción de
+    'session'; las habitaciones que ya tienen una tarea abierta se omiten.
+    """
+    if not habitaciones:
+        return
+    ahora = ahora or datetime.now()
+    _insertar_ignorando(session.connection(), TareaLimpieza.__table__, [
+        {'habitacion_id': habitacion_id, 'renta_id': renta_id, 'estado': PENDIENTE, 'creada_at': ahora,
+         'habitacion_abierta': habitacion_id, 'cierre_automatico': False}
+        for habitacion_id, renta_id in habitaciones
+    ])
+
+
+def cerrar_tareas(session, habitacion_ids, ahora=None, automatico=None):
+    """
+    Cierra las tareas abiertas de esas habitaciones y acumula sus tiempos en las estadísticas,
+    salvo si las cierra el barrido automático (ver marcar_cierre_automatico()).
+    """
+    if not habitacion_ids:
+        return
+    ahora = ahora or datetime.now()
+    if automatico is None:
+        automatico = bool(session.info.get(_CLAVE_AUTOMATICA))
+    conexion = session.connection()
+    tareas = TareaLimpieza.__table__
+
+    abiertas = conexion.execute(
+        select(tareas.c.id, tareas.c.habitacion_id, tareas.c.asignada_a, tareas.c.creada_at,
+               tareas.c.iniciada_at, Habitacion.__table__.c.tipo)
+        .join(Habitacion.__table__, Habitacion.__table__.c.id == tareas.c.habitacion_id)
+        .where(tareas.c.habitacion_id.in_(list(habitacion_ids)), tareas.c.estado.in_(ABIERTAS))
+    ).all()
+    if not abiertas:
+        return
+
+    conexion.execute(
+        update(tareas).where(tareas.c.id.in_([t.id for t in abiertas]))
+        .values(estado=TERMINADA, terminada_at=ahora, habitacion_abierta=None, cierre_automatico=automatico)
+    )
+    if automatico:
+        return
+
+    muestras = []  # (clave, metrica, minutos)
+    for tarea in abiertas:
+        claves = [GLOBAL, f'tipo:{tarea.tipo.value}']
+        if tarea.asignada_a:
+            claves.append(f'personal:{tarea.asignada_a}')
+        metricas = {'rotacion': _minutos(tarea.creada_at, ahora)}
+        if tarea.iniciada_at:
+            metricas['espera'] = _minutos(tarea.creada_at, tarea.iniciada_at)
+            metricas['limpieza'] = _minutos(tarea.iniciada_at, ahora)
+        muestras += [(clave, metrica, valor) for clave in claves for metrica, valor in metricas.items()]
+
+    _acumular(conexion, muestras)
+
+
+def _acumular(conexion, muestras):
+    """
+    Actualización de Welford de (n, media, m2, mínimo, máximo) para cada (clave, métrica).
+    Primero se aseguran las filas con un INSERT que ignora las existentes y luego se bloquean
+    con SELECT ... FOR UPDATE: dos cierres concurrentes de una clave nueva se serializan en el
+    bloqueo en lugar de chocar en el INSERT (un IntegrityError aquí desharía el check-out).
+    """
+    tabla = EstadisticaLimpieza.__table__
+    llaves = sorted({(clave, metrica) for clave, metrica, _ in muestras})
+
+    _insertar_ignorando(conexion, tabla, [
+        {'clave': clave, 'metrica': metrica, 'n': 0, 'media': 0.0, 'm2': 0.0} for clave, metrica in llaves
+    ])
+
+    actuales = {}
+    for clave, metrica in llaves:
+        fila = conexion.execute(
+            select(tabla.c.n, tabla.c.media, tabla.c.m2, tabla.c.minimo, tabla.c.maximo)
+            .where(tabla.c.clave == clave, tabla.c.metrica == metrica).with_for_update()
+        ).one()
+        actuales[(clave, metrica)] = [fila.n, fila.media, fila.m2, fila.minimo, fila.maximo]
+
+    for clave, metrica, valor in muestras:
+        acumulado = actuales[(clave, metrica)]
+        acumulado[0] += 1
+        delta = valor - acumulado[1]
+        acumulado[1] += delta / acumulado[0]
+        acumulado[2] += delta * (valor - acumulado[1])
+        acumulado[3] = valor if acumulado[3] is None else min(acumulado[3], valor)
+        acumulado[4] = valor if acumulado[4] is None else max(acumulado[4], valor)
+
+    for (clave, metrica), (n, media, m2, minimo, maximo) in actuales.items():
+        conexion.execute(update(tabla).where(tabla.c.clave == clave, tabla.c.metrica == metrica)
+                         .values(n=n, media=media, m2=m2, minimo=minimo, maximo=maximo))
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_transiciones(session, flush_context):
+    nuevas = []
+    terminadas = []
+
+    for obj in session.dirty:
+        if not isinstance(obj, Habitacion):
+            continue
+        historial = inspect(obj).attrs.estado.history
+        if not historial.added:
+            continue
+        anterior = historial.deleted[0] if historial.deleted else None
+        nuevo = historial.added[0]
+        if nuevo == EstadoHabitacion.LIMPIEZA and anterior != EstadoHabitacion.LIMPIEZA:
+            nuevas.append(obj.id)
+        elif anterior == EstadoHabitacion.LIMPIEZA and nuevo != EstadoHabitacion.LIMPIEZA:
+            terminadas.append(obj.id)
+
+    if terminadas:
+        cerrar_tareas(session, terminadas)
+    if nuevas:
+        # La renta pudo cerrarse en un flush anterior (autoflush al consultar la habitación)
+        rentas_cerradas = {}
+        for obj in session.identity_map.values():
+            if isinstance(obj, Renta) and obj.habitacion_id in nuevas and obj.estado == 'CERRADA' \
+                    and obj.hora_salida_real is not None:
+                previa = rentas_cerradas.get(obj.habitacion_id)
+                if previa is None or obj.hora_salida_real > previa.hora_salida_real:
+                    rentas_cerradas[obj.habitacion_id] = obj
+        crear_tareas(session, [(habitacion_id, rentas_cerradas[habitacion_id].id if habitacion_id in rentas_cerradas else None)
+                               for habitacion_id in nuevas])
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_rollback')
+def _limpiar_marca(session):
+    session.info.pop(_CLAVE_AUTOMATICA, None)
+
+
+def crear_tareas_faltantes(ahora=None):
+    """
+    Crea la tarea de las habitaciones en LIMPIEZA que no tienen una abierta (anteriores a la
+    cola o cambiadas fuera de la app). Regresa cuántas se crearon; la restricción única
+    hace que repetirlo, o correrlo junto a un check-out, no duplique tareas.
+    """
+    sin_tarea = [habitacion_id for habitacion_id, in db.session.query(Habitacion.id).filter(
+        Habitacion.estado == EstadoHabitacion.LIMPIEZA,
+        Habitacion.id.notin_(select(TareaLimpieza.habitacion_id).where(TareaLimpieza.estado.in_(ABIERTAS)))
+    )]
+    crear_tareas(db.session, [(habitacion_id, None) for habitacion_id in sin_tarea], ahora)
+    db.session.commit()
+    return len(sin_tarea)
+
+
+# --- Cola priorizada ---
+
+def _reservas_proximas(habitacion_ids, ahora):
+    """{habitacion_id: minutos hasta la reserva más cercana} dentro del horizonte"""
+    limite = ahora + timedelta(minutes=HORIZONTE_RESERVA)
+    reservas = db.session.query(Reserva.habitacion_id, Reserva.fecha_reserva, Reserva.hora_reserva).filter(
+        Reserva.habitacion_id.in_(habitacion_ids),
+        Reserva.estado.in_(('PENDIENTE', 'CONFIRMADA')),
+        Reserva.fecha_reserva.between(ahora.date() - timedelta(days=1), limite.date())
+    ).all()
+
+    proximas = {}
+    for habitacion_id, fecha, hora in reservas:
+        llegada = datetime.combine(fecha, hora)
+        # Llegadas vencidas de hasta una hora siguen contando como inmediatas
+        if ahora - timedelta(hours=1) <= llegada <= limite:
+            minutos = max(_minutos(ahora, llegada), 0.0)
+            proximas[habitacion_id] = min(minutos, proximas.get(habitacion_id, minutos))
+    return proximas
+
+
+def _escasez_por_tipo(ahora):
+    """{tipo: llegadas esperadas la próxima hora / (habitaciones disponibles de ese tipo + 1)}"""
+    from cache_habitaciones import cache_habitaciones
+    from pronostico import parametros_pronostico, hora_semana
+
+    niveles, _ = parametros_pronostico.obtener()
+    if not niveles:
+        return {}
+
+    disponibles = {}
+    for habitacion in cache_habitaciones.listar(estado=EstadoHabitacion.DISPONIBLE, activa=True):
+        disponibles[habitacion.tipo] = disponibles.get(habitacion.tipo, 0) + 1
+
+    indice = hora_semana(ahora)
+    return {tipo: serie[indice] / (disponibles.get(tipo, 0) + 1) for tipo, serie in niveles.items()}
+
+
+def cola_limpieza(ahora=None):
+    """Tareas abiertas ordenadas por prioridad (ver el encabezado del módulo); solo lectura"""
+    from cache_habitaciones import cache_habitaciones
+
+    ahora = ahora or datetime.now()
+    tareas = TareaLimpieza.query.filter(TareaLimpieza.estado.in_(ABIERTAS)).all()
+    if not tareas:
+        return []
+
+    reservas = _reservas_proximas({t.habitacion_id for t in tareas}, ahora)
+    escasez = _escasez_por_tipo(ahora)
+
+    cola = []
+    for tarea in tareas:
+        habitacion = cache_habitaciones.obtener(tarea.habitacion_id) or Habitacion.query.get(tarea.habitacion_id)
+        minutos_espera = _minutos(tarea.creada_at, ahora)
+        prioridad = min(minutos_espera * PESO_ESPERA, MAX_ESPERA)
+        motivos = []
+
+        if tarea.habitacion_id in reservas:
+            minutos = reservas[tarea.habitacion_id]
+            prioridad += PESO_RESERVA * (2 - minutos / HORIZONTE_RESERVA)
+            motivos.append(f'Reserva en {int(minutos)} min')
+
+        demanda = min(escasez.get(habitacion.tipo, 0.0), 1.0)
+        if demanda > 0:
+            prioridad += PESO_DEMANDA * demanda
+            if demanda >= 0.5:
+                motivos.append(f'Alta demanda de {habitacion.tipo.value}')
+
+        cola.append({
+            'tarea_id': tarea.id,
+            'habitacion_id': tarea.habitacion_id,
+            'numero': habitacion.numero,
+            'tipo': habitacion.tipo.value,
+            'estado': tarea.estado,
+            'asignada_a': tarea.asignada_a,
+            'minutos_en_espera': int(minutos_espera),
+            'prioridad': round(prioridad, 1),
+            'motivos': motivos
+        })
+
+    cola.sort(key=lambda t: (t['estado'] != PENDIENTE, -t['prioridad']))
+    return cola
+
+
+# --- Asignación y avance (teléfonos del personal) ---
+
+def asignar(tarea_id, personal):
+    """Asigna una tarea abierta. Regresa la tarea o None si no existe o ya terminó."""
+    tarea = TareaLimpieza.query.get(tarea_id)
+    if tarea is None or tarea.estado not in ABIERTAS:
+        return None
+    tarea.asignada_a = personal
+    tarea.asignada_at = datetime.now()
+    db.session.commit()
+    return tarea
+
+
+def tomar_siguiente(personal):
+    """
+    Asigna e inicia la tarea PENDIENTE sin asignar de mayor prioridad. El UPDATE condicional
+    evita que dos personas tomen la misma habitación. Regresa el id de la tarea o None.
+    """
+    for candidata in cola_limpieza():
+        if candidata['estado'] != PENDIENTE or candidata['asignada_a']:
+            continue
+        ahora = datetime.now()
+        resultado = db.session.execute(
+            update(TareaLimpieza)
+            .where(TareaLimpieza.id == candidata['tarea_id'], TareaLimpieza.estado == PENDIENTE,
+                   TareaLimpieza.asignada_a.is_(None))
+            .values(asignada_a=personal, asignada_at=ahora, iniciada_at=ahora, estado=EN_CURSO),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+        if resultado.rowcount:
+            return candidata['tarea_id']
+    return None
+
+
+def iniciar(tarea_id, personal=None):
+    """Marca el inicio de la limpieza (la asigna a 'personal' si aún no tenía responsable)"""
+    tarea = TareaLimpieza.query.get(tarea_id)
+    if tarea is None or tarea.estado != PENDIENTE:
+        return None
+    ahora = datetime.now()
+    if personal and not tarea.asignada_a:
+        tarea.asignada_a = personal
+        tarea.asignada_at = ahora
+    tarea.estado = EN_CURSO
+    tarea.iniciada_at = ahora
+    db.session.commit()
+    return tarea
+
+
+def terminar(tarea_id):
+    """
+    Marca la habitación como DISPONIBLE; el evento de sesión cierra la tarea y acumula los
+    tiempos, igual que con clean_complete. Regresa la habitación o None si la tarea no está abierta.
+    """
+    tarea = TareaLimpieza.query.get(tarea_id)
+    if tarea is None or tarea.estado not in ABIERTAS:
+        return None
+    habitacion = Habitacion.query.get(tarea.habitacion_id)
+    if habitacion.estado != EstadoHabitacion.LIMPIEZA:
+        return None
+    habitacion.estado = EstadoHabitacion.DISPONIBLE
+    db.session.commit()
+    return habitacion
+
+
+# --- Estadísticas ---
+
+def estadisticas(prefijo=None):
+    """{clave: {metrica: {n, media, desviacion, minimo, maximo}}} en minutos"""
+    consulta = EstadisticaLimpieza.query
+    if prefijo:
+        consulta = consulta.filter(EstadisticaLimpieza.clave.startswith(prefijo))
+
+    resultado = {}
+    for fila in consulta.order_by(EstadisticaLimpieza.clave, EstadisticaLimpieza.metrica).all():
+        resultado.setdefault(fila.clave, {})[fila.metrica] = {
+            'n': fila.n,
+            'media': round(fila.media, 1),
+            'desviacion': round(math.sqrt(fila.m2 / (fila.n - 1)), 1) if fila.n > 1 else 0.0,
+            'minimo': round(fila.minimo, 1) if fila.minimo is not None else None,
+            'maximo': round(fila.maximo, 1) if fila.maximo is not None else None
+        }
+    return resultado
@@ -0,0 +1,238 @@
+"""
+Ventanas de mantenimiento por habitación (inicio, fin, motivo).
+
+- Disponibilidad: conflicto() busca con el índice (habitacion_id, inicio, fin) una ventana
+  vigente que se traslape con el intervalo pedido; lo usan el check-in, las reservas y la
+  conversión de reserva a check-in. Al programar una ventana se rechaza si se traslapa con
+  otra ventana o con una reserva pendiente/confirmada.
+- Transiciones: en el inicio de la ventana la habitación pasa a MANTENIMIENTO (en cuanto esté
+  DISPONIBLE: una renta en curso o una limpieza pendiente no se interrumpen y se vuelve a
+  intentar en cada revisión) y al terminar regresa a DISPONIBLE. Los cambios pasan por el ORM, así que la caché de habitaciones y la
+  bitácora los registran como cualquier otro cambio de estado.
+- Programador: el siguiente límite (inicio o fin más próximo) se guarda en memoria y las
+  transiciones se aplican en la primera petición del dashboard que llega después de él
+  (como la autolimpieza); el límite se relee cada MANTENIMIENTO_TTL segundos para ver las
+  ventanas creadas por otros workers. Para instalaciones sin tráfico constante:
+
+      flask aplicar-mantenimiento    (cron cada minuto)
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm.exc import StaleDataError
+
+from models import db, Habitacion, Reserva, EstadoHabitacion, VentanaMantenimiento
+
+PROGRAMADA = 'PROGRAMADA'
+EN_CURSO = 'EN_CURSO'
+TERMINADA = 'TERMINADA'
+CANCELADA = 'CANCELADA'
+VIGENTES = (PROGRAMADA, EN_CURSO)
+
+TTL_REVISION = float(os.environ.get("MANTENIMIENTO_TTL", 60))
+
+
+# --- Disponibilidad ---
+
+def conflicto(habitacion_id, inicio, fin):
+    """Primera ventana vigente de la habitación que se traslapa con [inicio, fin), o None"""
+    return VentanaMantenimiento.query.filter(
+        VentanaMantenimiento.habitacion_id == habitacion_id,
+        VentanaMantenimiento.inicio < fin,
+        VentanaMantenimiento.fin > inicio,
+        VentanaMantenimiento.estado.in_(VIGENTES)
+    ).order_by(VentanaMantenimiento.inicio).first()
+
+
+def mensaje_conflicto(ventana):
+    return (f"La habitación tiene mantenimiento programado del {ventana.inicio.strftime('%d/%m %H:%M')} "
+            f"al {ventana.fin.strftime('%d/%m %H:%M')} ({ventana.motivo}).")
+
+
+def _reservas_traslapadas(habitacion_id, inicio, fin):
+    reservas = Reserva.query.filter(
+        Reserva.habitacion_id == habitacion_id,
+        Reserva.estado.in_(('PENDIENTE', 'CONFIRMADA')),
+        Reserva.fecha_reserva.between(inicio.date() - timedelta(days=1), fin.date())
+    ).all()
+    traslapadas = []
+    for reserva in reservas:
+        llegada = datetime.combine(reserva.fecha_reserva, reserva.hora_reserva)
+        if llegada < fin and llegada + timedelta(hours=reserva.horas_reservadas) > inicio:
+            traslapadas.append(reserva)
+    return traslapadas
+
+
+# --- Alta y cancelación ---
+
+def programar(habitacion_id, inicio, fin, motivo, usuario_id=None):
+    """Crea una ventana. ValueError si los datos son inválidos o hay traslapes."""
+    if not motivo or not motivo.strip():
+        raise ValueError("El motivo es obligatorio.")
+    if fin <= inicio:
+        raise ValueError("El fin de la ventana debe ser posterior al inicio.")
+    if fin <= datetime.now():
+        raise ValueError("La ventana ya terminó.")
+    if Habitacion.query.get(habitacion_id) is None:
+        raise ValueError("La habitación no existe.")
+
+    existente = conflicto(habitacion_id, inicio, fin)
+    if existente:
+        raise ValueError(f"Se traslapa con otra ventana: {mensaje_conflicto(existente)}")
+    reservas = _reservas_traslapadas(habitacion_id, inicio, fin)
+    if reservas:
+        raise ValueError("Se traslapa con reservas de: " + ', '.join(r.cliente_nombre for r in reservas))
+
+    ventana = VentanaMantenimiento(habitacion_id=habitacion_id, inicio=inicio, fin=fin,
+                                   motivo=motivo.strip(), estado=PROGRAMADA, creada_por=usuario_id)
+    db.session.add(ventana)
+    db.session.commit()
+    programador_mantenimiento.invalidar()
+    # Una ventana que ya empezó se aplica de inmediato
+    programador_mantenimiento.revisar()
+    return ventana
+
+
+def cancelar(ventana_id):
+    """Cancela una ventana vigente; si estaba en curso la habitación regresa a DISPONIBLE"""
+    ventana = VentanaMantenimiento.query.get(ventana_id)
+    if ventana is None or ventana.estado not in VIGENTES:
+        return None
+
+    if ventana.estado == EN_CURSO:
+        ventana.terminada_at = datetime.now()
+        if ventana.habitacion.estado == EstadoHabitacion.MANTENIMIENTO:
+            ventana.habitacion.estado = EstadoHabitacion.DISPONIBLE
+    ventana.estado = CANCELADA
+    db.session.commit()
+    programador_mantenimiento.invalidar()
+    return ventana
+
+
+# --- Transiciones en los límites de las ventanas ---
+
+def aplicar_ventanas(ahora=None):
+    """Aplica las transiciones pendientes. Regresa (iniciadas, terminadas)."""
+    ahora = ahora or datetime.now()
+    iniciadas = terminadas = 0
+
+    # Primero los finales: una ventana puede empezar justo cuando termina la anterior
+    for ventana in VentanaMantenimiento.query.filter(
+        VentanaMantenimiento.estado == EN_CURSO, VentanaMantenimiento.fin <= ahora
+    ).all():
+        if ventana.habitacion.estado == EstadoHabitacion.MANTENIMIENTO:
+            ventana.habitacion.estado = EstadoHabitacion.DISPONIBLE
+        ventana.estado = TERMINADA
+        ventana.terminada_at = ahora
+        terminadas += 1
+
+    for ventana in VentanaMantenimiento.query.filter(
+        VentanaMantenimiento.estado == PROGRAMADA, VentanaMantenimiento.inicio <= ahora
+    ).order_by(VentanaMantenimiento.inicio).all():
+        if ventana.fin <= ahora:
+            # Nunca pudo iniciar (la habitación no se desocupó a tiempo)
+            ventana.estado = TERMINADA
+            continue
+        if ventana.habitacion.estado == EstadoHabitacion.DISPONIBLE:
+            ventana.habitacion.estado = EstadoHabitacion.MANTENIMIENTO
+            ventana.estado = EN_CURSO
+            ventana.iniciada_at = ahora
+            iniciadas += 1
+
+    db.session.commit()
+    return iniciadas, terminadas
+
+
+def _proximo_limite(ahora):
+    """Instante del siguiente inicio o fin de ventana (None si no hay ventanas vigentes)"""
+    proximo_inicio = db.session.query(func.min(VentanaMantenimiento.inicio)).filter(
+        VentanaMantenimiento.estado == PROGRAMADA, VentanaMantenimiento.inicio > ahora
+    ).scalar()
+    proximo_fin = db.session.query(func.min(VentanaMantenimiento.fin)).filter(
+        VentanaMantenimiento.estado.in_(VIGENTES)
+    ).scalar()
+    limites = [limite for limite in (proximo_inicio, proximo_fin) if limite is not None]
+    return min(limites) if limites else None
+
+
+class ProgramadorMantenimiento:
+    """Aplica las transiciones solo cuando se alcanza el siguiente límite conocido"""
+
+    def __init__(self, ttl=TTL_REVISION, reloj=datetime.now):
+        self.ttl = ttl
+        self.reloj = reloj
+        self._proximo = None
+        self._revisado_en = None
+        self._lock = threading.Lock()
+
+    def invalidar(self):
+        with self._lock:
+            self._revisado_en = None
+
+    def revisar(self):
+        """Llamada barata en cada carga del dashboard. Regresa (iniciadas, terminadas)."""
+        ahora = self.reloj()
+        vencido = self._revisado_en is None or time.monotonic() - self._revisado_en > self.ttl
+        if not vencido and (self._proximo is None or ahora < self._proximo):
+            return 0, 0
+
+        try:
+            resultado = aplicar_ventanas(ahora)
+            proximo = _proximo_limite(ahora)
+        except StaleDataError:
+            # Otro worker aplicó la misma transición; se reintenta en la siguiente revisión
+            db.session.rollback()
+            return 0, 0
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error al aplicar ventanas de mantenimiento: {e}")
+            return 0, 0
+
+        with self._lock:
+            self._proximo = proximo
+            self._revisado_en = time.monotonic()
+        return resultado
+
+
+programador_mantenimiento = ProgramadorMantenimiento()
+
+
+# --- Consultas ---
+
+def serializar(ventana):
+    return {
+        'id': ventana.id,
+        'habitacion_id': ventana.habitacion_id,
+        'numero': ventana.habitacion.numero,
+        'inicio': ventana.inicio.strftime('%Y-%m-%d %H:%M'),
+        'fin': ventana.fin.strftime('%Y-%m-%d %H:%M'),
+        'motivo': ventana.motivo,
+        'estado': ventana.estado
+    }
+
+
+def listar(habitacion_id=None, incluir_pasadas=False):
+    consulta = VentanaMantenimiento.query
+    if habitacion_id is not None:
+        consulta = consulta.filter(VentanaMantenimiento.habitacion_id == habitacion_id)
+    if not incluir_pasadas:
+        consulta = consulta.filter(VentanaMantenimiento.estado.in_(VIGENTES))
+    return [serializar(v) for v in consulta.order_by(VentanaMantenimiento.inicio).limit(500).all()]
+
+
+def intervalos_mantenimiento(inicio, fin):
+    """
+    [(inicio, fin)] en que las habitaciones estuvieron realmente en MANTENIMIENTO dentro de
+    [inicio, fin) (las ventanas en curso cuentan hasta ahora). Lo usa la analítica de ocupación.
+    """
+    ahora = datetime.now()
+    ventanas = db.session.query(VentanaMantenimiento.iniciada_at, VentanaMantenimiento.terminada_at).filter(
+        VentanaMantenimiento.iniciada_at.isnot(None),
+        VentanaMantenimiento.iniciada_at < fin,
+        func.coalesce(VentanaMantenimiento.terminada_at, ahora) > inicio
+    ).all()
+    return [(max(desde, inicio), min(hasta or ahora, fin)) for desde, hasta in ventanas
+            if min(hasta or ahora, fin) > max(desde, inicio)]
@@ -0,0 +1,119 @@
+"""
+Migración de una base de datos existente al esquema actual de models.py.
+
+db.create_all() solo crea las tablas que faltan; las columnas e índices nuevos de tablas
+que ya existían (habitaciones.version, habitaciones.sucursal_id, rentas.version_cambio,
+rentas.cliente_id, reservas.cliente_id, índices de fecha, ...) se agregan aquí:
+
+    flask migrar             (aplica los cambios)
+    flask migrar --solo-sql  (imprime el script ALTER sin ejecutarlo, para revisarlo o aplicarlo a mano)
+
+Se compara el esquema real (inspector de SQLAlchemy) con los modelos, así que es idempotente:
+volver a ejecutarlo no hace nada. Las columnas NOT NULL se agregan con su valor por defecto
+del modelo (DEFAULT) para llenar los renglones existentes. Los datos que un índice único nuevo
+necesita se ajustan justo antes de crearlo (AJUSTES). Después de migrar conviene
+ejecutar 'flask backfill-clientes' (cliente_id de rentas y reservas previas) y
+'flask limpieza-pendientes' (tareas de las habitaciones que ya estaban en LIMPIEZA).
+"""
+from sqlalchemy import inspect, literal
+from sqlalchemy.schema import CreateIndex, CreateTable, UniqueConstraint
+
+from models import db
+
+# Índice -> sentencias que se ejecutan justo antes de crearlo
+AJUSTES = {
+    # Una sola tarea abierta por habitación: se conserva la más antigua y las demás se cierran
+    # (como cierre automático, para no contarlas en las estadísticas)
+    'uq_tarea_abierta': [
+        "UPDATE tareas_limpieza SET estado = 'TERMINADA', terminada_at = CURRENT_TIMESTAMP, cierre_automatico = TRUE "
+        "WHERE estado IN ('PENDIENTE', 'EN_CURSO') AND id NOT IN (SELECT id FROM ("
+        "SELECT MIN(id) AS id FROM tareas_limpieza WHERE estado IN ('PENDIENTE', 'EN_CURSO') "
+        "GROUP BY habitacion_id) AS primeras)",
+        "UPDATE tareas_limpieza SET habitacion_abierta = habitacion_id WHERE estado IN ('PENDIENTE', 'EN_CURSO')",
+        # Habitaciones en LIMPIEZA sin tarea (de antes de la cola): la cola ya no las crea al consultarla
+        "INSERT INTO tareas_limpieza (habitacion_id, estado, creada_at, habitacion_abierta, cierre_automatico) "
+        "SELECT id, 'PENDIENTE', CURRENT_TIMESTAMP, id, FALSE FROM habitaciones WHERE estado = 'LIMPIEZA' "
+        "AND id NOT IN (SELECT habitacion_id FROM tareas_limpieza WHERE estado IN ('PENDIENTE', 'EN_CURSO'))",
+    ],
+}
+
+
+def _definicion_columna(columna, dialecto):
+    """'nombre TIPO [DEFAULT x] [NOT NULL]' para ALTER TABLE ... ADD COLUMN"""
+    partes = [dialecto.identifier_preparer.quote(columna.name), columna.type.compile(dialect=dialecto)]
+    por_defecto = columna.default.arg if columna.default is not None and columna.default.is_scalar else None
+    if por_defecto is not None:
+        valor = literal(por_defecto, columna.type).compile(dialect=dialecto, compile_kwargs={'literal_binds': True})
+        partes.append(f"DEFAULT {valor}")
+    # Sin valor por defecto no hay con qué llenar los renglones existentes: queda NULL-able
+    if not columna.nullable and por_defecto is not None:
+        partes.append("NOT NULL")
+    return ' '.join(partes)
+
+
+def _llave_foranea(tabla, columna, dialecto):
+    # SQLite no agrega restricciones con ALTER TABLE; la columna funciona igual sin ella
+    if dialecto.name == 'sqlite':
+        return []
+    preparar = dialecto.identifier_preparer
+    return [f"ALTER TABLE {preparar.format_table(tabla)} ADD FOREIGN KEY ({preparar.quote(columna.name)}) "
+            f"REFERENCES {preparar.format_table(fk.column.table)} ({preparar.quote(fk.column.name)})"
+            for fk in columna.foreign_keys]
+
+
+def _indices_faltantes(tabla, inspector, dialecto):
+    preparar = dialecto.identifier_preparer
+    existentes = {i['name'] for i in inspector.get_indexes(tabla.name)}
+    existentes |= {u['name'] for u in inspector.get_unique_constraints(tabla.name)}
+    indices = {indice.name: str(CreateIndex(indice).compile(dialect=dialecto)) for indice in tabla.indexes}
+    # Las restricciones únicas nombradas se agregan como índice único (equivalente en MySQL y SQLite)
+    for restriccion in tabla.constraints:
+        if isinstance(restriccion, UniqueConstraint) and restriccion.name:
+            columnas = ', '.join(preparar.quote(c.name) for c in restriccion.columns)
+            indices[restriccion.name] = (f"CREATE UNIQUE INDEX {preparar.quote(restriccion.name)} "
+                                         f"ON {preparar.format_table(tabla)} ({columnas})")
+
+    sentencias = []
+    for nombre, sentencia in indices.items():
+        if nombre not in existentes:
+            sentencias += AJUSTES.get(nombre, [])
+            sentencias.append(sentencia)
+    return sentencias
+
+
+def sentencias_pendientes(engine):
+    """Lista de sentencias SQL que llevan la base de datos al esquema de los modelos"""
+    inspector = inspect(engine)
+    dialecto = engine.dialect
+    tablas_existentes = set(inspector.get_table_names())
+    sentencias = []
+
+    for tabla in db.metadata.sorted_tables:
+        if tabla.name not in tablas_existentes:
+            sentencias.append(str(CreateTable(tabla).compile(dialect=dialecto)).strip())
+            sentencias += [str(CreateIndex(indice).compile(dialect=dialecto)) for indice in tabla.indexes]
+            continue
+
+        columnas = {c['name'] for c in inspector.get_columns(tabla.name)}
+        for columna in tabla.columns:
+            if columna.name in columnas:
+                continue
+            sentencias.append(f"ALTER TABLE {dialecto.identifier_preparer.format_table(tabla)} "
+                              f"ADD COLUMN {_definicion_columna(columna, dialecto)}")
+            sentencias += _llave_foranea(tabla, columna, dialecto)
+        sentencias += _indices_faltantes(tabla, inspector, dialecto)
+
+    return sentencias
+
+
+def migrar(engine, solo_sql=False):
+    """
+    Aplica (o solo regresa, con solo_sql) las sentencias pendientes en una transacción. En MySQL
+    cada ALTER se confirma por sí solo; si algo falla a la mitad basta con volver a ejecutarlo.
+    """
+    sentencias = sentencias_pendientes(engine)
+    if sentencias and not solo_sql:
+        with engine.begin() as conexion:
+            for sentencia in sentencias:
+                conexion.exec_driver_sql(sentencia)
+    return sentencias
@@ -4,7 +4,10 @@ from datetime import datetime, date, time
 from sqlalchemy.orm import relationship, backref
 from werkzeug.security import generate_password_hash, check_password_hash
 
-db = SQLAlchemy()
+from replica import SesionEnrutada
+
+# SesionEnrutada envía los SELECT de los reportes a la réplica de lectura si está configurada
+db = SQLAlchemy(session_options={'class_': SesionEnrutada})
 
 # --- Constantes de Precios (Temporal - luego serán configurables) ---
 BASE_HOUR_PRICE = 150.00
@@ -97,12 +100,18 @@ class Habitacion(db.Model):
     caracteristicas = db.Column(db.Text, nullable=True)  # "Jacuzzi, TV, Estacionamiento"
     activa = db.Column(db.Boolean, default=True)
     
-    # Para futura implementación multisucursal:
-    # sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursales.id'))
+    # Multisucursal: NULL mientras solo exista una sucursal
+    sucursal_id = db.Column(db.Integer, db.ForeignKey('sucursales.id'), nullable=True, index=True)
+
+    # Contador de versión (lo incrementa SQLAlchemy en cada UPDATE); lo usa la caché
+    # de habitaciones para detectar cambios hechos por otros procesos
+    version = db.Column(db.Integer, nullable=False, default=1)
 
     rentas = relationship("Renta", backref="habitacion", lazy=True)
     reservas = relationship("Reserva", backref="habitacion", lazy=True)
 
+    __mapper_args__ = {'version_id_col': version}
+
     def __repr__(self):
         return f'<Habitacion {self.numero} ({self.estado.value})>'
     
@@ -121,7 +130,7 @@ class Renta(db.Model):
     cliente_nombre = db.Column(db.String(100), nullable=True) 
     
     horas_reservadas = db.Column(db.Integer, nullable=False)
-    hora_entrada = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    hora_entrada = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
     hora_salida_estimada = db.Column(db.DateTime, nullable=False)
     hora_salida_real = db.Column(db.DateTime, nullable=True) 
 
@@ -141,6 +150,12 @@ class Renta(db.Model):
     # Relación con reserva (si aplica)
     reserva_id = db.Column(db.Integer, db.ForeignKey('reservas.id'), nullable=True)
 
+    # Valor del contador de cambios de ocupación en la última modificación (ver sincronizacion.py)
+    version_cambio = db.Column(db.Integer, nullable=True, index=True)
+
+    # Cliente deduplicado (ver clientes.py); cliente_nombre se conserva como se capturó
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=True, index=True)
+
     accesos = relationship("RegistroAcceso", backref="renta", lazy=True)
     reserva = relationship("Reserva", backref="renta", uselist=False)
     
@@ -158,6 +173,7 @@ class Reserva(db.Model):
     
     cliente_nombre = db.Column(db.String(100), nullable=False)
     cliente_telefono = db.Column(db.String(20), nullable=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=True, index=True)
     
     fecha_reserva = db.Column(db.Date, nullable=False)
     hora_reserva = db.Column(db.Time, nullable=False)
@@ -185,7 +201,7 @@ class RegistroAcceso(db.Model):
     
     modo_ingreso = db.Column(db.Enum(ModoIngreso), nullable=False)
     placas = db.Column(db.String(10), nullable=True)
-    hora_ingreso = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    hora_ingreso = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
     hora_salida = db.Column(db.DateTime, nullable=True)
 
     # NUEVO: Campos para futura integración con cámaras LPR
@@ -207,6 +223,324 @@ class Sucursal(db.Model):
     telefono = db.Column(db.String(20), nullable=True)
     activa = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
+
+    habitaciones = relationship("Habitacion", backref="sucursal", lazy=True)
     
     def __repr__(self):
-        return f'<Sucursal {self.nombre}>'
\ No newline at end of file
+        return f'<Sucursal {self.nombre}>'
+
+# --- Tablas de Archivo (datos fríos) ---
+# Copia de las columnas de 'rentas' y 'registros_acceso' para rentas CERRADAS antiguas.
+# Sin llaves foráneas para poder mover y depurar lotes sin bloquear las tablas activas.
+# La llave primaria incluye la columna de fecha porque en MySQL estas tablas se particionan
+# por RANGE mensual (ver particiones.py) y toda llave única debe contener la columna de partición.
+
+class RentaArchivo(db.Model):
+    __tablename__ = 'rentas_archivo'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    habitacion_id = db.Column(db.Integer, nullable=False, index=True)
+    recepcionista_id = db.Column(db.Integer, nullable=False)
+
+    cliente_nombre = db.Column(db.String(100), nullable=True)
+
+    horas_reservadas = db.Column(db.Integer, nullable=False)
+    hora_entrada = db.Column(db.DateTime, primary_key=True, index=True)
+    hora_salida_estimada = db.Column(db.DateTime, nullable=False)
+    hora_salida_real = db.Column(db.DateTime, nullable=True)
+
+    precio_hora = db.Column(db.Float, nullable=False)
+    pago_horas = db.Column(db.Float, nullable=False)
+    pago_extra = db.Column(db.Float, nullable=True, default=0.0)
+    pago_final = db.Column(db.Float, nullable=True)
+
+    estado = db.Column(db.String(20), nullable=False)
+
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+
+    reserva_id = db.Column(db.Integer, nullable=True)
+
+    version_cambio = db.Column(db.Integer, nullable=True)
+
+    cliente_id = db.Column(db.Integer, nullable=True, index=True)
+
+    archivada_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f'<RentaArchivo {self.id} - Hab {self.habitacion_id}>'
+
+
+class RegistroAccesoArchivo(db.Model):
+    __tablename__ = 'registros_acceso_archivo'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+    renta_id = db.Column(db.Integer, nullable=False, index=True)
+
+    modo_ingreso = db.Column(db.Enum(ModoIngreso), nullable=False)
+    placas = db.Column(db.String(10), nullable=True)
+    hora_ingreso = db.Column(db.DateTime, primary_key=True, index=True)
+    hora_salida = db.Column(db.DateTime, nullable=True)
+
+    foto_placas_url = db.Column(db.String(255), nullable=True)
+    confianza_reconocimiento = db.Column(db.Float, nullable=True)
+    marca_vehiculo = db.Column(db.String(50), nullable=True)
+    color_vehiculo = db.Column(db.String(30), nullable=True)
+
+    def __repr__(self):
+        return f'<AccesoArchivo {self.id} - Renta {self.renta_id}>'
+
+
+# --- Parámetros del pronóstico de demanda (ver pronostico.py) ---
+# Un renglón por (tipo de habitación, hora de la semana): nivel suavizado de llegadas por hora.
+
+class PronosticoDemanda(db.Model):
+    __tablename__ = 'pronostico_demanda'
+    id = db.Column(db.Integer, primary_key=True)
+
+    tipo = db.Column(db.Enum(TipoHabitacion), nullable=False)
+    hora_semana = db.Column(db.Integer, nullable=False)  # 0 = lunes 00h ... 167 = domingo 23h
+
+    nivel = db.Column(db.Float, nullable=False, default=0.0)  # Llegadas esperadas en esa hora
+    observaciones = db.Column(db.Integer, nullable=False, default=0)
+    entrenado_hasta = db.Column(db.DateTime, nullable=False)  # Hora (exclusiva) hasta la que se entrenó
+
+    __table_args__ = (db.UniqueConstraint('tipo', 'hora_semana', name='uq_pronostico_tipo_hora'),)
+
+    def __repr__(self):
+        return f'<PronosticoDemanda {self.tipo.value} h{self.hora_semana} = {self.nivel:.2f}>'
+
+
+# --- Actividad por hora materializada (ver actividad.py) ---
+# Contadores de check-ins, check-outs e ingreso por (fecha, hora), actualizados en la misma
+# transacción que abre o cierra la renta; el dashboard lee 24 renglones en lugar de agrupar rentas.
+
+class ActividadHora(db.Model):
+    __tablename__ = 'actividad_horaria'
+    fecha = db.Column(db.Date, primary_key=True)
+    hora = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0..23
+
+    checkins = db.Column(db.Integer, nullable=False, default=0)
+    checkouts = db.Column(db.Integer, nullable=False, default=0)
+    ingreso = db.Column(db.Float, nullable=False, default=0.0)  # pago_horas al entrar + pago_extra al salir
+
+    def __repr__(self):
+        return f'<ActividadHora {self.fecha} {self.hora:02d}h>'
+
+
+# --- Bitácora de eventos de estado (ver bitacora.py) ---
+# Solo se insertan renglones: cada cambio de estado de habitaciones, rentas y reservas.
+# Sin llaves foráneas para que sobreviva al archivado y depuración de las tablas activas.
+
+class EventoEstado(db.Model):
+    __tablename__ = 'bitacora_eventos'
+    id = db.Column(db.Integer, primary_key=True)
+
+    ocurrido_at = db.Column(db.DateTime, nullable=False, index=True)
+    entidad = db.Column(db.String(20), nullable=False)  # HABITACION, RENTA, RESERVA
+    entidad_id = db.Column(db.Integer, nullable=False)
+    habitacion_id = db.Column(db.Integer, nullable=True)
+
+    estado_anterior = db.Column(db.String(20), nullable=True)  # NULL al crearse la entidad
+    estado_nuevo = db.Column(db.String(20), nullable=False)
+
+    usuario_id = db.Column(db.Integer, nullable=True)
+    origen = db.Column(db.String(50), nullable=True)  # Endpoint o comando que hizo el cambio
+
+    # Línea de tiempo por habitación: WHERE habitacion_id = ? AND ocurrido_at BETWEEN ...
+    __table_args__ = (
+        db.Index('ix_bitacora_habitacion_fecha', 'habitacion_id', 'ocurrido_at'),
+        db.Index('ix_bitacora_entidad', 'entidad', 'entidad_id'),
+    )
+
+    def __repr__(self):
+        return f'<EventoEstado {self.entidad} {self.entidad_id}: {self.estado_anterior} -> {self.estado_nuevo}>'
+
+
+# --- Contadores monotónicos (ver sincronizacion.py) ---
+
+class ContadorCambios(db.Model):
+    __tablename__ = 'contador_cambios'
+    nombre = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ContadorCambios {self.nombre} = {self.valor}>'
+
+
+# --- Alertas de vencimiento (ver vencimientos.py) ---
+# El id autoincremental es la secuencia compartida por todos los workers; la llave única
+# evita que dos procesos publiquen el mismo aviso de la misma renta.
+
+class EventoVencimiento(db.Model):
+    __tablename__ = 'eventos_vencimiento'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(12), nullable=False)  # POR_VENCER, VENCIDA
+    renta_id = db.Column(db.Integer, nullable=False)
+    hora_salida_estimada = db.Column(db.DateTime, nullable=False)
+    disparado_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('renta_id', 'tipo', 'hora_salida_estimada', name='uq_evento_vencimiento'),
+    )
+
+    def __repr__(self):
+        return f'<EventoVencimiento {self.id} {self.tipo} renta {self.renta_id}>'
+
+
+# --- Claves de idempotencia de formularios (ver idempotencia.py) ---
+# Renglones de vida corta: se depuran al expirar.
+
+class ClaveIdempotencia(db.Model):
+    __tablename__ = 'claves_idempotencia'
+    clave = db.Column(db.String(40), primary_key=True)  # sha1(clave del formulario + ruta + usuario)
+    estado = db.Column(db.String(12), nullable=False, default='EN_PROCESO')  # EN_PROCESO, COMPLETADA
+    respuesta = db.Column(db.Text, nullable=True)  # JSON: redirección y mensajes flash a repetir
+    expira_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ClaveIdempotencia {self.clave[:8]} {self.estado}>'
+
+
+# --- Cola de limpieza (ver limpieza.py) ---
+# Una tarea por cada vez que una habitación pasa a LIMPIEZA; se cierra al quedar DISPONIBLE.
+
+class TareaLimpieza(db.Model):
+    __tablename__ = 'tareas_limpieza'
+    id = db.Column(db.Integer, primary_key=True)
+
+    habitacion_id = db.Column(db.Integer, db.ForeignKey('habitaciones.id'), nullable=False)
+    renta_id = db.Column(db.Integer, nullable=True)  # Renta cuyo check-out originó la tarea
+
+    estado = db.Column(db.String(12), nullable=False, default='PENDIENTE')  # PENDIENTE, EN_CURSO, TERMINADA
+    asignada_a = db.Column(db.String(80), nullable=True)  # Nombre del personal de limpieza
+
+    creada_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    asignada_at = db.Column(db.DateTime, nullable=True)
+    iniciada_at = db.Column(db.DateTime, nullable=True)
+    terminada_at = db.Column(db.DateTime, nullable=True)
+    # habitacion_id mientras la tarea está abierta y NULL al cerrarla: el índice único deja
+    # una sola tarea abierta por habitación (varias filas NULL no chocan entre sí)
+    habitacion_abierta = db.Column(db.Integer, nullable=True)
+    cierre_automatico = db.Column(db.Boolean, nullable=False, default=False)  # Cerrada por el barrido de limpieza
+
+    __table_args__ = (
+        db.Index('ix_tareas_limpieza_estado', 'estado', 'habitacion_id'),
+        db.UniqueConstraint('habitacion_abierta', name='uq_tarea_abierta'),
+    )
+
+    def __repr__(self):
+        return f'<TareaLimpieza {self.id} hab {self.habitacion_id} {self.estado}>'
+
+
+class EstadisticaLimpieza(db.Model):
+    """Media y varianza acumuladas (algoritmo de Welford) por clave y métrica, en minutos"""
+    __tablename__ = 'estadisticas_limpieza'
+    clave = db.Column(db.String(100), primary_key=True)  # 'GLOBAL', 'tipo:JACUZZI', 'personal:Ana'
+    metrica = db.Column(db.String(20), primary_key=True)  # espera, limpieza, rotacion
+
+    n = db.Column(db.Integer, nullable=False, default=0)
+    media = db.Column(db.Float, nullable=False, default=0.0)
+    m2 = db.Column(db.Float, nullable=False, default=0.0)  # Suma de cuadrados de las desviaciones
+    minimo = db.Column(db.Float, nullable=True)
+    maximo = db.Column(db.Float, nullable=True)
+
+    def __repr__(self):
+        return f'<EstadisticaLimpieza {self.clave} {self.metrica} n={self.n} media={self.media:.1f}>'
+
+
+# --- Ventanas de mantenimiento (ver mantenimiento.py) ---
+# Bloquean check-in y reservas en su intervalo; la habitación pasa a MANTENIMIENTO y regresa
+# a DISPONIBLE en los límites de la ventana.
+
+class VentanaMantenimiento(db.Model):
+    __tablename__ = 'ventanas_mantenimiento'
+    id = db.Column(db.Integer, primary_key=True)
+
+    habitacion_id = db.Column(db.Integer, db.ForeignKey('habitaciones.id'), nullable=False)
+    inicio = db.Column(db.DateTime, nullable=False)
+    fin = db.Column(db.DateTime, nullable=False)
+    motivo = db.Column(db.String(200), nullable=False)
+
+    estado = db.Column(db.String(12), nullable=False, default='PROGRAMADA')  # PROGRAMADA, EN_CURSO, TERMINADA, CANCELADA
+    # Instantes reales en que la habitación entró y salió de MANTENIMIENTO (analítica de ocupación)
+    iniciada_at = db.Column(db.DateTime, nullable=True)
+    terminada_at = db.Column(db.DateTime, nullable=True)
+
+    creada_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    habitacion = relationship("Habitacion", backref="ventanas_mantenimiento", lazy=True)
+
+    __table_args__ = (
+        # Traslapes por habitación: habitacion_id = ? AND inicio < ? AND fin > ?
+        db.Index('ix_mantenimiento_habitacion_intervalo', 'habitacion_id', 'inicio', 'fin'),
+        # Próximos límites para el programador
+        db.Index('ix_mantenimiento_estado_inicio', 'estado', 'inicio'),
+    )
+
+    def __repr__(self):
+        return f'<VentanaMantenimiento hab {self.habitacion_id} {self.inicio} - {self.fin} {self.estado}>'
+
+
+# --- Clientes deduplicados (ver clientes.py) ---
+# Un renglón por cliente frecuente: clave de deduplicación a partir del teléfono o del nombre
+# normalizados y agregados (visitas, gasto) que se mantienen al abrir y cerrar cada renta.
+
+class Cliente(db.Model):
+    __tablename__ = 'clientes'
+    id = db.Column(db.Integer, primary_key=True)
+
+    nombre = db.Column(db.String(100), nullable=False)  # Como se capturó la primera vez
+    telefono = db.Column(db.String(20), nullable=True)
+
+    nombre_normalizado = db.Column(db.String(100), nullable=False, index=True)  # minúsculas, sin acentos
+    telefono_normalizado = db.Column(db.String(20), nullable=True, index=True)  # solo los últimos 10 dígitos
+    clave = db.Column(db.String(120), nullable=False, unique=True)  # 'tel:5512345678' o 'nom:juan perez'
+
+    visitas = db.Column(db.Integer, nullable=False, default=0)
+    gasto_total = db.Column(db.Float, nullable=False, default=0.0)
+    primera_visita = db.Column(db.DateTime, nullable=True)
+    ultima_visita = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f'<Cliente {self.id} {self.nombre} ({self.visitas} visitas)>'
+
+
+# --- Cierre diario / auditoría nocturna (ver auditoria.py) ---
+# Totales congelados de cada día cerrado; los reportes de días pasados ya no dependen de
+# recalcular las rentas y las violaciones de integridad encontradas quedan registradas.
+
+class CierreDiario(db.Model):
+    __tablename__ = 'cierres_diarios'
+    fecha = db.Column(db.Date, primary_key=True)
+
+    checkins = db.Column(db.Integer, nullable=False, default=0)
+    checkouts = db.Column(db.Integer, nullable=False, default=0)
+    horas_rentadas = db.Column(db.Integer, nullable=False, default=0)
+    ingreso_inicial = db.Column(db.Float, nullable=False, default=0.0)  # pago_horas de las entradas del día
+    ingreso_extra = db.Column(db.Float, nullable=False, default=0.0)  # pago_extra de las salidas del día
+    ingreso_total = db.Column(db.Float, nullable=False, default=0.0)
+
+    violaciones = db.Column(db.Integer, nullable=False, default=0)
+    reparadas = db.Column(db.Integer, nullable=False, default=0)
+    detalle = db.Column(db.Text, nullable=True)  # JSON con las violaciones encontradas en la auditoría
+
+    cerrado_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return f'<CierreDiario {self.fecha} ${self.ingreso_total:.2f}>'
+
+
+# --- Latido de la réplica de lectura (ver replica.py) ---
+# Un solo renglón que se actualiza en la primaria; su antigüedad leída en la réplica es el retraso.
+
+class LatidoReplica(db.Model):
+    __tablename__ = 'latido_replica'
+    id = db.Column(db.Integer, primary_key=True)
+    marcado_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<LatidoReplica {self.marcado_at}>'
@@ -0,0 +1,221 @@
+"""
+Operaciones masivas de recepción (cierre de turno): check-outs, fin de limpieza y
+confirmación de reservas en UNA transacción.
+
+Cada acción se valida contra el estado previo al lote y se reporta por separado; las
+válidas se aplican con UPDATE por conjunto (un UPDATE ... WHERE id IN (...) por tipo de
+acción, y un executemany por llave primaria para los cobros de check-out). Como esos
+UPDATE no pasan por los objetos del ORM, aquí se hace explícitamente lo que en las rutas
+individuales resuelven los eventos de sesión:
+- Habitacion.version se incrementa en el mismo UPDATE (lo usa la caché de habitaciones)
+- las rentas cerradas reciben una nueva version_cambio (sincronización con ?since=)
+- los check-outs se suman a actividad_horaria dentro de la transacción
+- se crean y cierran las tareas de la cola de limpieza
+- si alguna renta entró antes de hoy, se marca la generación compartida de reportes
+- los eventos de la bitácora se insertan en la misma transacción
+- tras el commit: caché de habitaciones, monitor de vencimientos y caché de reportes
+tests/test_operaciones_masivas.py comprueba que el lote deja el mismo estado que las rutas
+individuales; si se agrega un evento de sesión nuevo, esa prueba indica qué falta aquí.
+"""
+from datetime import datetime
+
+from sqlalchemy import update
+
+from models import db, Habitacion, Renta, RegistroAcceso, Reserva, EstadoHabitacion
+from controllers.room_controller import calcular_checkout
+from sincronizacion import siguiente_version
+from limpieza import crear_tareas, cerrar_tareas
+from clientes import registrar_cobros
+from cache_reportes import marcar_cambio
+import bitacora
+
+MAX_ACCIONES = 500
+
+# Acción -> nombre del identificador esperado en cada elemento
+ACCIONES = {
+    'checkout': 'renta_id',
+    'clean_complete': 'habitacion_id',
+    'confirmar_reserva': 'reserva_id'
+}
+
+
+def _validar_formato(acciones):
+    """Separa los elementos bien formados {(accion, id): indice} de los resultados con error"""
+    validas = {}
+    resultados = []
+
+    for indice, elemento in enumerate(acciones):
+        accion = elemento.get('accion') if isinstance(elemento, dict) else None
+        campo = ACCIONES.get(accion)
+        resultado = {'indice': indice, 'accion': accion, 'ok': False}
+        resultados.append(resultado)
+
+        if campo is None:
+            resultado['error'] = f"Acción no soportada; usa una de: {', '.join(ACCIONES)}"
+            continue
+        identificador = elemento.get(campo)
+        if not isinstance(identificador, int) or isinstance(identificador, bool):
+            resultado['error'] = f"Falta '{campo}' (entero)"
+            continue
+        resultado['id'] = identificador
+        if (accion, identificador) in validas:
+            resultado['error'] = 'Acción duplicada en el lote'
+            continue
+        validas[(accion, identificador)] = indice
+
+    return validas, resultados
+
+
+def aplicar_acciones(acciones):
+    """
+    Aplica la lista de acciones [{'accion': 'checkout', 'renta_id': 5}, ...] en una sola
+    transacción. Regresa la lista de resultados por elemento (en el orden recibido).
+    """
+    validas, resultados = _validar_formato(acciones)
+    ids = {accion: [i for (a, i) in validas if a == accion] for accion in ACCIONES}
+
+    def _error(accion, identificador, mensaje):
+        resultados[validas[(accion, identificador)]]['error'] = mensaje
+
+    def _ok(accion, identificador, **detalle):
+        resultado = resultados[validas[(accion, identificador)]]
+        resultado['ok'] = True
+        resultado.update(detalle)
+
+    ahora = datetime.now()
+    rentas_cerradas = []
+    eventos = []
+
+    try:
+        # --- Estado previo al lote: rentas y habitaciones se leen (con bloqueo de renglones) una
+        # sola vez, antes de cualquier UPDATE, y todas las acciones se validan contra esta lectura ---
+        rentas = {}
+        if ids['checkout']:
+            rentas = {r.id: r for r in db.session.query(
+                Renta.id, Renta.habitacion_id, Renta.hora_entrada, Renta.hora_salida_estimada,
+                Renta.pago_horas, Renta.precio_hora, Renta.estado, Renta.cliente_id
+            ).filter(Renta.id.in_(ids['checkout'])).with_for_update().all()}
+        habitacion_ids = set(ids['clean_complete']) | {r.habitacion_id for r in rentas.values()}
+        estados_previos = dict(db.session.query(Habitacion.id, Habitacion.estado).filter(
+            Habitacion.id.in_(habitacion_ids)
+        ).with_for_update().all()) if habitacion_ids else {}
+
+        # --- Check-outs: cobro y UPDATE por llave primaria ---
+        if ids['checkout']:
+            cobros = []
+            for renta_id in ids['checkout']:
+                renta = rentas.get(renta_id)
+                if renta is None or renta.estado != 'ACTIVA':
+                    _error('checkout', renta_id, 'La renta no existe o ya ha sido cerrada.')
+                    continue
+                horas_extra, pago_extra, pago_final = calcular_checkout(renta, ahora)
+                cobros.append({'id': renta_id, 'hora_salida_real': ahora, 'pago_extra': pago_extra,
+                               'pago_final': pago_final, 'estado': 'CERRADA'})
+                rentas_cerradas.append(renta)
+                _ok('checkout', renta_id, habitacion_id=renta.habitacion_id, horas_extra=horas_extra,
+                    pago_extra=pago_extra, pago_final=pago_final)
+
+            if cobros:
+                cerradas = [r.id for r in rentas_cerradas]
+                for renta in rentas_cerradas:
+                    eventos.append(bitacora.evento(bitacora.RENTA, renta.id, 'ACTIVA', 'CERRADA', renta.habitacion_id, ahora))
+                for habitacion_id in {r.habitacion_id for r in rentas_cerradas}:
+                    eventos.append(bitacora.evento(bitacora.HABITACION, habitacion_id, estados_previos.get(habitacion_id),
+                                                   EstadoHabitacion.LIMPIEZA, habitacion_id, ahora))
+
+                version = siguiente_version(db.session)
+                for cobro in cobros:
+                    cobro['version_cambio'] = version
+                db.session.execute(update(Renta), cobros)
+                db.session.execute(
+                    update(Habitacion)
+                    .where(Habitacion.id.in_({r.habitacion_id for r in rentas_cerradas}))
+                    .values(estado=EstadoHabitacion.LIMPIEZA, version=Habitacion.version + 1),
+                    execution_options={'synchronize_session': False}
+                )
+                db.session.execute(
+                    update(RegistroAcceso)
+                    .where(RegistroAcceso.renta_id.in_(cerradas))
+                    .values(hora_salida=ahora),
+                    execution_options={'synchronize_session': False}
+                )
+
+                from actividad import registrar_checkouts
+                registrar_checkouts(db.session, [(ahora, c['pago_extra']) for c in cobros])
+                registrar_cobros(db.session, [(r.cliente_id, c['pago_extra']) for r, c in zip(rentas_cerradas, cobros)])
+                marcar_cambio(db.session.connection(), [r.hora_entrada for r in rentas_cerradas])
+                crear_tareas(db.session, [(r.habitacion_id, r.id) for r in rentas_cerradas
+                                          if estados_previos.get(r.habitacion_id) != EstadoHabitacion.LIMPIEZA], ahora)
+
+        # --- Fin de limpieza: solo habitaciones que estaban en LIMPIEZA antes del lote (una
+        # habitación que este mismo lote acaba de pasar a LIMPIEZA no cuenta) ---
+        if ids['clean_complete']:
+            limpias = []
+            for habitacion_id in ids['clean_complete']:
+                if estados_previos.get(habitacion_id) != EstadoHabitacion.LIMPIEZA:
+                    _error('clean_complete', habitacion_id, 'La habitación no existe o no está en estado de LIMPIEZA.')
+                    continue
+                limpias.append(habitacion_id)
+                eventos.append(bitacora.evento(bitacora.HABITACION, habitacion_id, EstadoHabitacion.LIMPIEZA,
+                                               EstadoHabitacion.DISPONIBLE, habitacion_id, ahora))
+                _ok('clean_complete', habitacion_id)
+
+            if limpias:
+                db.session.execute(
+                    update(Habitacion)
+                    .where(Habitacion.id.in_(limpias), Habitacion.estado == EstadoHabitacion.LIMPIEZA)
+                    .values(estado=EstadoHabitacion.DISPONIBLE, version=Habitacion.version + 1),
+                    execution_options={'synchronize_session': False}
+                )
+                cerrar_tareas(db.session, limpias, ahora)
+
+        # --- Confirmación de reservas pendientes ---
+        if ids['confirmar_reserva']:
+            reservas = {r.id: r for r in db.session.query(Reserva.id, Reserva.estado, Reserva.habitacion_id).filter(
+                Reserva.id.in_(ids['confirmar_reserva'])
+            ).with_for_update().all()}
+
+            confirmadas = []
+            for reserva_id in ids['confirmar_reserva']:
+                reserva = reservas.get(reserva_id)
+                if reserva is None or reserva.estado != 'PENDIENTE':
+                    _error('confirmar_reserva', reserva_id, 'Solo se pueden confirmar reservas pendientes.')
+                    continue
+                confirmadas.append(reserva_id)
+                eventos.append(bitacora.evento(bitacora.RESERVA, reserva_id, 'PENDIENTE', 'CONFIRMADA', reserva.habitacion_id, ahora))
+                _ok('confirmar_reserva', reserva_id)
+
+            if confirmadas:
+                db.session.execute(
+                    update(Reserva)
+                    .where(Reserva.id.in_(confirmadas), Reserva.estado == 'PENDIENTE')
+                    .values(estado='CONFIRMADA', confirmada_at=ahora),
+                    execution_options={'synchronize_session': False}
+                )
+
+        bitacora.registrar(db.session, eventos)
+        db.session.commit()
+
+    except Exception as e:
+        db.session.rollback()
+        for resultado in resultados:
+            if resultado['ok']:
+                resultado['ok'] = False
+                resultado['error'] = f'Lote revertido: {str(e)}'
+        return resultados
+
+    _despues_de_confirmar(rentas_cerradas)
+    return resultados
+
+
+def _despues_de_confirmar(rentas_cerradas):
+    """Lo que los eventos de sesión harían con objetos del ORM"""
+    from cache_habitaciones import cache_habitaciones
+    from cache_reportes import cache_reportes
+    from vencimientos import monitor_vencimientos
+
+    # La versión de las habitaciones cambió: la verificación recarga solo esas
+    cache_habitaciones.verificar()
+    for renta in rentas_cerradas:
+        monitor_vencimientos.cancelar(renta.id)
+        cache_reportes.invalidar_fecha(renta.hora_entrada)
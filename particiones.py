@@ -0,0 +1,100 @@
+"""
+Particionado mensual por RANGE de las tablas de archivo en MySQL.
+
+MySQL no permite particionar tablas con llaves foráneas (ni tablas referenciadas por una),
+así que 'rentas' y 'registros_acceso' se mantienen pequeñas con el archivo en frío
+(flask archivar-rentas) y son 'rentas_archivo' / 'registros_acceso_archivo' las que se
+particionan por mes. Los reportes filtran directamente sobre la columna de fecha
+(BETWEEN sobre hora_entrada / hora_ingreso), lo que permite a MySQL podar particiones.
+
+En SQLite (pruebas y modo local) todas las operaciones son no-op.
+"""
+from datetime import date
+from sqlalchemy import text
+
+# Tabla -> columna de partición
+TABLAS_PARTICIONADAS = {
+    'rentas_archivo': 'hora_entrada',
+    'registros_acceso_archivo': 'hora_ingreso',
+}
+
+
+def _sumar_meses(dia, meses):
+    """Primer día del mes desplazado 'meses' a partir del mes de 'dia'"""
+    total = dia.year * 12 + (dia.month - 1) + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def _nombre_particion(inicio_mes):
+    return f"p{inicio_mes.strftime('%Y%m')}"
+
+
+def _definicion(inicio_mes):
+    """PARTITION pYYYYMM que contiene el mes que inicia en inicio_mes"""
+    limite = _sumar_meses(inicio_mes, 1)
+    return f"PARTITION {_nombre_particion(inicio_mes)} VALUES LESS THAN (TO_DAYS('{limite.isoformat()}'))"
+
+
+def _particiones_actuales(conn, tabla):
+    """Nombres de las particiones existentes (lista vacía si la tabla no está particionada)"""
+    filas = conn.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabla AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {'tabla': tabla}).all()
+    return [nombre for (nombre,) in filas]
+
+
+def mantener_particiones(engine, meses_futuros=3, meses_retener=None, hoy=None):
+    """
+    Crea las particiones de los próximos 'meses_futuros' meses y, si se indica 'meses_retener',
+    elimina las particiones completas más antiguas que ese número de meses.
+    Regresa una lista de mensajes con lo realizado (vacía si el motor no es MySQL).
+    """
+    if engine.dialect.name != 'mysql':
+        return []
+
+    hoy = hoy or date.today()
+    mes_actual = date(hoy.year, hoy.month, 1)
+    mensajes = []
+
+    with engine.begin() as conn:
+        for tabla, columna in TABLAS_PARTICIONADAS.items():
+            existentes = _particiones_actuales(conn, tabla)
+
+            if not existentes:
+                # Primera vez: particiones desde el dato más antiguo hasta el horizonte futuro
+                minimo = conn.execute(text(f"SELECT MIN({columna}) FROM {tabla}")).scalar()
+                inicio = date(minimo.year, minimo.month, 1) if minimo else mes_actual
+                meses = []
+                mes = inicio
+                while mes <= _sumar_meses(mes_actual, meses_futuros):
+                    meses.append(_definicion(mes))
+                    mes = _sumar_meses(mes, 1)
+                meses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+                conn.execute(text(
+                    f"ALTER TABLE {tabla} PARTITION BY RANGE (TO_DAYS({columna})) ({', '.join(meses)})"
+                ))
+                mensajes.append(f"{tabla}: particionada por mes ({len(meses) - 1} particiones).")
+                existentes = _particiones_actuales(conn, tabla)
+
+            # Pre-crear particiones futuras partiendo 'pmax'
+            nuevas = []
+            for i in range(meses_futuros + 1):
+                mes = _sumar_meses(mes_actual, i)
+                if _nombre_particion(mes) not in existentes:
+                    nuevas.append(_definicion(mes))
+            if nuevas:
+                nuevas.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+                conn.execute(text(f"ALTER TABLE {tabla} REORGANIZE PARTITION pmax INTO ({', '.join(nuevas)})"))
+                mensajes.append(f"{tabla}: {len(nuevas) - 1} particiones futuras creadas.")
+
+            # Depurar particiones viejas (DROP PARTITION es instantáneo, sin DELETE fila a fila)
+            if meses_retener is not None:
+                corte = _nombre_particion(_sumar_meses(mes_actual, -meses_retener))
+                viejas = [p for p in existentes if p != 'pmax' and p < corte]
+                if viejas:
+                    conn.execute(text(f"ALTER TABLE {tabla} DROP PARTITION {', '.join(viejas)}"))
+                    mensajes.append(f"{tabla}: {len(viejas)} particiones antiguas eliminadas.")
+
+    return mensajes
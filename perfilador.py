@@ -0,0 +1,259 @@
+"""
+Perfilado por muestreo de peticiones en producción (opcional).
+
+Se activa solo con variables de entorno; sin ellas create_app no registra ningún hook
+(ni before/after_request ni eventos del engine), así que el costo apagado es cero:
+
+- PERFIL_MUESTREO=0.01          fracción de peticiones perfiladas con cProfile
+- PERFIL_ENDPOINTS=reportes_bp.reportes_rentas,api_bp.bulk_api
+                                endpoints que se perfilan siempre con cProfile
+- PERFIL_UMBRAL_MS=800          el resto de las peticiones lleva un muestreo de pilas ligero
+                                (un hilo toma la pila cada PERFIL_INTERVALO_MS) y se guarda
+                                solo si la petición tardó más que el umbral
+- PERFIL_MAX=50                 tamaño del buffer circular en memoria (por worker)
+
+Cada perfil guarda la duración, las sentencias SQL ejecutadas (texto, tiempo, sin
+parámetros) y el perfil: estadísticas pstats (descargables como .prof para snakeviz o
+pstats) o pilas colapsadas (formato de flamegraph). Solo un cProfile puede estar activo a
+la vez por proceso: si ya hay uno, la petición usa el muestreo de pilas.
+
+Consulta (administradores): GET /api/perfiles, /api/perfiles/<id>,
+/api/perfiles/<id>/descargar.
+"""
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+FRACCION = float(os.environ.get("PERFIL_MUESTREO", 0))
+ENDPOINTS = {e.strip() for e in os.environ.get("PERFIL_ENDPOINTS", "").split(',') if e.strip()}
+UMBRAL_MS = float(os.environ.get("PERFIL_UMBRAL_MS", 0))
+INTERVALO_MS = float(os.environ.get("PERFIL_INTERVALO_MS", 5))
+MAX_PERFILES = int(os.environ.get("PERFIL_MAX", 50))
+MAX_SENTENCIAS = 500  # SQL guardado por petición
+MAX_FUNCIONES = 40  # renglones del resumen de pstats
+
+CPROFILE = 'cprofile'
+PILAS = 'pilas'
+
+_captura_actual = threading.local()  # Captura de SQL del hilo de la petición perfilada
+
+
+class CapturaSQL:
+    def __init__(self):
+        self.sentencias = []
+        self.total = 0
+        self.tiempo_ms = 0.0
+
+
+# --- Muestreo de pilas: un solo hilo para todas las peticiones registradas ---
+
+class MuestreadorPilas:
+
+    def __init__(self, intervalo_ms=INTERVALO_MS):
+        self.intervalo = intervalo_ms / 1000.0
+        self._hilos = {}  # id del hilo -> Counter de pilas colapsadas
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def _iniciar(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, name='muestreador-pilas', daemon=True)
+            self._hilo.start()
+
+    def registrar(self, hilo_id):
+        with self._lock:
+            self._hilos[hilo_id] = Counter()
+            self._iniciar()
+
+    def terminar(self, hilo_id):
+        with self._lock:
+            return self._hilos.pop(hilo_id, Counter())
+
+    @staticmethod
+    def _colapsar(frame):
+        partes = []
+        while frame is not None:
+            codigo = frame.f_code
+            partes.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+            frame = frame.f_back
+        return ';'.join(reversed(partes))
+
+    def _ciclo(self):
+        ocupado_en = time.monotonic()
+        while True:
+            time.sleep(self.intervalo)
+            with self._lock:
+                if not self._hilos:
+                    # Tras un segundo sin peticiones registradas el hilo termina; registrar() inicia otro
+                    if time.monotonic() - ocupado_en > 1:
+                        self._hilo = None
+                        return
+                    continue
+                ocupado_en = time.monotonic()
+                frames = sys._current_frames()
+                for hilo_id, pilas in self._hilos.items():
+                    frame = frames.get(hilo_id)
+                    if frame is not None:
+                        pilas[self._colapsar(frame)] += 1
+
+
+muestreador_pilas = MuestreadorPilas()
+
+
+# --- Buffer circular de perfiles ---
+
+class BufferPerfiles:
+
+    def __init__(self, maximo=MAX_PERFILES):
+        self._perfiles = deque(maxlen=maximo)
+        self._lock = threading.Lock()
+        self._secuencia = itertools.count(1)
+
+    def agregar(self, perfil):
+        with self._lock:
+            perfil['id'] = next(self._secuencia)
+            self._perfiles.append(perfil)
+
+    def listar(self):
+        with self._lock:
+            return [{clave: valor for clave, valor in p.items() if clave not in ('sql', 'datos', 'resumen')}
+                    for p in reversed(self._perfiles)]
+
+    def obtener(self, perfil_id):
+        with self._lock:
+            return next((p for p in self._perfiles if p['id'] == perfil_id), None)
+
+
+buffer_perfiles = BufferPerfiles()
+
+_cprofile_activo = threading.Lock()
+
+
+def habilitado():
+    return FRACCION > 0 or bool(ENDPOINTS) or UMBRAL_MS > 0
+
+
+# --- Hooks (solo se registran si el perfilado está habilitado) ---
+
+def _antes_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    captura = getattr(_captura_actual, 'captura', None)
+    if captura is not None:
+        conn.info.setdefault('perfil_inicio', []).append(time.perf_counter())
+
+
+def _despues_de_ejecutar(conn, cursor, statement, parameters, context, executemany):
+    captura = getattr(_captura_actual, 'captura', None)
+    inicios = conn.info.get('perfil_inicio')
+    if captura is None or not inicios:
+        return
+    duracion = (time.perf_counter() - inicios.pop()) * 1000
+    captura.total += 1
+    captura.tiempo_ms += duracion
+    if len(captura.sentencias) < MAX_SENTENCIAS:
+        captura.sentencias.append({'sql': statement, 'ms': round(duracion, 3), 'lote': executemany})
+
+
+def _iniciar_perfil():
+    seleccionado = request.endpoint in ENDPOINTS or (FRACCION > 0 and random.random() < FRACCION)
+    if seleccionado:
+        modo = CPROFILE
+    elif UMBRAL_MS > 0:
+        modo = PILAS
+    else:
+        return
+
+    if modo == CPROFILE and not _cprofile_activo.acquire(blocking=False):
+        modo = PILAS  # Ya hay un cProfile en otro hilo
+
+    g.perfil_modo = modo
+    g.perfil_seleccionado = seleccionado  # Se guarda aunque no pase el umbral
+    g.perfil_inicio = time.perf_counter()
+    _captura_actual.captura = CapturaSQL()
+    if modo == CPROFILE:
+        g.perfil_cprofile = cProfile.Profile()
+        g.perfil_cprofile.enable()
+    else:
+        muestreador_pilas.registrar(threading.get_ident())
+
+
+def _registrar_estado(respuesta):
+    if getattr(g, 'perfil_modo', None):
+        g.perfil_estado = respuesta.status_code
+    return respuesta
+
+
+def _terminar_perfil(excepcion=None):
+    modo = g.pop('perfil_modo', None)
+    if modo is None:
+        return
+    duracion_ms = (time.perf_counter() - g.pop('perfil_inicio')) * 1000
+    captura = _captura_actual.captura
+    _captura_actual.captura = None
+
+    if modo == CPROFILE:
+        perfilador = g.pop('perfil_cprofile')
+        perfilador.disable()
+        _cprofile_activo.release()
+    else:
+        pilas = muestreador_pilas.terminar(threading.get_ident())
+        if not g.get('perfil_seleccionado') and duracion_ms < UMBRAL_MS:
+            return
+
+    perfil = {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'metodo': request.method,
+        'ruta': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'estado': g.get('perfil_estado', 500 if excepcion else None),
+        'duracion_ms': round(duracion_ms, 2),
+        'modo': modo,
+        'sql_total': captura.total,
+        'sql_ms': round(captura.tiempo_ms, 2),
+        'sql': captura.sentencias
+    }
+    if modo == CPROFILE:
+        estadisticas = pstats.Stats(perfilador)
+        perfil['datos'] = marshal.dumps(estadisticas.stats)  # Formato de pstats.Stats.dump_stats
+        salida = io.StringIO()
+        estadisticas.stream = salida
+        estadisticas.sort_stats('cumulative').print_stats(MAX_FUNCIONES)
+        perfil['resumen'] = salida.getvalue()
+    else:
+        perfil['muestras'] = sum(pilas.values())
+        perfil['resumen'] = '\n'.join(f"{pila} {n}" for pila, n in pilas.most_common())
+    buffer_perfiles.agregar(perfil)
+
+
+def registrar(app):
+    """Registra los hooks de perfilado en la app; no hace nada si está apagado"""
+    if not habilitado():
+        return False
+    event.listen(Engine, 'before_cursor_execute', _antes_de_ejecutar)
+    event.listen(Engine, 'after_cursor_execute', _despues_de_ejecutar)
+    app.before_request(_iniciar_perfil)
+    app.after_request(_registrar_estado)
+    app.teardown_request(_terminar_perfil)
+    return True
+
+
+def estado():
+    return {
+        'habilitado': habilitado(),
+        'muestreo': FRACCION,
+        'endpoints': sorted(ENDPOINTS),
+        'umbral_ms': UMBRAL_MS,
+        'capacidad': MAX_PERFILES
+    }
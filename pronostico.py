@@ -0,0 +1,167 @@
+"""
+Pronóstico de llegadas por hora y tipo de habitación (para personal y precios).
+
+Modelo estacional ligero: un nivel por (tipo, hora de la semana) actualizado con
+suavizamiento exponencial simple, nivel = ALFA * llegadas + (1 - ALFA) * nivel, con las
+llegadas reales (Renta.hora_entrada, incluidas las archivadas) de cada hora completa.
+
+El entrenamiento es incremental y se ejecuta fuera de las peticiones:
+
+    flask entrenar-pronostico            (cron nocturno: solo las horas nuevas)
+    flask entrenar-pronostico --completo (reentrena desde la primera renta)
+
+Los parámetros se guardan en la tabla pronostico_demanda y se mantienen en memoria
+(se recargan cada PRONOSTICO_TTL segundos), así que pronosticar() no consulta rentas.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from models import db, Habitacion, Renta, RentaArchivo, TipoHabitacion, PronosticoDemanda
+from reportes import _fuentes_rentas
+
+ALFA = float(os.environ.get("PRONOSTICO_ALFA", 0.2))
+TTL_PARAMETROS = float(os.environ.get("PRONOSTICO_TTL", 300))
+HORAS_SEMANA = 7 * 24
+
+
+def _truncar_hora(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def hora_semana(dt):
+    """Índice 0..167 (lunes 00h = 0)"""
+    return dt.weekday() * 24 + dt.hour
+
+
+def _primera_llegada():
+    primeras = [db.session.query(func.min(Renta.hora_entrada)).scalar(),
+                db.session.query(func.min(RentaArchivo.hora_entrada)).scalar()]
+    primeras = [p for p in primeras if p is not None]
+    return _truncar_hora(min(primeras)) if primeras else None
+
+
+def _llegadas_por_hora(desde, hasta):
+    """{(tipo, hora truncada): llegadas} con hora_entrada en [desde, hasta)"""
+    R, _ = _fuentes_rentas(desde, hasta)
+    consulta = db.session.query(Habitacion.tipo, R.hora_entrada).join(
+        Habitacion, R.habitacion_id == Habitacion.id
+    ).filter(R.hora_entrada >= desde, R.hora_entrada < hasta)
+
+    conteo = {}
+    for tipo, entrada in consulta.yield_per(5000):
+        clave = (tipo, _truncar_hora(entrada))
+        conteo[clave] = conteo.get(clave, 0) + 1
+    return conteo
+
+
+def entrenar(hasta=None, completo=False, alfa=ALFA):
+    """
+    Incorpora las horas completas pendientes (desde el último entrenamiento hasta 'hasta')
+    y guarda los parámetros. Regresa el número de horas procesadas.
+    """
+    hasta = _truncar_hora(hasta or datetime.now())
+
+    if completo:
+        PronosticoDemanda.query.delete()
+        parametros = {}
+    else:
+        parametros = {(p.tipo, p.hora_semana): p for p in PronosticoDemanda.query.all()}
+
+    desde = min(p.entrenado_hasta for p in parametros.values()) if parametros else _primera_llegada()
+    if desde is None or desde >= hasta:
+        db.session.commit()
+        return 0
+
+    llegadas = _llegadas_por_hora(desde, hasta)
+
+    hora = desde
+    horas = 0
+    while hora < hasta:
+        indice = hora_semana(hora)
+        for tipo in TipoHabitacion:
+            parametro = parametros.get((tipo, indice))
+            if parametro is None:
+                parametro = PronosticoDemanda(tipo=tipo, hora_semana=indice, nivel=0.0, observaciones=0)
+                db.session.add(parametro)
+                parametros[(tipo, indice)] = parametro
+            # Horas anteriores a la última entrenada de este renglón ya están incorporadas
+            if parametro.entrenado_hasta is not None and hora < parametro.entrenado_hasta:
+                continue
+
+            observado = llegadas.get((tipo, hora), 0)
+            if parametro.observaciones == 0:
+                parametro.nivel = float(observado)
+            else:
+                parametro.nivel = alfa * observado + (1 - alfa) * parametro.nivel
+            parametro.observaciones += 1
+        hora += timedelta(hours=1)
+        horas += 1
+
+    for parametro in parametros.values():
+        parametro.entrenado_hasta = hasta
+
+    db.session.commit()
+    parametros_pronostico.invalidar()
+    return horas
+
+
+class ParametrosPronostico:
+    """Copia en memoria de los niveles entrenados: {tipo: [168 niveles]}"""
+
+    def __init__(self, ttl=TTL_PARAMETROS):
+        self.ttl = ttl
+        self._niveles = None
+        self._entrenado_hasta = None
+        self._cargado_en = 0.0
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        if self._niveles is None or time.monotonic() - self._cargado_en > self.ttl:
+            self.recargar()
+        return self._niveles, self._entrenado_hasta
+
+    def recargar(self):
+        niveles = {}
+        entrenado_hasta = None
+        for parametro in PronosticoDemanda.query.all():
+            niveles.setdefault(parametro.tipo, [0.0] * HORAS_SEMANA)[parametro.hora_semana] = parametro.nivel
+            if entrenado_hasta is None or parametro.entrenado_hasta > entrenado_hasta:
+                entrenado_hasta = parametro.entrenado_hasta
+        with self._lock:
+            self._niveles = niveles
+            self._entrenado_hasta = entrenado_hasta
+            self._cargado_en = time.monotonic()
+
+    def invalidar(self):
+        with self._lock:
+            self._niveles = None
+
+
+parametros_pronostico = ParametrosPronostico()
+
+
+def pronosticar(horas=24, desde=None):
+    """Llegadas esperadas por hora y tipo de habitación para las próximas 'horas' horas"""
+    niveles, entrenado_hasta = parametros_pronostico.obtener()
+    inicio = _truncar_hora(desde or datetime.now())
+
+    serie = []
+    for i in range(horas):
+        hora = inicio + timedelta(hours=i)
+        indice = hora_semana(hora)
+        por_tipo = {tipo.value: round(niveles[tipo][indice], 2) for tipo in TipoHabitacion if tipo in niveles}
+        serie.append({
+            'hora': hora.strftime('%Y-%m-%d %H:%M'),
+            'por_tipo': por_tipo,
+            'total': round(sum(por_tipo.values()), 2)
+        })
+
+    return {
+        'entrenado': bool(niveles),
+        'entrenado_hasta': entrenado_hasta.strftime('%Y-%m-%d %H:%M') if entrenado_hasta else None,
+        'pronostico': serie
+    }
@@ -0,0 +1,209 @@
+"""
+Enrutamiento de lecturas de reportes y analítica a una réplica de solo lectura.
+
+La réplica es el bind 'replica' de Flask-SQLAlchemy (SQLALCHEMY_BINDS), configurado con
+REPLICA_DATABASE_URL, MYSQL_REPLICA_HOST (mismas credenciales que la primaria) o, con
+DB_BACKEND=sqlite, REPLICA_SQLITE_PATH. Sin réplica configurada todo va a la primaria.
+
+- Las funciones decoradas con @solo_lectura (reportes, comparativas, analítica) ejecutan
+  sus SELECT en la réplica: la sesión (SesionEnrutada) elige el engine en get_bind según
+  una variable de contexto. Los flush, las sentencias de escritura y las sesiones que ya
+  escribieron en la petición (leer lo propio) siguen en la primaria.
+- Retraso acotado: un latido (tabla latido_replica) se escribe en la primaria como máximo
+  cada REPLICA_VERIFICAR segundos; el retraso es la antigüedad del latido leído en la
+  réplica. Si supera REPLICA_RETRASO_MAX segundos, o la réplica no responde, las lecturas
+  regresan a la primaria hasta la siguiente verificación. Una falla de conexión de la
+  réplica a mitad de un reporte repite la función completa en la primaria; los reportes que
+  atrapan sus errores deben dejar pasar esa falla (ver leyendo_replica()).
+
+Prueba local con dos archivos SQLite (sin replicación real, la copia envejece):
+
+    DB_BACKEND=sqlite SQLITE_PATH=motel.db REPLICA_SQLITE_PATH=replica.db flask copiar-replica
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+
+from flask_sqlalchemy.session import Session as SesionFlask
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+
+BIND_REPLICA = 'replica'
+RETRASO_MAX = float(os.environ.get("REPLICA_RETRASO_MAX", 30))
+INTERVALO_VERIFICACION = float(os.environ.get("REPLICA_VERIFICAR", 5))
+
+_CLAVE_ESCRIBIO = 'replica_sesion_escribio'
+
+_en_replica = ContextVar('en_replica', default=False)
+
+
+def _es_lectura(clause):
+    return clause is not None and getattr(clause, 'is_select', False)
+
+
+class SesionEnrutada(SesionFlask):
+    """Sesión de db: dentro de @solo_lectura los SELECT van al bind de la réplica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and _en_replica.get() and not self._flushing and _es_lectura(clause)
+                and not self.info.get(_CLAVE_ESCRIBIO)):
+            replica = self._db.engines.get(BIND_REPLICA)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_escritura(session, flush_context):
+    # La sesión vive lo que dura la petición: después de escribir, sus lecturas ven lo escrito
+    session.info[_CLAVE_ESCRIBIO] = True
+
+
+class EnrutadorLectura:
+    """Estado de la réplica (disponible y dentro del retraso máximo), verificado cada intervalo"""
+
+    def __init__(self, retraso_max=RETRASO_MAX, intervalo=INTERVALO_VERIFICACION):
+        self.retraso_max = retraso_max
+        self.intervalo = intervalo
+        self._disponible = False
+        self._retraso = None
+        self._error = None
+        self._verificado_en = None
+        self._latido_en = None
+        self._lock = threading.Lock()
+        self.lecturas_replica = 0
+        self.lecturas_primaria = 0
+
+    def configurado(self):
+        from models import db
+        return BIND_REPLICA in db.engines
+
+    def disponible(self):
+        if not self.configurado():
+            return False
+        if self._verificado_en is None or time.monotonic() - self._verificado_en > self.intervalo:
+            self._verificar()
+        return self._disponible
+
+    def _escribir_latido(self, engine, ahora):
+        from models import LatidoReplica
+        tabla = LatidoReplica.__table__
+        with engine.begin() as conexion:
+            if conexion.execute(update(tabla).where(tabla.c.id == 1).values(marcado_at=ahora)).rowcount == 0:
+                conexion.execute(tabla.insert().values(id=1, marcado_at=ahora))
+
+    def _verificar(self):
+        from models import db, LatidoReplica
+        ahora = datetime.now()
+        retraso, error = None, None
+
+        try:
+            with db.engines[BIND_REPLICA].connect() as conexion:
+                marcado = conexion.execute(select(LatidoReplica.marcado_at).where(LatidoReplica.id == 1)).scalar()
+            retraso = (ahora - marcado).total_seconds() if marcado else None
+            if retraso is None:
+                error = 'La réplica todavía no tiene latido.'
+        except Exception as e:
+            error = f"Réplica no disponible: {e.__class__.__name__}"
+
+        # El latido se renueva en la primaria para la siguiente verificación (de este u otro worker)
+        if self._latido_en is None or time.monotonic() - self._latido_en > self.intervalo:
+            try:
+                self._escribir_latido(db.engines[None], ahora)
+                self._latido_en = time.monotonic()
+            except Exception as e:
+                print(f"Error al escribir el latido de la réplica: {e}")
+
+        with self._lock:
+            self._retraso = retraso
+            self._error = error
+            self._disponible = retraso is not None and retraso <= self.retraso_max
+            if retraso is not None and not self._disponible:
+                self._error = f"Retraso de {retraso:.1f} s (máximo {self.retraso_max:.0f} s)."
+            self._verificado_en = time.monotonic()
+
+    def marcar_caida(self, error):
+        with self._lock:
+            self._disponible = False
+            self._error = f"Réplica no disponible: {error.__class__.__name__}"
+            self._verificado_en = time.monotonic()
+
+    def invalidar(self):
+        with self._lock:
+            self._verificado_en = None
+
+    def estado(self):
+        return {
+            'configurada': self.configurado(),
+            'disponible': self._disponible,
+            'retraso_segundos': round(self._retraso, 1) if self._retraso is not None else None,
+            'retraso_max_segundos': self.retraso_max,
+            'error': self._error,
+            'lecturas_replica': self.lecturas_replica,
+            'lecturas_primaria': self.lecturas_primaria
+        }
+
+
+enrutador_lectura = EnrutadorLectura()
+
+
+def leyendo_replica():
+    """True dentro de una llamada @solo_lectura que está leyendo de la réplica"""
+    return _en_replica.get()
+
+
+@contextmanager
+def en_primaria():
+    """Fuerza la primaria dentro de un reporte (p. ej. para recargar cachés compartidas)"""
+    token = _en_replica.set(False)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+def solo_lectura(funcion):
+    """Decorador para reportes y analítica: lee de la réplica si está vigente"""
+
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        from models import db
+        if _en_replica.get() or db.session.info.get(_CLAVE_ESCRIBIO) or not enrutador_lectura.disponible():
+            if not _en_replica.get():
+                enrutador_lectura.lecturas_primaria += 1
+            return funcion(*args, **kwargs)
+
+        enrutador_lectura.lecturas_replica += 1
+        token = _en_replica.set(True)
+        try:
+            return funcion(*args, **kwargs)
+        except Exception as e:
+            from contingencia import es_falla_conexion, rollback_seguro
+            if not es_falla_conexion(e):
+                raise
+            print(f"Réplica sin conexión en {funcion.__name__}; se repite en la primaria: {e}")
+            rollback_seguro()
+            enrutador_lectura.marcar_caida(e)
+            _en_replica.set(False)
+            return funcion(*args, **kwargs)
+        finally:
+            _en_replica.reset(token)
+
+    return envoltura
+
+
+def copiar_replica(ruta_primaria, ruta_replica):
+    """Copia consistente de la base SQLite primaria a la réplica (API de respaldo de sqlite3)"""
+    import sqlite3
+    origen = sqlite3.connect(ruta_primaria)
+    destino = sqlite3.connect(ruta_replica)
+    try:
+        with destino:
+            origen.backup(destino)
+    finally:
+        destino.close()
+        origen.close()
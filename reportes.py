@@ -0,0 +1,616 @@
+"""
+Consultas agregadas para reportes, métricas y el dashboard.
+Todas se ejecutan dentro de un contexto de aplicación (usan db.session).
+"""
+from datetime import datetime, timedelta, date
+from sqlalchemy import func, desc, select, union_all, case
+from sqlalchemy.orm import aliased
+
+from models import db, Habitacion, Renta, RegistroAcceso, EstadoHabitacion, ModoIngreso, Sucursal
+from models import RentaArchivo, RegistroAccesoArchivo, ActividadHora
+from cache_habitaciones import cache_habitaciones
+from cache_reportes import cache_reportes
+from replica import solo_lectura, leyendo_replica
+from contingencia import es_falla_conexion
+
+
+# 🔔 LÓGICA DE REPORTES (Consulta datos agregados) - VERSIÓN ORIGINAL
+def get_renta_reports():
+    """Obtiene datos agregados para los reportes de ingresos y rentas por tipo/modo. (CORREGIDO)"""
+    
+    # 1. Total de Ingresos y Rentas por Tipo de Habitación
+    ingresos_por_tipo = db.session.query(
+        Habitacion.tipo,
+        func.count(Renta.id).label('total_rentas'),
+        func.sum(Renta.pago_final).label('total_ingreso')
+    ).join(Habitacion, Renta.habitacion_id == Habitacion.id).filter(
+        Renta.estado == 'CERRADA'
+    ).group_by(
+        Habitacion.tipo
+    ).all()
+    
+    # 2. Total de Rentas por Modo de Ingreso
+    rentas_por_modo = db.session.query(
+        RegistroAcceso.modo_ingreso,
+        func.count(Renta.id).label('total_rentas')
+    ).join(RegistroAcceso, Renta.id == RegistroAcceso.renta_id).filter(
+        Renta.estado == 'CERRADA'
+    ).group_by(
+        RegistroAcceso.modo_ingreso
+    ).all()
+    
+    # 3. Datos para el Top 5 de Habitaciones más Rentadas
+    top_habitaciones = db.session.query(
+        Habitacion.numero,
+        func.count(Renta.id).label('num_rentas'),
+        func.sum(Renta.pago_final).label('ingreso_total')
+    ).join(Renta, Habitacion.id == Renta.habitacion_id).filter(
+        Renta.estado == 'CERRADA'
+    ).group_by(
+        Habitacion.numero
+    ).order_by(
+        # 💥 CORRECCIÓN: Usamos desc() importado de sqlalchemy aplicado al alias
+        desc('num_rentas') 
+    ).limit(5).all()
+    
+    # Formateo de los resultados (usando .value para obtener el string del Enum)
+    report_data = {
+        'ingresos_tipo': [{'tipo': t.value, 'rentas': c, 'ingreso': i if i else 0.0} for t, c, i in ingresos_por_tipo],
+        'rentas_modo': [{'modo': m.value, 'rentas': c} for m, c in rentas_por_modo],
+        'top_habitaciones': [{'numero': num, 'rentas': c, 'ingreso_total': i if i else 0.0} for num, c, i in top_habitaciones]
+    }
+    
+    return report_data
+
+
+# --- FILTROS COMUNES PARA REPORTES ---
+def _rango_fechas(fecha_inicio, fecha_fin):
+    """Convierte las fechas 'YYYY-MM-DD' del formulario en (inicio, fin exclusivo) o (None, None)"""
+    if not fecha_inicio or not fecha_fin:
+        return None, None
+    try:
+        fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
+        fecha_fin_dt = datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1)
+        return fecha_inicio_dt, fecha_fin_dt
+    except ValueError:
+        # Si hay error en el formato, ignorar filtros
+        return None, None
+
+
+def _requiere_archivo(fecha_inicio_dt):
+    """Indica si el rango que empieza en fecha_inicio_dt alcanza datos ya archivados"""
+    ultima_archivada = db.session.query(func.max(RentaArchivo.hora_entrada)).scalar()
+    if ultima_archivada is None:
+        return False
+    return fecha_inicio_dt is None or fecha_inicio_dt <= ultima_archivada
+
+
+def _fuentes_rentas(fecha_inicio_dt=None, fecha_fin_dt=None):
+    """
+    Regresa las entidades (Renta, RegistroAcceso) sobre las que deben consultar los reportes.
+    Si el rango toca datos archivados se regresan alias sobre un UNION ALL de la tabla activa
+    y la de archivo (cada rama ya filtrada por el rango); si no, las tablas activas sin cambios.
+    """
+    if not _requiere_archivo(fecha_inicio_dt):
+        return Renta, RegistroAcceso
+
+    def _union(activa, archivo, columna_fecha, nombre):
+        columnas = [c.name for c in activa.__table__.columns]
+        ramas = []
+        for modelo in (activa, archivo):
+            tabla = modelo.__table__
+            consulta = select(*[tabla.c[c] for c in columnas])
+            if fecha_inicio_dt:
+                consulta = consulta.where(tabla.c[columna_fecha].between(fecha_inicio_dt, fecha_fin_dt))
+            ramas.append(consulta)
+        return aliased(activa, union_all(*ramas).subquery(nombre))
+
+    return (_union(Renta, RentaArchivo, 'hora_entrada', 'rentas_todas'),
+            _union(RegistroAcceso, RegistroAccesoArchivo, 'hora_ingreso', 'registros_acceso_todos'))
+
+
+def _filtros_renta(R, fecha_inicio=None, fecha_fin=None, sucursal_id=None):
+    """Condiciones WHERE comunes: rentas cerradas, rango de fechas y sucursal opcional"""
+    filtros = [R.estado == 'CERRADA']
+
+    fecha_inicio_dt, fecha_fin_dt = _rango_fechas(fecha_inicio, fecha_fin)
+    if fecha_inicio_dt:
+        filtros.append(R.hora_entrada.between(fecha_inicio_dt, fecha_fin_dt))
+
+    if sucursal_id is not None:
+        filtros.append(R.habitacion_id.in_(
+            db.session.query(Habitacion.id).filter(Habitacion.sucursal_id == sucursal_id)
+        ))
+
+    return filtros
+
+
+# --- SECCIONES DEL REPORTE (una consulta cada una; se cachean por rango y sucursal) ---
+def _seccion_ingresos_tipo(R, A, filtros):
+    """Total de Ingresos y Rentas por Tipo de Habitación"""
+    ingresos_por_tipo = db.session.query(
+        Habitacion.tipo,
+        func.count(R.id).label('total_rentas'),
+        func.sum(R.pago_final).label('total_ingreso')
+    ).join(Habitacion, R.habitacion_id == Habitacion.id
+    ).filter(*filtros
+    ).group_by(Habitacion.tipo).all()
+
+    return [{'tipo': t.value, 'rentas': c, 'ingreso': float(i) if i else 0.0} for t, c, i in ingresos_por_tipo]
+
+
+def _seccion_rentas_modo(R, A, filtros):
+    """Total de Rentas por Modo de Ingreso"""
+    rentas_por_modo = db.session.query(
+        A.modo_ingreso,
+        func.count(R.id).label('total_rentas')
+    ).join(A, R.id == A.renta_id
+    ).filter(*filtros
+    ).group_by(A.modo_ingreso).all()
+
+    return [{'modo': m.value, 'rentas': c} for m, c in rentas_por_modo]
+
+
+def _seccion_top_habitaciones(R, A, filtros):
+    """Top 5 Habitaciones más Rentadas"""
+    top_habitaciones = db.session.query(
+        Habitacion.numero,
+        func.count(R.id).label('num_rentas'),
+        func.sum(R.pago_final).label('ingreso_total')
+    ).join(R, Habitacion.id == R.habitacion_id
+    ).filter(*filtros
+    ).group_by(Habitacion.numero
+    ).order_by(desc('num_rentas')).limit(5).all()
+
+    return [{'numero': num, 'rentas': c, 'ingreso_total': float(i) if i else 0.0} for num, c, i in top_habitaciones]
+
+
+def _seccion_horas_extras(R, A, filtros):
+    """Reporte de Horas Extras (SIMPLIFICADO)"""
+    horas_extras = db.session.query(
+        R.hora_entrada,
+        Habitacion.numero,
+        R.cliente_nombre,
+        R.pago_extra
+    ).join(Habitacion, R.habitacion_id == Habitacion.id
+    ).filter(
+        *filtros,
+        R.pago_extra > 0
+    ).order_by(desc(R.hora_entrada)).limit(50).all()
+
+    return [{
+        'fecha': h.hora_entrada.strftime('%Y-%m-%d %H:%M') if h.hora_entrada else 'N/A',
+        'habitacion': h.numero,
+        'cliente': h.cliente_nombre,
+        'horas_extra': round(float(h.pago_extra) / 150.00, 2) if h.pago_extra else 0.0,
+        'monto_extra': float(h.pago_extra) if h.pago_extra else 0.0
+    } for h in horas_extras]
+
+
+def _seccion_ingreso_vehiculos(R, A, filtros):
+    """Reporte Vehicular Detallado (SIMPLIFICADO)"""
+    ingresos_vehiculares = db.session.query(
+        A.placas,
+        Habitacion.numero,
+        R.hora_entrada,
+        R.hora_salida_real,
+        R.pago_final
+    ).join(R, A.renta_id == R.id
+    ).join(Habitacion, R.habitacion_id == Habitacion.id
+    ).filter(
+        *filtros,
+        A.modo_ingreso == ModoIngreso.VEHICULO,
+        A.placas.isnot(None)
+    ).order_by(desc(R.hora_entrada)).limit(50).all()
+
+    return [{
+        'placas': v.placas,
+        'habitacion': v.numero,
+        'entrada': v.hora_entrada.strftime('%Y-%m-%d %H:%M') if v.hora_entrada else 'N/A',
+        'salida': v.hora_salida_real.strftime('%Y-%m-%d %H:%M') if v.hora_salida_real else 'N/A',
+        'pago_total': float(v.pago_final) if v.pago_final else 0.0,
+        'tiempo_total': 'Calculado'  # Simplificado para evitar errores
+    } for v in ingresos_vehiculares]
+
+
+SECCIONES_REPORTE = {
+    'ingresos_tipo': _seccion_ingresos_tipo,
+    'rentas_modo': _seccion_rentas_modo,
+    'top_habitaciones': _seccion_top_habitaciones,
+    'horas_extras': _seccion_horas_extras,
+    'ingreso_vehiculos': _seccion_ingreso_vehiculos
+}
+
+
+@solo_lectura
+def get_reporte_seccion(seccion, fecha_inicio=None, fecha_fin=None, sucursal_id=None):
+    """Una sola sección del reporte (ver SECCIONES_REPORTE), servida desde la caché de reportes"""
+    fecha_inicio_dt, fecha_fin_dt = _rango_fechas(fecha_inicio, fecha_fin)
+
+    def _calcular():
+        R, A = _fuentes_rentas(fecha_inicio_dt, fecha_fin_dt)
+        filtros = _filtros_renta(R, fecha_inicio, fecha_fin, sucursal_id)
+        return SECCIONES_REPORTE[seccion](R, A, filtros)
+
+    return cache_reportes.obtener(seccion, fecha_inicio_dt, fecha_fin_dt, sucursal_id, _calcular)
+
+
+def get_totales_horas_extras(horas_extras):
+    """Totales de horas extras (SIMPLIFICADO)"""
+    total_monto_extra = sum(h['monto_extra'] for h in horas_extras)
+    total_horas_extra = round(total_monto_extra / 150.00, 2)  # Aproximación simple
+    return total_horas_extra, total_monto_extra
+
+
+# 🔔 LÓGICA DE REPORTES MEJORADA CON FILTROS - VERSIÓN CORREGIDA
+@solo_lectura
+def get_renta_reports_mejorado(fecha_inicio=None, fecha_fin=None, sucursal_id=None):
+    """Obtiene datos agregados para reportes con filtros de fecha (y sucursal opcional)"""
+    
+    try:
+        report_data = {seccion: get_reporte_seccion(seccion, fecha_inicio, fecha_fin, sucursal_id)
+                       for seccion in SECCIONES_REPORTE}
+
+        total_horas_extra, total_monto_extra = get_totales_horas_extras(report_data['horas_extras'])
+        report_data['total_horas_extra'] = total_horas_extra
+        report_data['total_monto_extra'] = total_monto_extra
+
+        return report_data
+        
+    except Exception as e:
+        if leyendo_replica() and es_falla_conexion(e):
+            raise  # Réplica caída a mitad del reporte: @solo_lectura lo repite en la primaria
+        print(f"Error en get_renta_reports_mejorado: {e}")
+        # Retornar estructura vacía pero válida
+        return {
+            'ingresos_tipo': [],
+            'rentas_modo': [],
+            'top_habitaciones': [],
+            'horas_extras': [],
+            'ingreso_vehiculos': [],
+            'total_horas_extra': 0,
+            'total_monto_extra': 0
+        }
+
+
+# --- REPORTE CONSOLIDADO MULTISUCURSAL ---
+@solo_lectura
+def get_reporte_consolidado(fecha_inicio=None, fecha_fin=None):
+    """
+    Reporte de ingresos y ocupación de todas las sucursales a la vez.
+    Cada sección es UNA consulta agrupada por sucursal (no un reporte por sucursal en un ciclo),
+    así el número de consultas no crece con el número de sucursales.
+    Las habitaciones sin sucursal asignada se agrupan con sucursal_id = None.
+    """
+    try:
+        R, A = _fuentes_rentas(*_rango_fechas(fecha_inicio, fecha_fin))
+        filtros = _filtros_renta(R, fecha_inicio, fecha_fin)
+
+        # 1. Ingresos y rentas por sucursal y tipo de habitación
+        ingresos = db.session.query(
+            Habitacion.sucursal_id,
+            Habitacion.tipo,
+            func.count(R.id),
+            func.sum(R.pago_final),
+            func.sum(R.pago_extra)
+        ).join(Habitacion, R.habitacion_id == Habitacion.id
+        ).filter(*filtros
+        ).group_by(Habitacion.sucursal_id, Habitacion.tipo).all()
+
+        # 2. Rentas por sucursal y modo de ingreso
+        modos = db.session.query(
+            Habitacion.sucursal_id,
+            A.modo_ingreso,
+            func.count(R.id)
+        ).join(A, R.id == A.renta_id
+        ).join(Habitacion, R.habitacion_id == Habitacion.id
+        ).filter(*filtros
+        ).group_by(Habitacion.sucursal_id, A.modo_ingreso).all()
+
+        # 3. Ocupación actual por sucursal y estado
+        ocupacion = db.session.query(
+            Habitacion.sucursal_id,
+            Habitacion.estado,
+            func.count(Habitacion.id)
+        ).group_by(Habitacion.sucursal_id, Habitacion.estado).all()
+
+        nombres = {s.id: s.nombre for s in Sucursal.query.all()}
+
+        # Fusión de las secciones en un diccionario por sucursal
+        sucursales = {}
+
+        def _seccion(sucursal_id):
+            if sucursal_id not in sucursales:
+                sucursales[sucursal_id] = {
+                    'sucursal_id': sucursal_id,
+                    'nombre': nombres.get(sucursal_id, 'Sin sucursal'),
+                    'ingresos_tipo': [],
+                    'rentas_modo': [],
+                    'total_rentas': 0,
+                    'total_ingreso': 0.0,
+                    'total_monto_extra': 0.0,
+                    'habitaciones': 0,
+                    'ocupadas': 0,
+                    'mantenimiento': 0,
+                    'ocupacion_porcentaje': 0.0
+                }
+            return sucursales[sucursal_id]
+
+        for sucursal_id, tipo, rentas, ingreso, extra in ingresos:
+            seccion = _seccion(sucursal_id)
+            seccion['ingresos_tipo'].append({'tipo': tipo.value, 'rentas': rentas, 'ingreso': float(ingreso) if ingreso else 0.0})
+            seccion['total_rentas'] += rentas
+            seccion['total_ingreso'] += float(ingreso) if ingreso else 0.0
+            seccion['total_monto_extra'] += float(extra) if extra else 0.0
+
+        for sucursal_id, modo, rentas in modos:
+            _seccion(sucursal_id)['rentas_modo'].append({'modo': modo.value, 'rentas': rentas})
+
+        for sucursal_id, estado, cantidad in ocupacion:
+            seccion = _seccion(sucursal_id)
+            seccion['habitaciones'] += cantidad
+            if estado == EstadoHabitacion.OCUPADA:
+                seccion['ocupadas'] += cantidad
+            elif estado == EstadoHabitacion.MANTENIMIENTO:
+                seccion['mantenimiento'] += cantidad
+
+        # La ocupación se mide sobre las habitaciones vendibles (sin las que están en mantenimiento)
+        for seccion in sucursales.values():
+            vendibles = seccion['habitaciones'] - seccion['mantenimiento']
+            if vendibles > 0:
+                seccion['ocupacion_porcentaje'] = round(seccion['ocupadas'] / vendibles * 100, 2)
+
+        lista = sorted(sucursales.values(), key=lambda s: (s['sucursal_id'] is None, s['nombre']))
+        total_habitaciones = sum(s['habitaciones'] for s in lista)
+        total_ocupadas = sum(s['ocupadas'] for s in lista)
+        total_mantenimiento = sum(s['mantenimiento'] for s in lista)
+        total_vendibles = total_habitaciones - total_mantenimiento
+
+        return {
+            'sucursales': lista,
+            'totales': {
+                'total_rentas': sum(s['total_rentas'] for s in lista),
+                'total_ingreso': sum(s['total_ingreso'] for s in lista),
+                'total_monto_extra': sum(s['total_monto_extra'] for s in lista),
+                'habitaciones': total_habitaciones,
+                'ocupadas': total_ocupadas,
+                'mantenimiento': total_mantenimiento,
+                'ocupacion_porcentaje': round(total_ocupadas / total_vendibles * 100, 2) if total_vendibles > 0 else 0.0
+            }
+        }
+
+    except Exception as e:
+        if leyendo_replica() and es_falla_conexion(e):
+            raise  # Réplica caída a mitad del reporte: @solo_lectura lo repite en la primaria
+        print(f"Error en get_reporte_consolidado: {e}")
+        return {'sucursales': [], 'totales': {}}
+
+
+# --- COMPARACIÓN ENTRE PERÍODOS ---
+MODOS_COMPARACION = ('anterior', 'anio_anterior')
+_METRICAS_COMPARACION = ('ingreso', 'rentas', 'ingreso_extra')
+
+
+def _variacion(actual, anterior):
+    return round((actual - anterior) / anterior * 100, 2) if anterior else 0
+
+
+@solo_lectura
+def get_comparacion_periodos(fecha_inicio, fecha_fin, modo='anterior', ventana=1, sucursal_id=None):
+    """
+    Compara ingreso, rentas e ingreso por horas extra de [fecha_inicio, fecha_fin] contra:
+    - 'anterior': el período inmediato anterior de la misma duración
+    - 'anio_anterior': el mismo período 364 días antes (52 semanas, conserva el día de la semana)
+    Con ventana > 1 cada punto de la serie es la suma móvil de los últimos 'ventana' días.
+
+    Ambos períodos salen de UNA consulta agrupada por día con agregación condicional
+    (SUM(CASE ...)) sobre las rentas cerradas. Regresa totales y una serie diaria alineada.
+    """
+    fecha_inicio_dt, fecha_fin_dt = _rango_fechas(fecha_inicio, fecha_fin)
+    if not fecha_inicio_dt:
+        raise ValueError("Se requieren fecha_inicio y fecha_fin con formato YYYY-MM-DD")
+    if modo not in MODOS_COMPARACION:
+        raise ValueError(f"Modo de comparación no soportado: {modo}")
+    ventana = max(1, int(ventana or 1))
+
+    dias = (fecha_fin_dt - fecha_inicio_dt).days
+    desplazamiento = timedelta(days=dias if modo == 'anterior' else 364)
+    extension = timedelta(days=ventana - 1)  # Días previos que necesita la suma móvil
+
+    actual = (fecha_inicio_dt - extension, fecha_fin_dt)
+    comparacion = (actual[0] - desplazamiento, actual[1] - desplazamiento)
+
+    R, _ = _fuentes_rentas(comparacion[0], actual[1])
+
+    def _en(periodo):
+        return (R.hora_entrada >= periodo[0]) & (R.hora_entrada < periodo[1])
+
+    def _suma(periodo, valor):
+        return func.sum(case((_en(periodo), valor), else_=0))
+
+    dia = func.date(R.hora_entrada)
+    filtros = [R.estado == 'CERRADA', _en(actual) | _en(comparacion)]
+    if sucursal_id is not None:
+        filtros.append(R.habitacion_id.in_(
+            db.session.query(Habitacion.id).filter(Habitacion.sucursal_id == sucursal_id)
+        ))
+
+    filas = db.session.query(
+        dia,
+        _suma(actual, func.coalesce(R.pago_final, 0)),
+        _suma(actual, 1),
+        _suma(actual, func.coalesce(R.pago_extra, 0)),
+        _suma(comparacion, func.coalesce(R.pago_final, 0)),
+        _suma(comparacion, 1),
+        _suma(comparacion, func.coalesce(R.pago_extra, 0))
+    ).filter(*filtros).group_by(dia).all()
+
+    # Valores diarios indexados por día relativo al inicio de cada período (incluye la extensión)
+    total_dias = dias + ventana - 1
+    valores = {'actual': [[0.0] * 3 for _ in range(total_dias)],
+               'comparacion': [[0.0] * 3 for _ in range(total_dias)]}
+    for fila in filas:
+        # func.date regresa 'YYYY-MM-DD' en SQLite y un date en MySQL
+        fecha = datetime.strptime(str(fila[0])[:10], '%Y-%m-%d')
+        for clave, periodo, metricas in (('actual', actual, fila[1:4]), ('comparacion', comparacion, fila[4:7])):
+            indice = (fecha - periodo[0]).days
+            if 0 <= indice < total_dias:
+                for m, valor in enumerate(metricas):
+                    valores[clave][indice][m] += float(valor or 0)
+
+    def _punto(serie, indice):
+        inicio = indice - ventana + 1
+        punto = {nombre: round(sum(serie[k][m] for k in range(inicio, indice + 1)), 2)
+                 for m, nombre in enumerate(_METRICAS_COMPARACION)}
+        punto['rentas'] = int(punto['rentas'])
+        return punto
+
+    puntos = []
+    for i in range(ventana - 1, total_dias):
+        puntos.append({
+            'fecha': (actual[0] + timedelta(days=i)).strftime('%Y-%m-%d'),
+            'fecha_comparacion': (comparacion[0] + timedelta(days=i)).strftime('%Y-%m-%d'),
+            'actual': _punto(valores['actual'], i),
+            'comparacion': _punto(valores['comparacion'], i)
+        })
+
+    def _totales(serie):
+        return {nombre: round(sum(dia_valores[m] for dia_valores in serie[ventana - 1:]), 2)
+                for m, nombre in enumerate(_METRICAS_COMPARACION)}
+
+    totales_actual = _totales(valores['actual'])
+    totales_comparacion = _totales(valores['comparacion'])
+    for totales in (totales_actual, totales_comparacion):
+        totales['rentas'] = int(totales['rentas'])
+
+    return {
+        'modo': modo,
+        'ventana_dias': ventana,
+        'periodo_actual': {'inicio': fecha_inicio_dt.strftime('%Y-%m-%d'),
+                           'fin': (fecha_fin_dt - timedelta(days=1)).strftime('%Y-%m-%d')},
+        'periodo_comparacion': {'inicio': (fecha_inicio_dt - desplazamiento).strftime('%Y-%m-%d'),
+                                'fin': (fecha_fin_dt - desplazamiento - timedelta(days=1)).strftime('%Y-%m-%d')},
+        'totales': {
+            'actual': totales_actual,
+            'comparacion': totales_comparacion,
+            'variacion_porcentaje': {nombre: _variacion(totales_actual[nombre], totales_comparacion[nombre])
+                                     for nombre in _METRICAS_COMPARACION}
+        },
+        'serie': puntos
+    }
+
+
+# --- MÉTRICAS COMPARATIVAS DE LA PANTALLA DE REPORTES ---
+@solo_lectura
+def get_metricas_comparativas(fecha_inicio=None, fecha_fin=None):
+    """Ventas del período filtrado contra el período inmediato anterior de la misma duración"""
+    
+    try:
+        # Si no hay fechas, no calcular métricas comparativas
+        if not fecha_inicio or not fecha_fin:
+            return {
+                'ventas_actual': 0,
+                'ventas_anterior': 0,
+                'variacion_porcentaje': 0,
+                'periodo_actual': 'Sin filtros aplicados',
+                'periodo_anterior': 'Selecciona un período'
+            }
+
+        comparacion = get_comparacion_periodos(fecha_inicio, fecha_fin, modo='anterior')
+        totales = comparacion['totales']
+        anterior = comparacion['periodo_comparacion']
+
+        return {
+            'ventas_actual': totales['actual']['ingreso'],
+            'ventas_anterior': totales['comparacion']['ingreso'],
+            'variacion_porcentaje': totales['variacion_porcentaje']['ingreso'],
+            'periodo_actual': f"{fecha_inicio} a {fecha_fin}",
+            'periodo_anterior': f"{anterior['inicio']} a {anterior['fin']}"
+        }
+        
+    except Exception as e:
+        if leyendo_replica() and es_falla_conexion(e):
+            raise  # Réplica caída a mitad del reporte: @solo_lectura lo repite en la primaria
+        print(f"Error en get_metricas_comparativas: {e}")
+        return {
+            'ventas_actual': 0,
+            'ventas_anterior': 0,
+            'variacion_porcentaje': 0,
+            'periodo_actual': 'Error en cálculo',
+            'periodo_anterior': 'Error en cálculo'
+        }
+
+
+# --- FUNCIONES DE SOPORTE PARA EL DASHBOARD ---
+
+@solo_lectura
+def get_daily_activity_data():
+    """Obtiene datos para la gráfica de actividad del día (desde la tabla materializada actividad_horaria)"""
+    filas = ActividadHora.query.filter(ActividadHora.fecha == date.today()).all()
+
+    return {
+        'checkins': {f.hora: f.checkins for f in filas if f.checkins},
+        'checkouts': {f.hora: f.checkouts for f in filas if f.checkouts},
+        'ingresos': {f.hora: f.ingreso for f in filas if f.ingreso}
+    }
+
+
+@solo_lectura
+def get_actividad_por_hora(fecha_inicio=None, fecha_fin=None):
+    """
+    Actividad acumulada por hora del día (0..23) en un rango de fechas 'YYYY-MM-DD'.
+    Suma renglones ya agregados de actividad_horaria (24 por día), no rentas.
+    """
+    fecha_inicio_dt, fecha_fin_dt = _rango_fechas(fecha_inicio, fecha_fin)
+
+    consulta = db.session.query(
+        ActividadHora.hora,
+        func.sum(ActividadHora.checkins),
+        func.sum(ActividadHora.checkouts),
+        func.sum(ActividadHora.ingreso)
+    )
+    if fecha_inicio_dt:
+        consulta = consulta.filter(ActividadHora.fecha >= fecha_inicio_dt.date(),
+                                   ActividadHora.fecha < fecha_fin_dt.date())
+    totales = {hora: (checkins, checkouts, ingreso) for hora, checkins, checkouts, ingreso
+               in consulta.group_by(ActividadHora.hora).all()}
+
+    return [{
+        'hora': hora,
+        'checkins': int(totales.get(hora, (0, 0, 0))[0] or 0),
+        'checkouts': int(totales.get(hora, (0, 0, 0))[1] or 0),
+        'ingreso': float(totales.get(hora, (0, 0, 0))[2] or 0.0)
+    } for hora in range(24)]
+
+def get_room_distribution():
+    """Obtiene la distribución REAL de habitaciones (desde la caché de estado)"""
+    conteo = cache_habitaciones.contar_por_estado()
+    
+    return {
+        'ocupadas': conteo.get(EstadoHabitacion.OCUPADA, 0),
+        'disponibles': conteo.get(EstadoHabitacion.DISPONIBLE, 0),
+        'limpieza': conteo.get(EstadoHabitacion.LIMPIEZA, 0),
+        'mantenimiento': conteo.get(EstadoHabitacion.MANTENIMIENTO, 0),
+        'total': sum(conteo.values())
+    }
+
+
+# --- RESUMEN DIARIO ---
+def get_daily_summary():
+    today = datetime.combine(date.today(), datetime.min.time())
+
+    # Una sola consulta agregada sobre el índice de hora_entrada (los días pasados quedan en cierres_diarios)
+    total_clientes, total_ingreso_inicial, total_horas_rentadas = db.session.query(
+        func.count(Renta.id), func.coalesce(func.sum(Renta.pago_horas), 0), func.coalesce(func.sum(Renta.horas_reservadas), 0)
+    ).filter(Renta.hora_entrada >= today).one()
+
+    conteo = cache_habitaciones.contar_por_estado()
+
+    return {
+        'clientes_dia': total_clientes,
+        'ingreso_inicial_dia': total_ingreso_inicial,
+        'horas_totales_dia': total_horas_rentadas,
+        'ocupadas': conteo.get(EstadoHabitacion.OCUPADA, 0),
+        'disponibles': conteo.get(EstadoHabitacion.DISPONIBLE, 0),
+        'total_habitaciones': sum(conteo.values())
+    }
@@ -0,0 +1,113 @@
+"""
+Versión de la ocupación para sincronización incremental de /api/habitaciones_activas.
+
+Un contador monotónico en la tabla contador_cambios ('ocupacion') se incrementa en cada
+flush que crea o modifica rentas (evento before_flush, así que checkin, checkout,
+reservas y cualquier otro handler quedan cubiertos) y su nuevo valor se guarda en
+Renta.version_cambio de las rentas afectadas. Las actualizaciones por conjunto que no
+pasan por el ORM (operaciones masivas) piden la versión con siguiente_version().
+
+Los clientes guardan la versión recibida y piden ?since=<version>: solo reciben las
+rentas cambiadas desde entonces (activas con horas crudas para calcular la cuenta
+regresiva localmente, y los ids de las que se cerraron). La versión también es el ETag:
+con If-None-Match igual a la versión actual la respuesta es 304 sin consultar rentas.
+"""
+from datetime import datetime
+
+from sqlalchemy import event, func, select, update, insert
+from sqlalchemy.orm import Session
+
+from models import db, Renta, RegistroAcceso, ContadorCambios
+from cache_habitaciones import cache_habitaciones
+
+CONTADOR_OCUPACION = 'ocupacion'
+CONTADOR_VENCIMIENTOS = 'vencimientos'  # Avisos POR_VENCER / VENCIDA publicados (ver vencimientos.py)
+
+
+def incrementar_contador(conexion, nombre):
+    """Incrementa el contador dentro de la transacción de 'conexion' y regresa el nuevo valor"""
+    tabla = ContadorCambios.__table__
+    resultado = conexion.execute(update(tabla).where(tabla.c.nombre == nombre).values(valor=tabla.c.valor + 1))
+    if resultado.rowcount == 0:
+        conexion.execute(insert(tabla).values(nombre=nombre, valor=1))
+        return 1
+    return conexion.execute(select(tabla.c.valor).where(tabla.c.nombre == nombre)).scalar()
+
+
+def siguiente_version(session, nombre=CONTADOR_OCUPACION):
+    """Incrementa el contador dentro de la transacción de 'session' y regresa el nuevo valor"""
+    return incrementar_contador(session.connection(), nombre)
+
+
+def version_actual(nombre=CONTADOR_OCUPACION):
+    return db.session.query(ContadorCambios.valor).filter(ContadorCambios.nombre == nombre).scalar() or 0
+
+
+def version_pantallas():
+    """
+    Versión de lo que muestran las pantallas en vivo (rentas activas y avisos de vencimiento):
+    suma de dos contadores monotónicos, así que es la misma en todos los workers y solo
+    cambia cuando se escribe algo, no con el paso del tiempo.
+    """
+    return db.session.query(func.coalesce(func.sum(ContadorCambios.valor), 0)).filter(
+        ContadorCambios.nombre.in_((CONTADOR_OCUPACION, CONTADOR_VENCIMIENTOS))).scalar()
+
+
+@event.listens_for(Session, 'before_flush')
+def _marcar_rentas(session, flush_context, instances):
+    rentas = [obj for obj in list(session.new) + list(session.dirty)
+              if isinstance(obj, Renta) and (obj in session.new or session.is_modified(obj))]
+    if not rentas:
+        return
+    version = siguiente_version(session)
+    for renta in rentas:
+        renta.version_cambio = version
+
+
+def _iso(instante):
+    return instante.isoformat() if instante else None
+
+
+def cambios_desde(since):
+    """
+    Rentas activas cambiadas después de 'since' (todas si since es 0 o posterior a la versión
+    actual, p. ej. tras restaurar la base de datos) y los ids de las que se cerraron.
+    """
+    version = version_actual()
+    completo = since <= 0 or since > version
+
+    consulta = Renta.query
+    if completo:
+        consulta = consulta.filter(Renta.estado == 'ACTIVA')
+    else:
+        consulta = consulta.filter(Renta.version_cambio > since)
+    rentas = consulta.all()
+
+    activas = [r for r in rentas if r.estado == 'ACTIVA']
+    placas = dict(db.session.query(RegistroAcceso.renta_id, RegistroAcceso.placas).filter(
+        RegistroAcceso.renta_id.in_([r.id for r in activas])
+    ).all()) if activas else {}
+
+    def _habitacion(renta):
+        # Número y tipo desde la caché de habitaciones (sin una consulta por renta)
+        return cache_habitaciones.obtener(renta.habitacion_id) or renta.habitacion
+
+    return {
+        'version': version,
+        'completo': completo,
+        'ahora': _iso(datetime.now()),  # Para corregir el desfase del reloj del cliente
+        'rentas': [{
+            'renta_id': r.id,
+            'habitacion_id': r.habitacion_id,
+            'numero': _habitacion(r).numero,
+            'tipo': _habitacion(r).tipo.value,
+            'cliente': r.cliente_nombre,
+            'placas': placas.get(r.id) or 'N/A',
+            'hora_entrada': _iso(r.hora_entrada),
+            'hora_salida_estimada': _iso(r.hora_salida_estimada),
+            'pago_inicial': r.pago_horas,
+            'precio_hora': r.precio_hora,
+            'version': r.version_cambio
+        } for r in activas],
+        'cerradas': [r.id for r in rentas if r.estado != 'ACTIVA']
+    }
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import asgi
+from asgi import Difusor
+from models import db, Renta
+from conftest import crear_renta
+
+
+def test_version_no_cambia_sin_escrituras(app, monkeypatch):
+    # Una renta vencida: las horas extra cambian con el reloj, la versión no
+    crear_renta(entrada=datetime.now() - timedelta(hours=3), horas=2)
+    difusor = Difusor(app)
+    version, (datos, _) = difusor._consultar(None)
+    assert datos[0]['es_hora_extra']
+
+    for _ in range(3):
+        assert difusor._consultar(version) == (version, None)
+
+    renta = Renta.query.one()
+    renta.cliente_nombre = 'Otro'
+    db.session.commit()
+    assert difusor._consultar(version)[0] > version
+
+
+def test_version_compartida_entre_workers(app):
+    crear_renta()
+    worker_a, worker_b = Difusor(app), Difusor(app)
+    assert worker_a._consultar(None)[0] == worker_b._consultar(None)[0]
+
+
+def test_datos_refrescan_el_tiempo_restante(app):
+    crear_renta(horas=2)
+    difusor = Difusor(app)
+    difusor.version, (difusor._datos, difusor._salidas) = difusor._consultar(None)
+    salida, vencida = next(iter(difusor._salidas.values()))
+    difusor._salidas = {k: (salida - timedelta(minutes=90), vencida) for k in difusor._salidas}
+    assert difusor.datos[0]['tiempo_restante'].startswith('0h ')
+
+
+def test_longpoll_no_regresa_en_seguida_con_version_de_otro_worker(app, monkeypatch):
+    monkeypatch.setattr(asgi, 'INTERVALO_SEGUNDOS', 0.01)
+    crear_renta()
+    difusor = Difusor(app)
+
+    async def _escenario():
+        version, _ = await difusor.esperar_cambio(-1, 1)
+        inicio = asyncio.get_running_loop().time()
+        # Versión del cliente igual o más nueva que la de este proceso: espera el tiempo completo
+        assert (await difusor.esperar_cambio(version, 0.2))[0] == version
+        assert (await difusor.esperar_cambio(version + 5, 0.2))[0] == version
+        assert asyncio.get_running_loop().time() - inicio >= 0.4
+        # Versión vieja: responde de inmediato
+        inicio = asyncio.get_running_loop().time()
+        assert (await difusor.esperar_cambio(version - 1, 5))[0] == version
+        assert asyncio.get_running_loop().time() - inicio < 1
+        await asyncio.sleep(0.05)
+
+    asyncio.run(_escenario())
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import db, Habitacion, EstadoHabitacion, EventoEstado
+from bitacora import estado_en
+from conftest import crear_renta
+
+
+def _eventos(habitacion_id):
+    # Sin el alta de las habitaciones del fixture
+    return [(e.entidad, e.estado_anterior, e.estado_nuevo) for e in
+            EventoEstado.query.filter_by(habitacion_id=habitacion_id).order_by(EventoEstado.id)
+            if e.estado_anterior is not None or e.entidad != 'HABITACION']
+
+
+def test_eventos_se_confirman_con_el_cambio(app):
+    renta = crear_renta('101')
+
+    # Sin hilos ni búfer: al confirmar el check-in sus eventos ya están en la tabla
+    assert _eventos(renta.habitacion_id) == [('RENTA', None, 'ACTIVA'), ('HABITACION', 'DISPONIBLE', 'OCUPADA')]
+    assert estado_en(datetime.now(), renta.habitacion_id)[renta.habitacion_id]['renta_id'] == renta.id
+
+
+def test_rollback_descarta_los_eventos(app):
+    habitacion = Habitacion.query.filter_by(numero='102').one()
+    habitacion.estado = EstadoHabitacion.MANTENIMIENTO
+    db.session.flush()
+    assert _eventos(habitacion.id) == []  # en el búfer de la sesión hasta el commit
+
+    db.session.rollback()
+    db.session.commit()
+    assert _eventos(habitacion.id) == []
+
+
+def test_un_insert_por_transaccion(app):
+    inserciones = []
+
+    def _contar(conn, cursor, statement, parametros, context, executemany):
+        if statement.startswith('INSERT INTO bitacora_eventos'):
+            inserciones.append(len(parametros) if executemany else 1)
+
+    event.listen(db.engine, 'before_cursor_execute', _contar)
+    try:
+        for numero in ('101', '102', '103'):
+            Habitacion.query.filter_by(numero=numero).one().estado = EstadoHabitacion.MANTENIMIENTO
+            db.session.flush()
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _contar)
+
+    assert inserciones == [3]
+    assert EventoEstado.query.filter_by(estado_nuevo='MANTENIMIENTO').count() == 3
@@ -0,0 +1,81 @@
+import time
+from datetime import datetime, timedelta, date
+
+from cache_reportes import CacheReportes
+from models import db, Renta
+from conftest import crear_renta
+
+AYER = datetime.combine(date.today() - timedelta(days=1), datetime.min.time())
+HOY = AYER + timedelta(days=1)
+
+
+class Contador:
+    def __init__(self):
+        self.llamadas = 0
+
+    def __call__(self):
+        self.llamadas += 1
+        return self.llamadas
+
+
+def test_rango_cerrado_invalidado_por_otro_worker(app):
+    renta = crear_renta(entrada=AYER + timedelta(hours=22), horas=4)
+    worker_a = CacheReportes(intervalo_verificacion=0)
+    calcular = Contador()
+
+    assert worker_a.obtener('ingresos_tipo', AYER, HOY, None, calcular) == 1
+    assert worker_a.obtener('ingresos_tipo', AYER, HOY, None, calcular) == 1
+
+    # Check-out en "otro worker": solo llega por la generación compartida en la base de datos
+    renta = db.session.get(Renta, renta.id)
+    renta.estado = 'CERRADA'
+    renta.hora_salida_real = datetime.now()
+    db.session.commit()
+
+    assert worker_a.obtener('ingresos_tipo', AYER, HOY, None, calcular) == 2
+
+
+def test_checkout_de_hoy_no_vacia_rangos_cerrados(app):
+    renta = crear_renta(entrada=datetime.now() - timedelta(minutes=30))
+    worker_a = CacheReportes(intervalo_verificacion=0)
+    calcular = Contador()
+    worker_a.obtener('ingresos_tipo', AYER, HOY, None, calcular)
+
+    renta.estado = 'CERRADA'
+    renta.hora_salida_real = datetime.now()
+    db.session.commit()
+
+    assert worker_a.obtener('ingresos_tipo', AYER, HOY, None, calcular) == 1
+
+
+def test_invalidacion_durante_el_calculo_no_se_guarda(app):
+    cache = CacheReportes(intervalo_verificacion=3600)
+    llamadas = []
+
+    def _calcular():
+        llamadas.append(1)
+        if len(llamadas) == 1:
+            cache.invalidar_fecha(AYER + timedelta(hours=3))  # Commit concurrente
+        return len(llamadas)
+
+    assert cache.obtener('ingresos_tipo', AYER, HOY, None, _calcular) == 1
+    assert cache.obtener('ingresos_tipo', AYER, HOY, None, _calcular) == 2
+    assert cache.obtener('ingresos_tipo', AYER, HOY, None, _calcular) == 2
+
+
+def test_rangos_cerrados_expiran(app):
+    cache = CacheReportes(ttl_cerrados=0.05, intervalo_verificacion=3600)
+    calcular = Contador()
+    cache.obtener('ingresos_tipo', AYER, HOY, None, calcular)
+    time.sleep(0.06)
+    assert cache.obtener('ingresos_tipo', AYER, HOY, None, calcular) == 2
+
+
+def test_archivado_marca_la_generacion(app):
+    from archivo import archivar_rentas
+    from sincronizacion import version_actual
+    crear_renta(entrada=datetime.now() - timedelta(days=400), horas=2, estado='CERRADA',
+                salida=datetime.now() - timedelta(days=400) + timedelta(hours=2))
+    antes = version_actual('reportes')
+    assert archivar_rentas(180) == 1
+    assert version_actual('reportes') == antes + 1
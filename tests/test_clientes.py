@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+
+from archivo import archivar_rentas
+from clientes import historial
+from models import db, Renta, RentaArchivo
+from conftest import crear_renta
+
+
+def test_historial_une_activas_y_archivadas(app):
+    ahora = datetime.now()
+    antigua = crear_renta('101', entrada=ahora - timedelta(days=400), estado='CERRADA', salida=ahora - timedelta(days=400))
+    reciente = crear_renta('102', entrada=ahora - timedelta(days=1), estado='CERRADA', salida=ahora - timedelta(days=1))
+    activa = crear_renta('103')
+    ids = [activa.id, reciente.id, antigua.id]
+    cliente_id = db.session.get(Renta, activa.id).cliente_id
+    assert archivar_rentas(horizonte_dias=30) >= 1
+    assert RentaArchivo.query.filter_by(id=ids[2]).count() == 1
+
+    assert [r['renta_id'] for r in historial(cliente_id)] == ids
+    assert [r['renta_id'] for r in historial(cliente_id, limite=2)] == ids[:2]
+    assert historial(cliente_id + 1000) == []
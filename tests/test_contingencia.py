@@ -0,0 +1,104 @@
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import contingencia
+from contingencia import DiarioContingencia, es_falla_conexion, APLICADA, CHECKIN
+from models import db, Renta, Habitacion, EstadoHabitacion
+
+
+class ErrorMySQL(Exception):
+    pass
+
+
+def _operational(codigo, mensaje='', invalidada=False):
+    return OperationalError('SELECT 1', {}, ErrorMySQL(codigo, mensaje), connection_invalidated=invalidada)
+
+
+@pytest.mark.parametrize('codigo', [2002, 2003, 2006, 2013])
+def test_desconexiones_mysql_son_caida(codigo):
+    assert es_falla_conexion(_operational(codigo))
+
+
+@pytest.mark.parametrize('codigo', [1213, 1205])
+def test_deadlock_y_espera_de_candado_no_son_caida(codigo):
+    assert not es_falla_conexion(_operational(codigo, 'Deadlock found'))
+    assert es_falla_conexion(_operational(codigo, invalidada=True))
+
+
+def test_sqlite_bloqueada_no_es_caida(tmp_path):
+    ruta = str(tmp_path / 'bloqueada.db')
+    escritor = sqlite3.connect(ruta)
+    escritor.execute('CREATE TABLE t (x)')
+    escritor.execute('BEGIN EXCLUSIVE')
+    lector = sqlite3.connect(ruta, timeout=0)
+    with pytest.raises(sqlite3.OperationalError) as bloqueo:
+        lector.execute('SELECT * FROM t')
+    assert not es_falla_conexion(OperationalError('SELECT', {}, bloqueo.value))
+
+    with pytest.raises(sqlite3.OperationalError) as sin_archivo:
+        sqlite3.connect(str(tmp_path / 'no' / 'existe.db'))
+    assert es_falla_conexion(OperationalError('SELECT', {}, sin_archivo.value))
+
+
+@pytest.fixture
+def disponible(monkeypatch):
+    habitacion = SimpleNamespace(id=1, numero='101', estado=EstadoHabitacion.DISPONIBLE, activa=True)
+    from cache_habitaciones import cache_habitaciones
+    monkeypatch.setattr(cache_habitaciones, 'obtener', lambda habitacion_id: habitacion)
+    return habitacion
+
+
+def test_reproduccion_reconoce_operacion_ya_aplicada(app, tmp_path, disponible):
+    diario = DiarioContingencia()
+    diario.abrir(str(tmp_path / 'diario.jsonl'))
+    renglon, _ = diario.registrar_checkin(1, 2, 'Sin red', 'A_PIE', None, 1)
+    assert '.' not in renglon['registrado_at']  # Segundos enteros, como DATETIME de MySQL
+
+    # Se cae entre el commit y el renglón de resultado
+    assert diario._aplicar(renglon)[0] == APLICADA
+    assert diario.reproducir() == {'aplicadas': 1, 'conflictos': 0, 'pendientes': 0}
+    assert diario._resultados[renglon['id']]['detalle'] == 'Ya estaba aplicada'
+    assert Renta.query.count() == 1
+
+
+def _lento(pendientes):
+    # Ensancha la ventana entre validar contra los pendientes y anexar
+    def _pendientes():
+        resultado = pendientes()
+        time.sleep(0.02)
+        return resultado
+    return _pendientes
+
+
+def test_checkin_simultaneo_en_dos_workers(app, tmp_path, disponible):
+    ruta = str(tmp_path / 'diario.jsonl')
+    for _ in range(5):
+        open(ruta, 'w').close()
+        # Dos instancias con el mismo archivo: dos procesos con sus propios candados en memoria
+        workers = [DiarioContingencia(), DiarioContingencia()]
+        for diario in workers:
+            diario.abrir(ruta)
+            diario.pendientes = _lento(diario.pendientes)
+        barrera = threading.Barrier(2)
+        resultados = []
+
+        def _registrar(diario):
+            barrera.wait()
+            try:
+                diario.registrar_checkin(1, 2, 'Doble', 'A_PIE', None, 1)
+                resultados.append('ok')
+            except ValueError:
+                resultados.append('rechazado')
+
+        hilos = [threading.Thread(target=_registrar, args=(d,)) for d in workers]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        assert sorted(resultados) == ['ok', 'rechazado']
+        assert len([op for op in workers[0].pendientes() if op['tipo'] == CHECKIN]) == 1
@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from flask import flash, redirect
+
+import idempotencia
+from models import db, Renta, Habitacion, EstadoHabitacion, ClaveIdempotencia
+from conftest import crear_app
+
+HILOS = 8
+RETRASO = 1.0  # segundos que tarda el envío original en registrar su resultado
+
+
+def _checkin(cliente, clave):
+    return cliente.post('/checkin', data={'habitacion_id': 1, 'horas_reservadas': 2, 'nombre_cliente': 'Doble Clic',
+                                          'modo_ingreso': 'A_PIE', 'idempotency_key': clave})
+
+
+def _cliente(app):
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'admin', 'password': '1234'})
+    return cliente
+
+
+@pytest.fixture
+def app_archivo(tmp_path):
+    # Archivo SQLite (no en memoria): cada hilo usa su propia conexión, como workers reales
+    app = crear_app(f"sqlite:///{tmp_path / 'idempotencia.db'}")
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_envios_duplicados_en_paralelo(app_archivo, monkeypatch):
+    # La vista tarda en registrar su resultado: los duplicados llegan mientras sigue EN_PROCESO
+    completar = idempotencia._completar
+    monkeypatch.setattr(idempotencia, '_completar', lambda *a: (time.sleep(RETRASO), completar(*a)))
+
+    clientes = [_cliente(app_archivo) for _ in range(HILOS)]
+    barrera = threading.Barrier(HILOS)
+    respuestas = [None] * HILOS
+
+    def enviar(indice):
+        barrera.wait()
+        inicio = time.monotonic()
+        respuesta = _checkin(clientes[indice], 'clave-doble-clic')
+        respuestas[indice] = (respuesta.status_code, respuesta.headers.get('Location'), time.monotonic() - inicio)
+
+    hilos = [threading.Thread(target=enviar, args=(i,)) for i in range(HILOS)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    with app_archivo.app_context():
+        assert Renta.query.filter_by(cliente_nombre='Doble Clic').count() == 1
+
+    redirecciones = [r for r in respuestas if r[0] == 302]
+    en_proceso = [r for r in respuestas if r[0] == 409]
+    assert len(redirecciones) + len(en_proceso) == HILOS
+    assert en_proceso, "ningún duplicado llegó mientras el primero seguía en proceso"
+    # Nadie espera al envío original: los 409 responden antes de que éste termine
+    assert all(duracion < RETRASO for _, _, duracion in en_proceso)
+    # Todas las redirecciones son el resultado original (dashboard), no "habitación no disponible"
+    assert all(location.endswith('/dashboard') for _, location, _ in redirecciones)
+
+    # El reintento del cliente recibe el resultado original
+    reintento = _checkin(clientes[0], 'clave-doble-clic')
+    assert reintento.status_code == 302 and reintento.headers['Location'].endswith('/dashboard')
+
+
+def test_clave_en_proceso_responde_409(cliente):
+    clave = hashlib.sha1('en-curso|/checkin|1'.encode('utf-8')).hexdigest()
+    db.session.add(ClaveIdempotencia(clave=clave, estado=idempotencia.EN_PROCESO,
+                                     expira_at=datetime.now() + timedelta(hours=1)))
+    db.session.commit()
+
+    respuesta = _checkin(cliente, 'en-curso')
+
+    assert respuesta.status_code == 409
+    assert respuesta.headers['Retry-After'] == str(idempotencia.REINTENTAR_SEGUNDOS)
+    assert Renta.query.count() == 0
+
+
+def test_error_transitorio_no_se_repite(cliente):
+    habitacion = db.session.get(Habitacion, 1)
+    habitacion.estado = EstadoHabitacion.LIMPIEZA  # momentáneamente no disponible
+    db.session.commit()
+
+    primero = _checkin(cliente, 'clave-reintento')
+    assert primero.status_code == 302 and primero.headers['Location'].endswith('/checkin')
+    assert db.session.get(ClaveIdempotencia, hashlib.sha1('clave-reintento|/checkin|1'.encode()).hexdigest()) is None
+
+    habitacion.estado = EstadoHabitacion.DISPONIBLE
+    db.session.commit()
+    idempotencia.cache_respuestas.limpiar()
+
+    reintento = _checkin(cliente, 'clave-reintento')
+    assert reintento.status_code == 302 and reintento.headers['Location'].endswith('/dashboard')
+    assert Renta.query.filter_by(cliente_nombre='Doble Clic').count() == 1
+    # Ya completada: un tercer envío repite el éxito sin otra renta
+    assert _checkin(cliente, 'clave-reintento').headers['Location'].endswith('/dashboard')
+    assert Renta.query.filter_by(cliente_nombre='Doble Clic').count() == 1
+
+
+def test_rollback_libera_la_clave(app):
+    # Vista que deshace su transacción aunque redirija sin mensaje de error
+    @idempotencia.idempotente
+    def vista_con_rollback():
+        db.session.rollback()
+        flash('Listo', 'success')
+        return redirect('/dashboard')
+
+    app.add_url_rule('/prueba-rollback', 'prueba_rollback', vista_con_rollback, methods=['POST'])
+    cliente = _cliente(app)
+    respuesta = cliente.post('/prueba-rollback', data={'idempotency_key': 'clave-rollback'})
+
+    assert respuesta.status_code == 302
+    assert ClaveIdempotencia.query.count() == 0
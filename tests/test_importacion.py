@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from archivo import archivar_rentas
+from cache_reportes import cache_reportes
+from importacion import importar
+from models import db, Renta, RentaArchivo
+from sincronizacion import version_actual
+from conftest import crear_renta
+
+
+def _csv(ruta, filas):
+    ruta.write_text('habitacion,entrada,salida\n' + ''.join(
+        f"{numero},{entrada:%Y-%m-%d %H:%M:%S},{salida:%Y-%m-%d %H:%M:%S}\n" for numero, entrada, salida in filas
+    ), encoding='utf-8')
+    return str(ruta)
+
+
+def test_no_duplica_rentas_archivadas(app, tmp_path):
+    entrada = (datetime.now() - timedelta(days=400)).replace(microsecond=0)
+    crear_renta('101', entrada=entrada, estado='CERRADA', salida=entrada + timedelta(hours=2))
+    assert archivar_rentas(horizonte_dias=30) == 1
+
+    ruta = _csv(tmp_path / 'rentas.csv', [('101', entrada, entrada + timedelta(hours=2)),
+                                          ('102', entrada, entrada + timedelta(hours=3))])
+    resumen = importar(ruta, derivados=False)
+
+    assert (resumen['insertadas'], resumen['duplicadas']) == (1, 1)
+    assert Renta.query.count() + RentaArchivo.query.count() == 2
+
+
+def test_importacion_invalida_reportes_del_rango(app, tmp_path, monkeypatch):
+    # Solo la invalidación local por rango (la generación compartida vaciaría todo al verificarse)
+    monkeypatch.setattr(cache_reportes, 'intervalo_verificacion', 3600)
+    ayer = (datetime.now() - timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+    inicio, fin = ayer.replace(hour=0), ayer.replace(hour=23, minute=59)
+    otro_dia = inicio - timedelta(days=10), fin - timedelta(days=10)
+    llamadas = []
+
+    def calcular():
+        llamadas.append(1)
+        return len(llamadas)
+
+    cache_reportes.obtener('ingresos_tipo', inicio, fin, None, calcular)
+    cache_reportes.obtener('ingresos_tipo', *otro_dia, None, calcular)
+    generacion = version_actual('reportes')
+
+    importar(_csv(tmp_path / 'rentas.csv', [('101', ayer, ayer + timedelta(hours=2))]), derivados=False)
+
+    assert version_actual('reportes') == generacion + 1  # Los demás workers lo ven por la base de datos
+    assert cache_reportes.obtener('ingresos_tipo', inicio, fin, None, calcular) == 3
+    assert cache_reportes.obtener('ingresos_tipo', *otro_dia, None, calcular) == 2
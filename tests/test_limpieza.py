@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import limpieza
+from controllers.room_controller import check_auto_clean_complete
+from models import db, Habitacion, Renta, EstadoHabitacion, TareaLimpieza, EstadisticaLimpieza
+from pronostico import hora_semana
+from conftest import crear_renta
+
+
+def _checkout(renta_id, salida):
+    renta = db.session.get(Renta, renta_id)
+    renta.estado = 'CERRADA'
+    renta.hora_salida_real = salida
+    db.session.get(Habitacion, renta.habitacion_id).estado = EstadoHabitacion.LIMPIEZA
+    db.session.commit()
+    return renta.habitacion_id
+
+
+def _abiertas(habitacion_id):
+    return TareaLimpieza.query.filter(TareaLimpieza.habitacion_id == habitacion_id,
+                                      TareaLimpieza.estado.in_(limpieza.ABIERTAS)).count()
+
+
+def test_una_sola_tarea_abierta_por_habitacion(app):
+    habitacion = Habitacion.query.filter_by(numero='101').one()
+    habitacion.estado = EstadoHabitacion.LIMPIEZA
+    db.session.commit()
+    assert _abiertas(habitacion.id) == 1
+
+    # Otra ruta (o una consulta concurrente de la cola) intenta crearla de nuevo
+    limpieza.crear_tareas(db.session, [(habitacion.id, None)])
+    db.session.commit()
+    limpieza.cola_limpieza()
+    limpieza.cola_limpieza()
+    assert _abiertas(habitacion.id) == 1
+
+
+def test_cola_no_escribe_y_faltantes_se_crean_una_vez(app):
+    habitacion = Habitacion.query.filter_by(numero='102').one()
+    db.session.execute(db.update(Habitacion).where(Habitacion.id == habitacion.id)
+                       .values(estado=EstadoHabitacion.LIMPIEZA))
+    db.session.commit()
+
+    # Consultar la cola (GET) no crea tareas
+    assert limpieza.cola_limpieza() == []
+    assert _abiertas(habitacion.id) == 0
+
+    assert limpieza.crear_tareas_faltantes() == 1
+    assert limpieza.crear_tareas_faltantes() == 0
+    assert [t['numero'] for t in limpieza.cola_limpieza()] == ['102']
+    assert _abiertas(habitacion.id) == 1
+
+
+def test_barrido_respeta_tareas_tomadas(cliente):
+    renta = crear_renta(entrada=datetime.now() - timedelta(hours=2))
+    habitacion_id = _checkout(renta.id, datetime.now() - timedelta(minutes=5))
+    tarea_id = limpieza.tomar_siguiente('Ana')
+    assert tarea_id is not None
+
+    # El dashboard y el sondeo de la API ejecutan el barrido: la habitación tomada sigue en la cola
+    cliente.get('/dashboard')
+    cliente.get('/api/habitaciones_activas')
+    check_auto_clean_complete()
+    db.session.expire_all()
+    assert db.session.get(Habitacion, habitacion_id).estado == EstadoHabitacion.LIMPIEZA
+    assert [(t['tarea_id'], t['estado'], t['asignada_a']) for t in limpieza.cola_limpieza()] == \
+        [(tarea_id, limpieza.EN_CURSO, 'Ana')]
+
+    assert limpieza.terminar(tarea_id) is not None
+    tarea = db.session.get(TareaLimpieza, tarea_id)
+    assert tarea.estado == limpieza.TERMINADA and not tarea.cierre_automatico
+    assert limpieza.estadisticas()['personal:Ana']['limpieza']['n'] == 1
+
+
+def test_cierre_automatico_no_entra_en_estadisticas(app):
+    renta = crear_renta(entrada=datetime.now() - timedelta(hours=2))
+    habitacion_id = _checkout(renta.id, datetime.now() - timedelta(minutes=5))
+
+    check_auto_clean_complete()
+
+    tarea = TareaLimpieza.query.filter_by(habitacion_id=habitacion_id).one()
+    assert tarea.estado == limpieza.TERMINADA and tarea.cierre_automatico
+    assert tarea.habitacion_abierta is None
+    assert limpieza.estadisticas() == {}
+
+
+def test_cierres_manuales_acumulan(app):
+    for _ in range(2):
+        renta = crear_renta(entrada=datetime.now() - timedelta(hours=2))
+        habitacion_id = _checkout(renta.id, datetime.now())
+        tarea = TareaLimpieza.query.filter_by(habitacion_id=habitacion_id, estado=limpieza.PENDIENTE).one()
+        assert limpieza.iniciar(tarea.id, 'Ana') is not None
+        assert limpieza.terminar(tarea.id) is not None
+
+    estadisticas = limpieza.estadisticas()
+    assert estadisticas['GLOBAL']['rotacion']['n'] == 2
+    assert estadisticas['personal:Ana']['limpieza']['n'] == 2
+    assert TareaLimpieza.query.filter_by(cierre_automatico=True).count() == 0
+
+
+def test_acumular_sobre_fila_existente(app):
+    # Fila creada por otro worker entre la lectura y la escritura: el INSERT se ignora
+    db.session.add(EstadisticaLimpieza(clave='GLOBAL', metrica='rotacion', n=1, media=10.0, m2=0.0,
+                                       minimo=10.0, maximo=10.0))
+    db.session.commit()
+
+    limpieza._acumular(db.session.connection(), [('GLOBAL', 'rotacion', 20.0)])
+    db.session.commit()
+
+    fila = db.session.get(EstadisticaLimpieza, ('GLOBAL', 'rotacion'))
+    assert (fila.n, fila.media, fila.minimo, fila.maximo) == (2, 15.0, 10.0, 20.0)
+
+
+def test_hora_semana_publica():
+    assert hora_semana(datetime(2024, 1, 1, 0, 30)) == 0  # lunes
+    assert hora_semana(datetime(2024, 1, 7, 23, 0)) == 167  # domingo
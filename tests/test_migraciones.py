@@ -0,0 +1,51 @@
+from sqlalchemy import MetaData, Table, create_engine, inspect, text
+
+from migraciones import migrar
+from models import db
+
+# Columnas agregadas a tablas que ya existían antes de las mejoras
+LEGADO = {
+    'habitaciones': {'version', 'sucursal_id'},
+    'rentas': {'version_cambio', 'cliente_id'},
+    'reservas': {'cliente_id'},
+    'tareas_limpieza': {'habitacion_abierta', 'cierre_automatico'},
+}
+
+
+def _esquema_legado(engine):
+    metadata = MetaData()
+    for tabla in db.metadata.sorted_tables:
+        quitar = LEGADO.get(tabla.name, set())
+        Table(tabla.name, metadata, *[c._copy() for c in tabla.columns if c.name not in quitar])
+    metadata.create_all(engine)
+
+
+def test_migrar_base_existente():
+    engine = create_engine('sqlite://')
+    _esquema_legado(engine)
+    with engine.begin() as conexion:
+        conexion.execute(text("INSERT INTO habitaciones (id, numero, tipo, estado, precio_base, activa) "
+                              "VALUES (1, '101', 'SENCILLA', 'LIMPIEZA', 100, 1), (2, '102', 'SENCILLA', 'LIMPIEZA', 100, 1)"))
+        conexion.execute(text("INSERT INTO tareas_limpieza (id, habitacion_id, estado, creada_at) VALUES "
+                              "(1, 1, 'PENDIENTE', '2025-01-01 10:00:00'), (2, 1, 'PENDIENTE', '2025-01-01 10:00:05')"))
+
+    assert migrar(engine, solo_sql=True)
+    migrar(engine)
+
+    inspector = inspect(engine)
+    for tabla, columnas in LEGADO.items():
+        assert columnas <= {c['name'] for c in inspector.get_columns(tabla)}
+    assert 'ix_rentas_cliente_id' in {i['name'] for i in inspector.get_indexes('rentas')}
+    with engine.connect() as conexion:
+        assert conexion.execute(text("SELECT version FROM habitaciones")).scalar() == 1
+        assert conexion.execute(text(
+            "SELECT id, estado, habitacion_abierta, cierre_automatico FROM tareas_limpieza ORDER BY id"
+        )).all() == [(1, 'PENDIENTE', 1, 0), (2, 'TERMINADA', None, 1), (3, 'PENDIENTE', 2, 0)]  # 102 no tenía tarea
+
+    assert migrar(engine) == []  # Idempotente
+
+
+def test_esquema_actual_sin_cambios():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    assert migrar(engine, solo_sql=True) == []
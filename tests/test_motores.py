@@ -0,0 +1,122 @@
+"""
+Matriz de motores: el mismo conjunto de rentas en SQLite y (con TEST_MYSQL_URL) en MySQL debe
+producir exactamente los mismos reportes, y ambos deben coincidir con los totales calculados
+aquí en Python (los reportes atrapan sus errores y regresan estructuras vacías, así que una
+consulta no portátil se vería como "cero rentas" en un solo motor).
+"""
+import json
+import os
+from datetime import date, datetime, timedelta
+
+from actividad import reconstruir_actividad
+from archivo import archivar_rentas
+from models import db, Habitacion, Renta, RegistroAcceso, ModoIngreso
+import reportes
+from conftest import MOTORES, crear_app
+
+DIA = date.today() - timedelta(days=3)
+ANIO_ANTERIOR = DIA - timedelta(days=364)
+
+# (numero, día, hora de entrada, horas reservadas, horas extra, modo de ingreso, placas)
+RENTAS = [
+    ('101', DIA, 9, 2, 0, 'A_PIE', None),
+    ('101', DIA, 14, 3, 1, 'VEHICULO', 'ABC123'),
+    ('103', DIA, 22, 2, 0, 'VEHICULO', 'XYZ789'),  # Sale al día siguiente
+    ('201', DIA, 0, 1, 0, 'A_PIE', None),
+    ('202', DIA, 18, 4, 2, 'API_CAMARA', None),
+    ('102', ANIO_ANTERIOR, 20, 2, 1, 'A_PIE', None),  # Archivada: los reportes la leen por el UNION ALL
+]
+
+
+def _cargar():
+    habitaciones = {h.numero: h for h in Habitacion.query.all()}
+    esperado = {'tipo': {}, 'numero': {}, 'checkins': {}, 'checkouts': {}, 'extra': 0.0, 'anio_anterior': 0.0}
+    for numero, dia, hora, horas, extra, modo, placas in RENTAS:
+        habitacion = habitaciones[numero]
+        precio = habitacion.precio_base
+        entrada = datetime.combine(dia, datetime.min.time()) + timedelta(hours=hora)
+        salida = entrada + timedelta(hours=horas + extra)
+        renta = Renta(habitacion_id=habitacion.id, recepcionista_id=1, cliente_nombre=f'Cliente {numero}',
+                      horas_reservadas=horas, hora_entrada=entrada, hora_salida_estimada=entrada + timedelta(hours=horas),
+                      hora_salida_real=salida, precio_hora=precio, pago_horas=precio * horas, pago_extra=precio * extra,
+                      pago_final=precio * (horas + extra), estado='CERRADA')
+        db.session.add(renta)
+        db.session.flush()
+        db.session.add(RegistroAcceso(renta_id=renta.id, modo_ingreso=ModoIngreso[modo], placas=placas,
+                                      hora_ingreso=entrada, hora_salida=salida))
+
+        if dia != DIA:
+            esperado['anio_anterior'] += precio * (horas + extra)
+            continue
+        tipo = esperado['tipo'].setdefault(habitacion.tipo.value, [0, 0.0])
+        tipo[0] += 1
+        tipo[1] += precio * (horas + extra)
+        esperado['numero'][numero] = esperado['numero'].get(numero, 0) + 1
+        esperado['checkins'][hora] = esperado['checkins'].get(hora, 0) + 1
+        if salida.date() == DIA:
+            esperado['checkouts'][salida.hour] = esperado['checkouts'].get(salida.hour, 0) + 1
+        esperado['extra'] += precio * extra
+    db.session.commit()
+    assert archivar_rentas(horizonte_dias=180) == 1
+    reconstruir_actividad(ANIO_ANTERIOR, DIA + timedelta(days=2))
+    return esperado
+
+
+def _normalizar(valor):
+    """Listas en orden canónico y flotantes redondeados: el orden de GROUP BY no está garantizado"""
+    if isinstance(valor, dict):
+        return {k: _normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        elementos = [_normalizar(v) for v in valor]
+        return sorted(elementos, key=lambda v: json.dumps(v, sort_keys=True, default=str))
+    if isinstance(valor, float):
+        return round(valor, 2)
+    return valor
+
+
+def _reportes():
+    dia = DIA.isoformat()
+    return _normalizar({
+        'reporte': reportes.get_renta_reports_mejorado(dia, dia),
+        'consolidado': reportes.get_reporte_consolidado(dia, dia),
+        'actividad': reportes.get_actividad_por_hora(dia, dia),
+        'comparacion': reportes.get_comparacion_periodos(dia, dia, modo='anio_anterior'),
+    })
+
+
+def _ejecutar(uri):
+    app = crear_app(uri)
+    with app.app_context():
+        try:
+            esperado = _cargar()
+            return esperado, _reportes()
+        finally:
+            db.session.remove()
+            if db.engine.dialect.name != 'sqlite':
+                db.drop_all(bind_key=None)
+
+
+def test_reportes_identicos_en_todos_los_motores():
+    uris = {'sqlite': 'sqlite://', 'mysql': os.environ.get('TEST_MYSQL_URL')}
+    resultados = {motor: _ejecutar(uris[motor]) for motor in MOTORES}
+
+    esperado, referencia = resultados['sqlite']
+    for motor, (_, obtenido) in resultados.items():
+        assert obtenido == referencia, f"{motor} difiere de sqlite"
+
+    reporte = referencia['reporte']
+    assert {i['tipo']: (i['rentas'], i['ingreso']) for i in reporte['ingresos_tipo']} == \
+        {tipo: (n, round(ingreso, 2)) for tipo, (n, ingreso) in esperado['tipo'].items()}
+    assert {h['numero']: h['rentas'] for h in reporte['top_habitaciones']} == esperado['numero']
+    assert sorted(v['placas'] for v in reporte['ingreso_vehiculos']) == ['ABC123', 'XYZ789']
+    assert reporte['total_monto_extra'] == round(esperado['extra'], 2)
+    assert referencia['consolidado']['totales']['total_rentas'] == sum(n for n, _ in esperado['tipo'].values())
+
+    actividad = {h['hora']: h for h in referencia['actividad']}
+    assert {hora: actividad[hora]['checkins'] for hora in range(24) if actividad[hora]['checkins']} == esperado['checkins']
+    assert {hora: actividad[hora]['checkouts'] for hora in range(24) if actividad[hora]['checkouts']} == esperado['checkouts']
+
+    totales = referencia['comparacion']['totales']
+    assert totales['actual']['rentas'] == sum(n for n, _ in esperado['tipo'].values())
+    assert totales['comparacion'] == {'ingreso': round(esperado['anio_anterior'], 2), 'rentas': 1,
+                                      'ingreso_extra': totales['comparacion']['ingreso_extra']}
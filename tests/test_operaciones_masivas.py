@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from cache_habitaciones import cache_habitaciones
+from models import (db, Habitacion, Renta, RegistroAcceso, EstadoHabitacion, TareaLimpieza, EstadisticaLimpieza,
+                    EventoEstado, ActividadHora)
+from operaciones_masivas import aplicar_acciones
+from vencimientos import monitor_vencimientos
+from conftest import crear_renta
+
+
+def _efectos(renta_id):
+    """Estado que deja un check-out + fin de limpieza, sin valores que dependan del instante"""
+    db.session.expire_all()
+    renta = db.session.get(Renta, renta_id)
+    habitacion = db.session.get(Habitacion, renta.habitacion_id)
+    tareas = TareaLimpieza.query.filter_by(habitacion_id=habitacion.id).all()
+    eventos = EventoEstado.query.filter(EventoEstado.habitacion_id == habitacion.id) \
+        .order_by(EventoEstado.ocurrido_at, EventoEstado.id).all()
+    return {
+        'renta': (renta.estado, renta.pago_extra, renta.pago_final, renta.version_cambio is not None,
+                  renta.hora_salida_real is not None),
+        'acceso_cerrado': RegistroAcceso.query.filter_by(renta_id=renta_id).one().hora_salida is not None,
+        'habitacion': (habitacion.estado, habitacion.version),
+        'cache': cache_habitaciones.obtener(habitacion.id).estado,
+        'tareas': [(t.estado, t.renta_id == renta_id, t.habitacion_abierta, t.cierre_automatico) for t in tareas],
+        'bitacora': [(e.entidad, e.entidad_id == renta_id or e.entidad_id == habitacion.id,
+                      e.estado_anterior, e.estado_nuevo) for e in eventos],
+        'monitor': renta_id in monitor_vencimientos._programadas,
+    }
+
+
+def _agregados():
+    return {
+        'checkouts': db.session.query(func.coalesce(func.sum(ActividadHora.checkouts), 0)).scalar(),
+        'rotaciones': db.session.query(EstadisticaLimpieza.n).filter_by(clave='GLOBAL', metrica='rotacion').scalar() or 0,
+    }
+
+
+def test_lote_equivale_a_rutas_individuales(cliente):
+    entrada = datetime.now() - timedelta(hours=3)  # una hora extra en ambas
+    individual = crear_renta('101', entrada=entrada, horas=2)
+    masiva = crear_renta('102', entrada=entrada, horas=2)
+    version_101 = db.session.get(Habitacion, individual.habitacion_id).version
+    version_102 = db.session.get(Habitacion, masiva.habitacion_id).version
+    cache_habitaciones.listar()
+
+    inicio = _agregados()
+    cliente.post(f'/checkout/{individual.id}')
+    cliente.post(f'/clean_complete/{individual.habitacion_id}')
+    despues_individual = _agregados()
+
+    resultados = aplicar_acciones([{'accion': 'checkout', 'renta_id': masiva.id}])
+    assert resultados[0]['ok']
+    resultados = aplicar_acciones([{'accion': 'clean_complete', 'habitacion_id': masiva.habitacion_id}])
+    assert resultados[0]['ok']
+    despues_masiva = _agregados()
+
+    efectos_individual = _efectos(individual.id)
+    efectos_masiva = _efectos(masiva.id)
+    # La versión de la habitación avanza lo mismo por ambas rutas
+    efectos_individual['habitacion'] = (efectos_individual['habitacion'][0], efectos_individual['habitacion'][1] - version_101)
+    efectos_masiva['habitacion'] = (efectos_masiva['habitacion'][0], efectos_masiva['habitacion'][1] - version_102)
+
+    assert efectos_masiva == efectos_individual
+    assert efectos_individual['habitacion'][0] == EstadoHabitacion.DISPONIBLE
+    assert {k: despues_masiva[k] - despues_individual[k] for k in inicio} == \
+        {k: despues_individual[k] - inicio[k] for k in inicio}
+
+
+def test_fin_de_limpieza_se_valida_contra_el_estado_previo(app):
+    renta = crear_renta('101')
+
+    resultados = aplicar_acciones([
+        {'accion': 'checkout', 'renta_id': renta.id},
+        {'accion': 'clean_complete', 'habitacion_id': renta.habitacion_id},
+    ])
+
+    assert resultados[0]['ok']
+    assert not resultados[1]['ok'] and 'LIMPIEZA' in resultados[1]['error']
+    db.session.expire_all()
+    assert db.session.get(Habitacion, renta.habitacion_id).estado == EstadoHabitacion.LIMPIEZA
@@ -0,0 +1,135 @@
+"""
+Enrutamiento de lecturas con dos archivos SQLite: la primaria y una copia como réplica
+(copiar_replica), que envejece en cuanto la primaria recibe otra renta.
+"""
+import shutil
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import reportes
+from cache_reportes import cache_reportes
+from models import db, Habitacion
+from replica import BIND_REPLICA, copiar_replica, enrutador_lectura
+from conftest import crear_app, crear_renta
+
+HOY = date.today().isoformat()
+
+
+def _renta_cerrada(numero, hora):
+    entrada = datetime.combine(date.today(), time(hora))
+    return crear_renta(numero, entrada=entrada, estado='CERRADA', salida=entrada + timedelta(hours=2))
+
+
+@pytest.fixture
+def rutas(tmp_path):
+    (tmp_path / 'replica').mkdir()
+    return tmp_path / 'motel.db', tmp_path / 'replica' / 'replica.db'
+
+
+def _preparar(rutas, retraso=timedelta()):
+    """Primaria con una renta, réplica copiada con un latido de 'retraso', y otra renta solo en la primaria"""
+    primaria, replica = rutas
+    app = crear_app(f'sqlite:///{primaria}', SQLALCHEMY_BINDS={BIND_REPLICA: f'sqlite:///{replica}'})
+    contexto = app.app_context()
+    contexto.push()
+    _renta_cerrada('101', 0)
+    enrutador_lectura._escribir_latido(db.engine, datetime.now() - retraso)
+    copiar_replica(str(primaria), str(replica))
+    _renta_cerrada('102', 1)
+
+    # Nueva petición: sesión sin escrituras y estado de la réplica por verificar
+    db.session.remove()
+    cache_reportes.invalidar()
+    enrutador_lectura.invalidar()
+    enrutador_lectura.lecturas_replica = enrutador_lectura.lecturas_primaria = 0
+    return app, contexto
+
+
+@pytest.fixture
+def consultas_replica():
+    """SELECT ejecutados en el engine de la réplica"""
+    sentencias = []
+
+    def _contar(conn, cursor, statement, *args):
+        if 'latido_replica' not in statement:
+            sentencias.append(statement)
+
+    yield sentencias, _contar
+
+
+def _escuchar(consultas_replica):
+    sentencias, contar = consultas_replica
+    event.listen(db.engines[BIND_REPLICA], 'before_cursor_execute', contar)
+    return sentencias
+
+
+def _total_rentas():
+    cache_reportes.invalidar()
+    return reportes.get_reporte_consolidado(HOY, HOY)['totales']['total_rentas']
+
+
+def test_reportes_leen_de_la_replica(rutas, consultas_replica):
+    app, contexto = _preparar(rutas)
+    try:
+        sentencias = _escuchar(consultas_replica)
+        assert _total_rentas() == 1  # la réplica no tiene la segunda renta
+        assert sentencias and all(s.lstrip().upper().startswith('SELECT') for s in sentencias)
+        assert enrutador_lectura.estado()['lecturas_replica'] == 1
+    finally:
+        db.session.remove()
+        contexto.pop()
+
+
+def test_sesion_que_escribio_lee_de_la_primaria(rutas, consultas_replica):
+    app, contexto = _preparar(rutas)
+    try:
+        sentencias = _escuchar(consultas_replica)
+        habitacion = Habitacion.query.filter_by(numero='201').one()
+        habitacion.caracteristicas = 'TV'
+        db.session.commit()
+
+        assert _total_rentas() == 2
+        assert sentencias == []
+        assert enrutador_lectura.estado()['lecturas_primaria'] == 1
+    finally:
+        db.session.remove()
+        contexto.pop()
+
+
+def test_latido_viejo_manda_a_la_primaria(rutas, consultas_replica):
+    app, contexto = _preparar(rutas, retraso=timedelta(seconds=enrutador_lectura.retraso_max + 60))
+    try:
+        sentencias = _escuchar(consultas_replica)
+        assert _total_rentas() == 2
+        assert sentencias == []
+        estado = enrutador_lectura.estado()
+        assert not estado['disponible'] and 'Retraso' in estado['error']
+    finally:
+        db.session.remove()
+        contexto.pop()
+
+
+@pytest.mark.parametrize('reporte, rentas', [
+    (lambda: reportes.get_renta_reports_mejorado(HOY, HOY), lambda r: sum(i['rentas'] for i in r['ingresos_tipo'])),
+    (lambda: reportes.get_reporte_consolidado(HOY, HOY), lambda r: r['totales']['total_rentas']),
+    (lambda: reportes.get_metricas_comparativas(HOY, HOY), lambda r: r['ventas_actual'] / 300),  # 2 h x 150
+], ids=['secciones', 'consolidado', 'comparativas'])
+def test_replica_caida_a_mitad_del_reporte_repite_en_la_primaria(rutas, reporte, rentas):
+    app, contexto = _preparar(rutas)
+    try:
+        assert enrutador_lectura.disponible()
+        # Sin la ventana de "leer lo propio" de la invalidación hecha al preparar
+        cache_reportes._invalidado_en = None
+        # La réplica desaparece después de la verificación: la primera consulta del reporte falla
+        shutil.rmtree(rutas[1].parent)
+        db.engines[BIND_REPLICA].dispose()
+
+        assert rentas(reporte()) == 2  # repetido completo en la primaria, no un reporte vacío
+        estado = enrutador_lectura.estado()
+        assert not estado['disponible'] and 'no disponible' in estado['error']
+        assert estado['lecturas_replica'] == 1
+    finally:
+        db.session.remove()
+        contexto.pop()
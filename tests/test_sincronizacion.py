@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, update
+
+from models import db, Habitacion, Renta, EstadoHabitacion
+from conftest import crear_renta
+
+
+def test_sondeo_sin_cambios_responde_304_sin_escribir(cliente):
+    renta = crear_renta(entrada=datetime.now() - timedelta(hours=2))
+    renta.estado = 'CERRADA'
+    renta.hora_salida_real = datetime.now()
+    db.session.get(Habitacion, renta.habitacion_id).estado = EstadoHabitacion.LIMPIEZA
+    db.session.commit()
+    renta_id, habitacion_id = renta.id, renta.habitacion_id
+
+    respuesta = cliente.get('/api/habitaciones_activas?since=0')
+    version, etag = respuesta.json['version'], respuesta.headers['ETag'].strip('"')
+
+    # Pasa el tiempo (sin escrituras por el ORM): el barrido ya podría liberar la habitación
+    db.session.execute(update(Renta).where(Renta.id == renta_id)
+                       .values(hora_salida_real=datetime.now() - timedelta(minutes=5)))
+    db.session.commit()
+
+    escrituras = []
+
+    def _contar(conn, cursor, statement, *args):
+        if not statement.lstrip().upper().startswith('SELECT'):
+            escrituras.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', _contar)
+    try:
+        respuesta = cliente.get(f'/api/habitaciones_activas?since={version}', headers={'If-None-Match': f'"{etag}"'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _contar)
+
+    assert respuesta.status_code == 304
+    assert respuesta.headers['ETag'].strip('"') == etag
+    assert escrituras == []
+    db.session.expire_all()
+    assert db.session.get(Habitacion, habitacion_id).estado == EstadoHabitacion.LIMPIEZA
+
+    # Sin ETag vigente el sondeo sí ejecuta el barrido
+    assert cliente.get(f'/api/habitaciones_activas?since={version}').status_code == 200
+    db.session.expire_all()
+    assert db.session.get(Habitacion, habitacion_id).estado == EstadoHabitacion.DISPONIBLE
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+from models import db, EventoVencimiento
+from vencimientos import MonitorVencimientos, POR_VENCER, VENCIDA
+from conftest import crear_renta
+
+
+class RelojFalso:
+    def __init__(self, inicio):
+        self.ahora = inicio
+
+    def __call__(self):
+        return self.ahora
+
+    def avanzar(self, **delta):
+        self.ahora += timedelta(**delta)
+
+
+def _monitor(reloj, **kwargs):
+    return MonitorVencimientos(aviso_minutos=15, reloj=reloj, ttl_sincronizacion=3600, **kwargs)
+
+
+def test_eventos_en_orden_con_reloj_falso(app):
+    inicio = datetime(2025, 3, 1, 20, 0)
+    reloj = RelojFalso(inicio)
+    monitor = _monitor(reloj)
+    monitor.programar(1, inicio + timedelta(hours=2))
+    monitor.programar(2, inicio + timedelta(hours=1))
+
+    assert monitor.procesar() == []
+    reloj.avanzar(minutes=46)
+    assert [(e['tipo'], e['renta_id']) for e in monitor.procesar()] == [(POR_VENCER, 2)]
+    assert monitor.esta_por_vencer(2) and not monitor.esta_vencida(2)
+
+    reloj.avanzar(hours=2)
+    eventos = monitor.procesar()
+    assert [(e['tipo'], e['renta_id']) for e in eventos] == [(VENCIDA, 2), (VENCIDA, 1)]
+    # El POR_VENCER de la renta 1 quedó detrás de su VENCIDA: no se anuncia
+    assert monitor.vencidas() == {1, 2}
+    assert [e['seq'] for e in monitor.eventos_desde(0)] == sorted(e['seq'] for e in monitor.eventos_desde(0))
+    assert len(monitor.eventos_desde(0)) == 3
+    assert monitor.eventos_desde(eventos[0]['seq']) == eventos[1:]
+
+
+def test_reprogramar_y_cancelar_descartan_eventos_viejos(app):
+    inicio = datetime(2025, 3, 1, 20, 0)
+    reloj = RelojFalso(inicio)
+    monitor = _monitor(reloj)
+    monitor.programar(1, inicio + timedelta(hours=1))
+    monitor.programar(2, inicio + timedelta(hours=1))
+    monitor.programar(1, inicio + timedelta(hours=3))  # Extensión de horas
+    monitor.cancelar(2)  # Check-out antes de vencer
+
+    reloj.avanzar(hours=1, minutes=1)
+    assert monitor.procesar() == []
+    reloj.avanzar(hours=2)
+    assert [(e['tipo'], e['renta_id']) for e in monitor.procesar()] == [(VENCIDA, 1)]
+
+
+def test_varios_workers_publican_cada_aviso_una_vez(app):
+    inicio = datetime(2025, 3, 1, 20, 0)
+    reloj = RelojFalso(inicio)
+    notificados = []
+    workers = [_monitor(reloj, notificador=notificados.append) for _ in range(3)]
+    salida = inicio + timedelta(hours=1, microseconds=700000)
+    for i, monitor in enumerate(workers):
+        # Un worker tiene la hora con microsegundos; los demás, la redondeada que guarda MySQL
+        monitor.programar(7, salida if i == 0 else salida.replace(microsecond=0) + timedelta(seconds=1))
+
+    reloj.avanzar(hours=2)
+    publicados = [monitor.procesar() for monitor in workers]
+
+    assert sum(len(p) for p in publicados) == 1
+    assert len(notificados) == 1
+    assert all(monitor.esta_vencida(7) for monitor in workers)
+    # Misma secuencia vista desde cualquier worker
+    assert workers[0].eventos_desde(0) == workers[2].eventos_desde(0)
+    assert EventoVencimiento.query.count() == 1
+
+
+def test_sincronizar_programa_rentas_de_otros_procesos(app):
+    renta = crear_renta(entrada=datetime.now() - timedelta(hours=3), horas=2)
+    cerrada = crear_renta(numero='102', entrada=datetime.now() - timedelta(hours=3), horas=2,
+                          estado='CERRADA', salida=datetime.now() - timedelta(hours=1))
+    reloj = RelojFalso(datetime.now())
+    monitor = _monitor(reloj)
+
+    eventos = monitor.actualizar()
+    assert [(e['tipo'], e['renta_id']) for e in eventos] == [(VENCIDA, renta.id)]
+    assert not monitor.esta_vencida(cerrada.id)
+    assert monitor.ultimo_seq() == eventos[0]['seq']
+
+
+def test_depura_eventos_viejos(app):
+    inicio = datetime.now() - timedelta(days=30)
+    reloj = RelojFalso(inicio)
+    monitor = _monitor(reloj)
+    monitor.programar(1, inicio + timedelta(hours=1))
+    reloj.avanzar(hours=2)
+    monitor.procesar()
+    assert EventoVencimiento.query.count() == 1
+
+    reloj.ahora = datetime.now()
+    monitor.sincronizar()
+    db.session.expire_all()
+    assert EventoVencimiento.query.count() == 0
+
+
+def test_api_vencimientos_por_secuencia(app, cliente):
+    crear_renta(entrada=datetime.now() - timedelta(hours=3), horas=2)
+    datos = cliente.get('/api/vencimientos?desde=0').get_json()
+    assert [e['tipo'] for e in datos['eventos']] == [VENCIDA]
+    assert cliente.get(f"/api/vencimientos?desde={datos['ultimo']}").get_json() == {'eventos': [], 'ultimo': datos['ultimo']}
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import event
+
+from controllers.room_controller import MENSAJE_HABITACION_CAMBIADA
+from models import db, Renta, Habitacion, EstadoHabitacion
+from conftest import crear_renta
+
+
+@pytest.fixture
+def otro_usuario(app):
+    """
+    Simula a otra recepcionista: justo antes del flush que guarda la habitación, sube su
+    versión en la misma transacción (Core, sin tocar el objeto en memoria), así el UPDATE
+    con 'version' vieja no encuentra la fila y el ORM levanta StaleDataError
+    """
+    def cambiar_habitacion(session, contexto, instancias):
+        for objeto in session.dirty:
+            if isinstance(objeto, Habitacion):
+                tabla = Habitacion.__table__
+                session.connection().execute(
+                    tabla.update().where(tabla.c.id == objeto.id).values(version=tabla.c.version + 1))
+
+    yield lambda: event.listen(db.session, 'before_flush', cambiar_habitacion)
+    if event.contains(db.session, 'before_flush', cambiar_habitacion):
+        event.remove(db.session, 'before_flush', cambiar_habitacion)
+
+
+def _flashes(cliente):
+    with cliente.session_transaction() as sesion:
+        return sesion.get('_flashes', [])
+
+
+def test_checkin_con_habitacion_cambiada(cliente, otro_usuario):
+    otro_usuario()
+    respuesta = cliente.post('/checkin', data={'habitacion_id': 1, 'horas_reservadas': 2, 'nombre_cliente': 'Carrera',
+                                               'modo_ingreso': 'A_PIE', 'idempotency_key': 'version-checkin'})
+
+    assert respuesta.status_code == 302 and respuesta.headers['Location'].endswith('/checkin')
+    assert _flashes(cliente)[-1] == ('error', MENSAJE_HABITACION_CAMBIADA)
+    db.session.remove()
+    assert Renta.query.count() == 0
+    assert db.session.get(Habitacion, 1).estado == EstadoHabitacion.DISPONIBLE
+
+
+def test_checkout_con_habitacion_cambiada(cliente, otro_usuario):
+    renta_id = crear_renta('101').id
+    otro_usuario()
+
+    respuesta = cliente.post(f'/checkout/{renta_id}', data={'idempotency_key': 'version-checkout'})
+
+    assert respuesta.status_code == 302
+    assert _flashes(cliente)[-1] == ('error', MENSAJE_HABITACION_CAMBIADA)
+    db.session.remove()
+    assert db.session.get(Renta, renta_id).estado == 'ACTIVA'
+    assert db.session.get(Habitacion, 1).estado == EstadoHabitacion.OCUPADA
@@ -0,0 +1,254 @@
+"""
+Detección de rentas por vencer / vencidas con un min-heap ordenado por hora_salida_estimada.
+
+Cada renta ACTIVA programa dos eventos en el heap: POR_VENCER (aviso minutos antes) y
+VENCIDA (a la hora estimada de salida). procesar() solo saca del heap los eventos cuyo
+instante ya pasó, así que el costo es O(log n) por evento en lugar de recorrer todas las
+rentas activas en cada carga del dashboard.
+
+Los eventos se publican en la tabla eventos_vencimiento: su id autoincremental es el número
+de secuencia que consumen el stream del dashboard y /api/vencimientos, el mismo en todos los
+workers. Cada proceso tiene su propio heap, pero la llave única (renta, tipo, salida) hace
+que cada aviso se publique, y se entregue al notificador, una sola vez.
+
+Las rentas se programan/cancelan al confirmar la transacción (eventos de sesión) y el
+heap se resincroniza con la base de datos cada VENCIMIENTOS_TTL segundos para incluir
+las rentas creadas por otros workers. Para que los avisos salgan aunque nadie tenga el
+dashboard abierto:
+
+    flask monitor-vencimientos [--intervalo 30]
+
+El reloj es inyectable para pruebas.
+"""
+import heapq
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from models import db, Renta, EventoVencimiento
+
+POR_VENCER = 'POR_VENCER'
+VENCIDA = 'VENCIDA'
+
+AVISO_MINUTOS = int(os.environ.get("VENCIMIENTOS_AVISO_MINUTOS", 15))
+TTL_SINCRONIZACION = float(os.environ.get("VENCIMIENTOS_TTL", 30))
+RETENCION_DIAS = int(os.environ.get("VENCIMIENTOS_RETENCION_DIAS", 7))
+MAX_EVENTOS = 500  # eventos por consulta de eventos_desde
+
+_CLAVE_PENDIENTES = 'vencimientos_pendientes'
+
+
+def _al_segundo(instante):
+    # MySQL guarda DATETIME sin fracción (redondeando): la llave del evento debe coincidir
+    # entre el worker que tiene el valor en memoria y el que lo leyó de la base de datos
+    return (instante + timedelta(microseconds=500000)).replace(microsecond=0)
+
+
+def _insertar_evento(conexion, valores):
+    """Inserta el evento si otro worker no lo publicó ya; regresa su id o None"""
+    tabla = EventoVencimiento.__table__
+    dialecto = conexion.dialect.name
+    if dialecto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        sentencia = insert(tabla).values(**valores).prefix_with('IGNORE')
+    elif dialecto in ('sqlite', 'postgresql'):
+        if dialecto == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        sentencia = insert(tabla).values(**valores).on_conflict_do_nothing()
+    else:
+        sentencia = tabla.insert().values(**valores)
+    resultado = conexion.execute(sentencia)
+    return resultado.inserted_primary_key[0] if resultado.rowcount == 1 else None
+
+
+class MonitorVencimientos:
+
+    def __init__(self, aviso_minutos=AVISO_MINUTOS, reloj=datetime.now, notificador=None,
+                 ttl_sincronizacion=TTL_SINCRONIZACION):
+        self.aviso = timedelta(minutes=aviso_minutos)
+        self.reloj = reloj
+        self.notificador = notificador
+        self.ttl_sincronizacion = ttl_sincronizacion
+        self._heap = []
+        self._programadas = {}    # renta_id -> hora_salida_estimada vigente
+        self._vencidas = set()
+        self._por_vencer = set()
+        self._sin_publicar = []   # Eventos disparados que la base de datos no aceptó (se reintentan)
+        self._ultima_sincronizacion = None
+        self._lock = threading.Lock()
+
+    # --- Programación ---
+
+    def programar(self, renta_id, hora_salida_estimada):
+        """(Re)programa una renta; las entradas viejas del heap se descartan al salir"""
+        with self._lock:
+            if self._programadas.get(renta_id) == hora_salida_estimada:
+                return
+            self._programadas[renta_id] = hora_salida_estimada
+            self._vencidas.discard(renta_id)
+            self._por_vencer.discard(renta_id)
+            heapq.heappush(self._heap, (hora_salida_estimada - self.aviso, POR_VENCER, renta_id, hora_salida_estimada))
+            heapq.heappush(self._heap, (hora_salida_estimada, VENCIDA, renta_id, hora_salida_estimada))
+
+    def cancelar(self, renta_id):
+        with self._lock:
+            self._programadas.pop(renta_id, None)
+            self._vencidas.discard(renta_id)
+            self._por_vencer.discard(renta_id)
+
+    # --- Disparo de eventos ---
+
+    def procesar(self):
+        """Dispara los eventos cuyo instante ya pasó. Regresa los publicados por este proceso."""
+        ahora = self.reloj()
+        with self._lock:
+            disparados, self._sin_publicar = self._sin_publicar, []
+            while self._heap and self._heap[0][0] <= ahora:
+                instante, tipo, renta_id, hora_salida = heapq.heappop(self._heap)
+                # Entrada obsoleta (renta cerrada o reprogramada)
+                if self._programadas.get(renta_id) != hora_salida:
+                    continue
+                # Un POR_VENCER que ya quedó atrás de su VENCIDA no se anuncia
+                if tipo == POR_VENCER and hora_salida <= ahora:
+                    continue
+                if tipo == VENCIDA:
+                    self._vencidas.add(renta_id)
+                    self._por_vencer.discard(renta_id)
+                else:
+                    self._por_vencer.add(renta_id)
+                disparados.append({
+                    'tipo': tipo,
+                    'renta_id': renta_id,
+                    'hora_salida_estimada': _al_segundo(hora_salida),
+                    'disparado_at': ahora
+                })
+
+        nuevos = self._publicar(disparados) if disparados else []
+
+        if self.notificador:
+            for evento in nuevos:
+                try:
+                    self.notificador(evento)
+                except Exception as e:
+                    print(f"Error en el notificador de vencimientos: {e}")
+        return nuevos
+
+    def _publicar(self, disparados):
+        try:
+            from sincronizacion import incrementar_contador, CONTADOR_VENCIMIENTOS
+            with db.engine.begin() as conexion:
+                publicados = [(_insertar_evento(conexion, valores), valores) for valores in disparados]
+                if any(seq is not None for seq, _ in publicados):
+                    # Las pantallas en vivo de todos los workers ven el cambio (ver asgi.py)
+                    incrementar_contador(conexion, CONTADOR_VENCIMIENTOS)
+        except Exception as e:
+            print(f"Error al publicar eventos de vencimiento (se reintentan): {e}")
+            with self._lock:
+                self._sin_publicar = disparados + self._sin_publicar
+            return []
+        # Los que otro worker ya había publicado no se repiten
+        return [_serializar(seq, valores) for seq, valores in publicados if seq is not None]
+
+    def esta_vencida(self, renta_id):
+        return renta_id in self._vencidas
+
+    def esta_por_vencer(self, renta_id):
+        return renta_id in self._por_vencer
+
+    def vencidas(self):
+        return set(self._vencidas)
+
+    def eventos_desde(self, seq=0, limite=MAX_EVENTOS):
+        """Eventos publicados (por cualquier worker) con número de secuencia mayor a 'seq'"""
+        tabla = EventoVencimiento.__table__
+        with db.engine.connect() as conexion:
+            filas = conexion.execute(select(tabla).where(tabla.c.id > seq).order_by(tabla.c.id).limit(limite))
+            return [_serializar(fila.id, fila._mapping) for fila in filas]
+
+    def ultimo_seq(self):
+        with db.engine.connect() as conexion:
+            return conexion.execute(select(func.max(EventoVencimiento.id))).scalar() or 0
+
+    # --- Sincronización con la base de datos ---
+
+    def sincronizar(self):
+        """Carga las rentas ACTIVAS (incluidas las de otros procesos) y descarta las cerradas"""
+        activas = dict(db.session.query(Renta.id, Renta.hora_salida_estimada).filter(Renta.estado == 'ACTIVA').all())
+        for renta_id in [rid for rid in self._programadas if rid not in activas]:
+            self.cancelar(renta_id)
+        for renta_id, hora_salida in activas.items():
+            self.programar(renta_id, hora_salida)
+        self._ultima_sincronizacion = time.monotonic()
+        self._depurar()
+
+    def _depurar(self):
+        limite = self.reloj() - timedelta(days=RETENCION_DIAS)
+        try:
+            with db.engine.begin() as conexion:
+                conexion.execute(EventoVencimiento.__table__.delete().where(
+                    EventoVencimiento.disparado_at < limite))
+        except Exception as e:
+            print(f"Error al depurar eventos de vencimiento: {e}")
+
+    def actualizar(self):
+        """Resincroniza si hace falta y dispara los eventos vencidos"""
+        if self._ultima_sincronizacion is None or time.monotonic() - self._ultima_sincronizacion > self.ttl_sincronizacion:
+            self.sincronizar()
+        return self.procesar()
+
+
+def _serializar(seq, valores):
+    return {
+        'seq': seq,
+        'tipo': valores['tipo'],
+        'renta_id': valores['renta_id'],
+        'hora_salida_estimada': valores['hora_salida_estimada'].isoformat(),
+        'disparado': valores['disparado_at'].isoformat()
+    }
+
+
+def vigilar(intervalo=TTL_SINCRONIZACION, monitor=None):
+    """Ciclo del comando monitor-vencimientos: dispara y publica avisos sin depender de peticiones"""
+    monitor = monitor or monitor_vencimientos
+    while True:
+        try:
+            for evento in monitor.actualizar():
+                print(f"{evento['disparado']} {evento['tipo']} renta {evento['renta_id']}")
+        except Exception as e:
+            print(f"Error en el monitor de vencimientos: {e}")
+        finally:
+            db.session.remove()
+        time.sleep(intervalo)
+
+
+monitor_vencimientos = MonitorVencimientos()
+
+
+# --- Eventos de sesión: programa/cancela rentas al confirmar la transacción ---
+
+@event.listens_for(Session, 'after_flush')
+def _capturar_rentas(session, flush_context):
+    pendientes = session.info.setdefault(_CLAVE_PENDIENTES, {})
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Renta):
+            pendientes[obj.id] = obj.hora_salida_estimada if obj.estado == 'ACTIVA' else None
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_rentas(session):
+    for renta_id, hora_salida in session.info.pop(_CLAVE_PENDIENTES, {}).items():
+        if hora_salida is None:
+            monitor_vencimientos.cancelar(renta_id)
+        else:
+            monitor_vencimientos.programar(renta_id, hora_salida)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_rentas(session):
+    session.info.pop(_CLAVE_PENDIENTES, None)